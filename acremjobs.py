@@ -0,0 +1,82 @@
+
+
+"""
+This script will be run by systemd on startup, and runs the periodic jobs
+of the observatory in one process, in place of the astrodata cron scripts,
+which may still be run by hand.
+
+Times are utc.
+"""
+
+import os, sys
+
+from indi_mr import redis_server, tools
+
+# the framework needs to know the location of the projectfiles directory holding this project
+
+PROJECTFILES = os.path.dirname(os.path.realpath(__file__))
+
+# the astrodata scripts are imported as modules, providing the jobs
+sys.path.insert(0, os.path.join(PROJECTFILES, 'astrodata'))
+
+from acremscope_packages import redis_ops, astro_data, scheduler, cfg
+
+# set PROJECTFILES into cfg, used to specify where astrodata and contents can be found
+cfg.set_projectfiles(PROJECTFILES)
+
+import make_planets, metoffice, clientrequests
+
+
+# the prefix of the log_info list, as rconn_0 of the web service
+LOG_PREFIX = "remscope_various_"
+
+# redis server settings from cfg.py
+redis_ip, redis_port, redis_auth = cfg.get_redis()
+
+# set these into REDISSERVER tuple, with dbase 0, as used by indi_mr
+REDISSERVER = redis_server(host=redis_ip, port=redis_port, db=0, password=redis_auth)
+
+RCONN = tools.open_redis(REDISSERVER)
+
+
+def planets_job():
+    "Populates planet.db with ten days of planetary positions"
+    status, message = make_planets.make_planets()
+    if status:
+        raise RuntimeError(message)
+    return message
+
+
+def iers_job():
+    "Downloads the IERS bulletin A, and the JPL kernel if there is no local copy"
+    message = astro_data.refresh()
+    if "failed" in message:
+        raise RuntimeError(message)
+    return message
+
+
+def door_job():
+    "Requests dome door closure, and telescope disconnection"
+    return clientrequests.close_door(RCONN, REDISSERVER)
+
+
+def weather_job():
+    "Fetches weather data from the met office into weather.json"
+    return metoffice.update_weather()
+
+
+# the schedules of the previous cron jobs, the door closure is not delayed, and only retried once
+scheduler.register("planets", planets_job, [(10, 30)], retries=2, backoff=300)
+scheduler.register("iers", iers_job, [(9, 0)], weekdays=[5], jitter=300, retries=3, backoff=600)
+scheduler.register("door", door_job, [(10, 15)], retries=1, backoff=60)
+scheduler.register("weather", weather_job, [(9, 30), (16, 30)], jitter=120, retries=2, backoff=300)
+
+
+if __name__ == "__main__":
+
+    # a fresh installation has no local IERS or kernel files, fetch them now
+    if astro_data.local_file('iers_a') is None or astro_data.local_file('jpl') is None:
+        scheduler.start(scheduler.get_job("iers"), LOG_PREFIX, RCONN)
+
+    redis_ops.log_info(message="Job scheduler started", prefix=LOG_PREFIX, rconn=RCONN)
+    scheduler.run(LOG_PREFIX, RCONN)
@@ -7,7 +7,7 @@ of a container.
 The host server will use nginx to forward calls to this port 8000
 """
 
-import os, sys, random
+import os, sys, random, threading, importlib
 
 from skipole import WSGIApplication, FailPage, GoTo, ValidateError, ServerError, set_debug, use_submit_list, skis, PageData, SectionData
 
@@ -20,7 +20,7 @@ import indiredis
 PROJECTFILES = os.path.dirname(os.path.realpath(__file__))
 PROJECT = 'acremscope'
 
-from acremscope_packages import sun, database_ops, redis_ops, cfg
+from acremscope_packages import sun, database_ops, redis_ops, ident_token, indi_tracker, events, astro_centre, astro_data, cfg
 
 
 # set PROJECTFILES into cfg, used to specify where astrodata and contents can be found
@@ -34,6 +34,9 @@ redis_ip, redis_port, redis_auth = cfg.get_redis()
 REDISSERVER = redis_server(host=redis_ip, port=redis_port, db=0, password=redis_auth)
 
 
+# ensure database indexes used by the queries exist
+database_ops.create_indexes()
+
 # _IDENT_DATA is used as part of a key to store data within redis
 _IDENT_DATA = random.randrange(1, 9999)
 
@@ -200,6 +203,8 @@ def make_proj_data():
     """create a redis connection and sets of redis prefixes to keys
        to be used as proj_data"""
     rconn = redis_ops.open_redis(redis_db=0)
+    # the settings version, used to refresh cached database settings, is kept with the various prefix
+    database_ops.set_settings_redis("remscope_various_", rconn)
     return {'rconn': rconn,
             'rconn_0':"remscope_various_",  # should match prefix-key used in cron jobs which do any logging to redis
             'rconn_1':"remscope_logged_in_",
@@ -235,39 +240,68 @@ def start_call(called_ident, skicall):
 
     call_data = skicall.call_data
 
+    # ensure this process is following the INDI state, started on the first call
+    # rather than at import, so each forked worker process runs its own thread
+    indi_tracker.start(skicall.proj_data.get("rconn"), skicall.proj_data.get("redisserver"), skicall.proj_data.get("rconn_0"))
+
+    cookie_string = None
+    if skicall.received_cookies:
+        cookie_name = skicall.project + '2'
+        if cookie_name in skicall.received_cookies:
+            cookie_string = skicall.received_cookies[cookie_name]
+
+    ident_string = None
+    token_values = None
+    if ident_token.is_token(skicall.ident_data):
+        # the stored values are carried in the signed token itself
+        token_values = ident_token.read_token(skicall.ident_data)
+    elif skicall.ident_data and ('X' in skicall.ident_data):
+        ident_string = skicall.ident_data
+
+    # read the login, authentication, telescope control and stored values
+    # needed by this call from redis in a single pipelined round trip
+    call_values = redis_ops.get_call_values(cookie_string,
+                                            ident_string,
+                                            various_prefix=skicall.proj_data.get("rconn_0"),
+                                            login_prefix=skicall.proj_data.get("rconn_1"),
+                                            auth_prefix=skicall.proj_data.get("rconn_2"),
+                                            session_prefix=skicall.proj_data.get("rconn_4"),
+                                            rconn=skicall.proj_data.get("rconn"))
+
+    # the control state is kept for the page functions, see members.remscope.control_state
+    call_data['control_state'] = call_values.control_state
 
     ####### get planning parameters from ident_data #######
 
-    if skicall.ident_data and ('X' in skicall.ident_data):
-        # get stored values from redis and populate skicall.call_data['stored_values']
-        _get_stored_values(skicall, skicall.ident_data)
+    if token_values:
+        # populate skicall.call_data['stored_values']
+        _get_stored_values(skicall, token_values)
+    elif call_values.stored_values:
+        _get_stored_values(skicall, call_values.stored_values)
 
 
     ####### If the user is logged in, populate call_data
 
     user = None
-    if skicall.received_cookies:
-        cookie_name = skicall.project + '2'
-        if cookie_name in skicall.received_cookies:
-            cookie_string = skicall.received_cookies[cookie_name]
-            # so a recognised cookie has arrived, check redis to see if the user has logged in
-            user_id = redis_ops.logged_in(cookie_string, skicall.proj_data.get("rconn_1"), skicall.proj_data.get("rconn"))
-            if user_id:
-                user = database_ops.get_user_from_id(user_id)
-                # user is (username, role, email, member) on None on failure
-                if user:
-                    call_data['loggedin'] = True
-                    call_data['user_id'] =  user_id
-                    call_data['username'] = user[0]
-                    call_data['role'] = user[1]
-                    call_data['email'] = user[2]
-                    call_data['member'] = user[3]
-                    call_data['cookie'] = cookie_string
-                    if user[1] != 'ADMIN':
-                        call_data['authenticated'] = False
-                    else:
-                        # Is this user authenticated
-                        call_data['authenticated'] = redis_ops.is_authenticated(cookie_string, skicall.proj_data.get("rconn_2"), skicall.proj_data.get("rconn"))
+    if cookie_string:
+        # so a recognised cookie has arrived, check redis to see if the user has logged in
+        user_id = call_values.user_id
+        if user_id:
+            user = database_ops.get_user_from_id(user_id)
+            # user is (username, role, email, member) on None on failure
+            if user:
+                call_data['loggedin'] = True
+                call_data['user_id'] =  user_id
+                call_data['username'] = user[0]
+                call_data['role'] = user[1]
+                call_data['email'] = user[2]
+                call_data['member'] = user[3]
+                call_data['cookie'] = cookie_string
+                if user[1] != 'ADMIN':
+                    call_data['authenticated'] = False
+                else:
+                    # Is this user authenticated
+                    call_data['authenticated'] = call_values.authenticated
 
     ### Check the page being called
     page_num = called_ident[1]
@@ -305,8 +339,9 @@ def start_call(called_ident, skicall):
     rconn = skicall.proj_data.get("rconn")
 
     # get user who is currently controlling the telescope, if any
-    control_user_id = redis_ops.get_control_user(rconn_0, rconn)
-    test_mode_user_id = redis_ops.get_test_mode_user(rconn_0, rconn)
+    control_state = call_values.control_state
+    control_user_id = control_state.control_user_id
+    test_mode_user_id = call_values.test_mode_user_id
     # is the current slot live, and if so who owns it?
     slot_status = database_ops.get_slot_status(sun.Slot.now())
     if (slot_status is None) and (test_mode_user_id == user_id):
@@ -314,7 +349,8 @@ def start_call(called_ident, skicall):
         call_data["test_mode"] = True
         if control_user_id != user_id:
             # This sets the control user, and resets the chart view
-            redis_ops.set_control_user(user_id, rconn_0, rconn)
+            control_state.update(control_user_id=user_id, view=100.0, flip=False, rot=0.0)
+            control_state.save()
     elif slot_status is not None:
         # there is a current slot, which may or may not be booked
         status, booked_user_id = slot_status
@@ -324,7 +360,8 @@ def start_call(called_ident, skicall):
             # so is this booked user the control user?
             if control_user_id != booked_user_id:
                 # This sets the control user, and resets the chart view
-                redis_ops.set_control_user(booked_user_id, rconn_0, rconn)
+                control_state.update(control_user_id=booked_user_id, view=100.0, flip=False, rot=0.0)
+                control_state.save()
             # A booked user disables test mode
             if test_mode_user_id is not None:
                 redis_ops.delete_test_mode(rconn_0, rconn)
@@ -333,7 +370,8 @@ def start_call(called_ident, skicall):
             call_data["test_mode"] = True
             if control_user_id != user_id:
                 # This sets the control user, and resets the chart view
-                redis_ops.set_control_user(user_id, rconn_0, rconn)
+                control_state.update(control_user_id=user_id, view=100.0, flip=False, rot=0.0)
+                control_state.save()
 
     # If access is required to any of these pages, can now go to page
     if page_num in _LOGGED_IN_PAGES:
@@ -451,7 +489,7 @@ def end_call(page_ident, page_type, skicall):
     page_data = skicall.page_data
 
     # if skicall.call_data['set_values'] contains some data, then store it in redis
-    # and set the key as an ident_data
+    # and set the key as an ident_data, or set it as a signed token
     ident_data_key = _set_stored_values(skicall)
     if ident_data_key:
         page_data['ident_data'] = ident_data_key
@@ -539,13 +577,12 @@ def end_call(page_ident, page_type, skicall):
     return
 
 
-def _get_stored_values(skicall, key_string):
-    """Given a key_string, get stored values and insert them
+def _get_stored_values(skicall, value_list):
+    """Given the value_list read from redis, insert the stored values
        in a dictionary under skicall.call_data['stored_values']"""
 
     stored_values = skicall.call_data['stored_values']
 
-    value_list = redis_ops.get_session_value(key_string, skicall.proj_data.get("rconn_4"), skicall.proj_data.get("rconn"))
     if value_list:
         if value_list[0]:
             stored_values['starchart'] = value_list[0]
@@ -584,7 +621,8 @@ def _get_stored_values(skicall, key_string):
 
 
 def _set_stored_values(skicall):
-    "If items have been set into skicall.call_data['set_values'], store them in redis and return the key"
+    """If items have been set into skicall.call_data['set_values'], store them in redis and return the key,
+       or if cfg.ident_tokens() is True, return a signed token holding them"""
 
     global _IDENT_DATA
 
@@ -595,12 +633,6 @@ def _set_stored_values(skicall):
 
     set_values = skicall.call_data['set_values']
 
-    # generate a key, being a combination of incrementing _IDENT_DATA and a random number
-    _IDENT_DATA += 1
-    if _IDENT_DATA > 9999:
-        _IDENT_DATA = 1
-    ident_data_key = str(_IDENT_DATA) + "X" + str(random.randrange(10000, 99999))
-
     # create value_list to store in redis, up to 20 string items
     value_list = ['']*20
     if 'starchart_ident' in set_values:
@@ -636,7 +668,19 @@ def _set_stored_values(skicall):
     else:
         value_list[13] = '0'
 
-     
+    if cfg.ident_tokens():
+        # carry the values in a signed token, which needs no redis storage
+        token = ident_token.make_token(value_list)
+        if token:
+            return token
+        # token too long, so fall back to storing in redis
+
+    # generate a key, being a combination of incrementing _IDENT_DATA and a random number
+    _IDENT_DATA += 1
+    if _IDENT_DATA > 9999:
+        _IDENT_DATA = 1
+    ident_data_key = str(_IDENT_DATA) + "X" + str(random.randrange(10000, 99999))
+
     # and store these values in redis, under the ident_data_key
     redis_ops.set_session_value(ident_data_key, value_list, skicall.proj_data.get("rconn_4"), skicall.proj_data.get("rconn"))
     return ident_data_key
@@ -717,6 +761,24 @@ def _check_cookies(received_cookies, proj_data):
 
 
 
+# responder modules importing astropy, these are otherwise imported on their first call
+_ASTRONOMY_MODULES = ("acremscope_packages.stars",
+                      "acremscope_packages.members.remscope",
+                      "acremscope_packages.members.control",
+                      "acremscope_packages.public.planning")
+
+
+def _warm_up():
+    """Imports the responder modules which use astropy, and loads the observatory location,
+       ephemeris and earth rotation tables, called in a thread as the server starts"""
+    for module in _ASTRONOMY_MODULES:
+        try:
+            importlib.import_module(module)
+        except:
+            pass
+    astro_centre.warm_up()
+
+
 # create the wsgi application
 application = WSGIApplication(project=PROJECT,
                               projectfiles=PROJECTFILES,
@@ -734,6 +796,9 @@ application.add_project(skis_application, url='/acremscope/lib')
 indi_application = indiredis.make_wsgi_app(REDISSERVER, blob_folder=cfg.get_servedfiles_directory())
 application.add_project(indi_application, url='/acremscope/indi', check_cookies=_check_cookies)
 
+# serve the events stream at /acremscope/events, which pushes INDI changes to the control and sensors pages
+application = events.EventsApplication(application, url=events.URL, cookie_name=PROJECT + '2')
+
 
 if __name__ == "__main__":
 
@@ -746,11 +811,18 @@ if __name__ == "__main__":
     #                                                                              #
     ###############################################################################
 
+    # load the astronomy modules and observatory context in the background, so the
+    # server starts at once, and the first chart request need not wait for them
+    threading.Thread(target=_warm_up, name="warm_up", daemon=True).start()
+
+    # install the IERS and JPL kernel files when astrodata/IERS_A.py downloads new copies
+    astro_data.start_watcher()
+
     # Using the waitress server
     import waitress
 
-    # serve the application
-    waitress.serve(application, host="0.0.0.0", port=8000)
+    # serve the application, with a thread for each open event stream as well as the default four
+    waitress.serve(application, host="0.0.0.0", port=8000, threads=4+cfg.sse_clients())
 
 
 
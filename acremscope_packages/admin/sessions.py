@@ -5,6 +5,8 @@
 ########################################
 
 
+import hashlib
+
 from datetime import date, timedelta, datetime
 
 from skipole import FailPage, GoTo, ValidateError, ServerError
@@ -131,18 +133,27 @@ def _get_slot(string_sequence, call_data):
         raise FailPage("Invalid data")
     if sequence < 2 or sequence > 21:
         raise FailPage("Invalid data")
-    slot = sun.Slot(call_data['startday'], sequence)
+    slot = sun.night_calendar(call_data['startday']).slot(sequence)
     if slot.in_daylight():
         raise FailPage("Invalid data")
     return slot
 
 
-def list_slots(skicall):
-    "Lists slots for the night, for admin users"
+def list_slots(skicall, con=None):
+    """Lists slots for the night, for admin users, if con is given, the slots
+       are read with that database connection, which is left open"""
 
     call_data = skicall.call_data
     page_data = skicall.page_data
 
+    if con is None:
+        con = database_ops.open_database()
+        try:
+            list_slots(skicall, con)
+        finally:
+            database_ops.close_database(con)
+        return
+
     # Get the day being edited, either from get_fields
     # or previously calculated and set into call_data['startday']
 
@@ -182,79 +193,78 @@ def list_slots(skicall):
     # col0_classes is a list of classes for the text column
     col0_classes = []
 
-    con = database_ops.open_database()
-    try:
-
-        sessions_enabled = database_ops.get_sessions(con)
+    sessions_enabled = database_ops.get_sessions(con)
 
-        for slot in slots:
+    # get the status of all the slots of the night with one query
+    slots_status = database_ops.get_slots_status([slot.starttime for slot in slots], con)
+    if slots_status is None:
+        raise FailPage("Unable to get slot info from database")
 
-            but1 = False
-            but2 = False
-            but3 = False
-            but4 = False
+    for slot in slots:
 
-            column_text = str(slot)
-            status, user_id = database_ops.get_slot_status(slot, con)
+        but1 = False
+        but2 = False
+        but3 = False
+        but4 = False
 
-            if now_15 > slot.endtime:
-                # slot has passed, tests now_15 rather than now, so slot is considered
-                # past when it only has 15 or less minutes to go, cannot be booked, enabled or disabled
-                col0_classes.append('w3-grey')
-                column_text = column_text + " Past"
-            elif not status:
-                if sessions_enabled:
-                    # session available, but can be booked or disabled
-                    col0_classes.append('w3-green')
-                    but3 = True
-                    but4 = True
-                else:
-                    # session disabled
-                    col0_classes.append('w3-grey')
-                    column_text = column_text + " Disabled"
-            elif status == 1:
-                # session booked
-                col0_classes.append('w3-red')
-                # can be freed
-                but1 = True
-                # get the username
-                user = database_ops.get_user_from_id(user_id, con)
-                if user is not None:
-                    username, role, email, member = user
-                    column_text = column_text + " Booked by: " + username
-                    if member:
-                        if role == 'MEMBER':
-                            column_text = column_text + " Member: " + member
-                        elif role == 'GUEST':
-                            column_text = column_text + " Guest: " + member
-                        elif role == 'ADMIN':
-                            column_text = column_text + " Admin: " + member
+        column_text = str(slot)
+        if slot.starttime in slots_status:
+            status, user_id, username, role, member = slots_status[slot.starttime]
+        else:
+            status, username, role, member = 0, None, None, None
+
+        if now_15 > slot.endtime:
+            # slot has passed, tests now_15 rather than now, so slot is considered
+            # past when it only has 15 or less minutes to go, cannot be booked, enabled or disabled
+            col0_classes.append('w3-grey')
+            column_text = column_text + " Past"
+        elif not status:
+            if sessions_enabled:
+                # session available, but can be booked or disabled
+                col0_classes.append('w3-green')
+                but3 = True
+                but4 = True
             else:
                 # session disabled
                 col0_classes.append('w3-grey')
                 column_text = column_text + " Disabled"
-                if sessions_enabled:
-                    # can enable it
-                    but2 = True
-
+        elif status == 1:
+            # session booked
+            col0_classes.append('w3-red')
+            # can be freed
+            but1 = True
+            if username is not None:
+                column_text = column_text + " Booked by: " + username
+                if member:
+                    if role == 'MEMBER':
+                        column_text = column_text + " Member: " + member
+                    elif role == 'GUEST':
+                        column_text = column_text + " Guest: " + member
+                    elif role == 'ADMIN':
+                        column_text = column_text + " Admin: " + member
+        else:
+            # session disabled
+            col0_classes.append('w3-grey')
+            column_text = column_text + " Disabled"
+            if sessions_enabled:
+                # can enable it
+                but2 = True
 
 
-            str_seq = str(slot.sequence)
 
-            row = [column_text, 
-                   str_seq,
-                   str_seq,
-                   str_seq,
-                   str_seq,
-                   but1,
-                   but2,
-                   but3,
-                   but4 ]
+        str_seq = str(slot.sequence)
 
-            contents.append(row)
+        row = [column_text, 
+               str_seq,
+               str_seq,
+               str_seq,
+               str_seq,
+               but1,
+               but2,
+               but3,
+               but4 ]
 
-    finally:
-        database_ops.close_database(con)
+        contents.append(row)
 
     page_data['slots', 'contents'] = contents
     page_data['slots', 'col0_classes'] = col0_classes
@@ -327,6 +337,156 @@ def disable_slot(skicall):
     list_slots(skicall)
 
 
+def _future_starttimes(startday, lastday):
+    "Return list of starttimes of the night slots from startday to lastday which have not passed"
+    now_15 = datetime.utcnow() + timedelta(minutes=15)
+    starttimes = []
+    night = startday
+    while night <= lastday:
+        starttimes.extend(slot.starttime for slot in sun.night_slots(night) if slot.endtime >= now_15)
+        night += timedelta(days=1)
+    return starttimes
+
+
+def _bulk_starttimes(call_data, to_lastday):
+    """Return the starttimes of the slots, which have not passed, of the night being edited,
+       or if to_lastday is True, of every night from it to the last day which can be administered"""
+    # Get the day, sent by ident_data
+    if call_data['stored_values']['session_date']:
+        startday_string = call_data['stored_values']['session_date'].replace('_','-')
+    else:
+        raise FailPage("Invalid date")
+    startday = _get_startday(startday_string, call_data)
+    call_data["startday"] = startday
+    if to_lastday:
+        return _future_starttimes(startday, call_data['lastday'])
+    return _future_starttimes(startday, startday)
+
+
+def _bookings(slots_status):
+    "Return a list of (starttime, (status, user_id, username, role, member)) of the booked slots, in time order"
+    return sorted((starttime, status) for starttime, status in slots_status.items() if status[0] == 1)
+
+
+def _fingerprint(bookings):
+    "Return a string identifying the (starttime, user_id) pairs of the bookings"
+    pairs = ";".join(starttime.isoformat() + "," + str(status[1]) for starttime, status in bookings)
+    return hashlib.sha256(pairs.encode('utf-8')).hexdigest()[:32]
+
+
+def _bulk_slots(skicall, operation, to_lastday=False):
+    """Applies operation, one of database_ops.disable_slots, enable_slots or free_slots, to the slots of
+       the night being edited, or if to_lastday is True, to every night from it to the last day which can
+       be administered, and then lists the slots, all within one transaction"""
+
+    call_data = skicall.call_data
+    starttimes = _bulk_starttimes(call_data, to_lastday)
+
+    con = database_ops.open_database()
+    try:
+        if operation is database_ops.free_slots:
+            # the bookings shown on the confirm page, which must not have changed
+            slots_status = database_ops.get_slots_status(starttimes, con)
+            if slots_status is None:
+                raise FailPage("Database Error")
+            bookings = _bookings(slots_status)
+            if (not bookings) or (_fingerprint(bookings) != call_data['confirm','get_field1']):
+                raise FailPage("The bookings have changed, please check and confirm again")
+            # and only these are freed
+            starttimes = [starttime for starttime, status in bookings]
+        else:
+            sessions = database_ops.get_sessions(con)
+            if sessions is None:
+                raise FailPage("Database Error")
+            if not sessions:
+                raise FailPage("Sessions are disabled")
+        if not operation(starttimes, con):
+            raise FailPage("Database Error")
+        con.commit()
+        # and list the slots, using the same connection
+        list_slots(skicall, con)
+    finally:
+        database_ops.close_database(con)
+
+
+def disable_night(skicall):
+    "Disables all free slots of the night"
+    _bulk_slots(skicall, database_ops.disable_slots)
+
+
+def disable_range(skicall):
+    "Disables all free slots from this night to the last day which can be administered"
+    _bulk_slots(skicall, database_ops.disable_slots, to_lastday=True)
+
+
+def enable_night(skicall):
+    "Enables all disabled slots of the night"
+    _bulk_slots(skicall, database_ops.enable_slots)
+
+
+def enable_range(skicall):
+    "Enables all disabled slots from this night to the last day which can be administered"
+    _bulk_slots(skicall, database_ops.enable_slots, to_lastday=True)
+
+
+def _confirm_free(skicall, to_lastday):
+    "Fills in the confirm page with the bookings which will be freed"
+
+    call_data = skicall.call_data
+    page_data = skicall.page_data
+
+    starttimes = _bulk_starttimes(call_data, to_lastday)
+    slots_status = database_ops.get_slots_status(starttimes)
+    if slots_status is None:
+        raise FailPage("Unable to get slot info from database")
+    bookings = _bookings(slots_status)
+    if not bookings:
+        raise FailPage("There are no bookings to free")
+
+    startday = call_data["startday"]
+    if to_lastday:
+        page_data['timeslot', 'para_text'] = "Nights from " + startday.strftime("%A %B %d, %Y") + " to " + call_data['lastday'].strftime("%A %B %d, %Y")
+    else:
+        page_data['timeslot', 'para_text'] = "Night of " + startday.strftime("%A %B %d, %Y")
+
+    lines = []
+    for starttime, (status, user_id, username, role, member) in bookings:
+        line = starttime.strftime("%a %d %b %H:%M") + "  Username: " + str(username)
+        if member:
+            line = line + "  Member: " + member
+        lines.append(line)
+    lines.append("")
+    lines.append("Please confirm you wish to free these %s sessions." % len(bookings))
+    page_data['user', 'para_text'] = "\n".join(lines)
+    # identifies the bookings listed, checked again when they are freed
+    page_data['confirm', 'get_field1'] = _fingerprint(bookings)
+    if to_lastday:
+        page_data['confirm', 'link_ident'] = "free_range"
+    else:
+        page_data['confirm', 'link_ident'] = "free_night"
+    call_data['set_values']["session_date_ident"] = startday.isoformat().replace('-','_')
+
+
+def confirm_free_night(skicall):
+    "Lists the bookings of the night, and asks for confirmation before freeing them"
+    _confirm_free(skicall, to_lastday=False)
+
+
+def confirm_free_range(skicall):
+    "Lists the bookings from this night on, and asks for confirmation before freeing them"
+    _confirm_free(skicall, to_lastday=True)
+
+
+def free_night(skicall):
+    "Frees all booked slots of the night, after confirmation"
+    _bulk_slots(skicall, database_ops.free_slots)
+
+
+def free_range(skicall):
+    "Frees all booked slots from this night to the last day which can be administered, after confirmation"
+    _bulk_slots(skicall, database_ops.free_slots, to_lastday=True)
+
+
 def enable_slot(skicall):
     "Enables a slot"
 
@@ -485,8 +645,9 @@ def confirm_book_slot(skicall):
 
 
 
-def show_book_users_page(page_data, slot, offset=0, names=True):
-    """Fills in  table ordered by name or membership number"""
+def show_book_users_page(page_data, slot, page_key='', names=True):
+    """Fills in  table ordered by name or membership number
+       page_key is '' for the first page, or a key given by database_ops.get_users_page"""
 
     #  users,contents: 
     #  col 0 and 1 are the text strings to place in the first two columns,
@@ -494,7 +655,6 @@ def show_book_users_page(page_data, slot, offset=0, names=True):
 
     contents = []
     rows = 10
-    getrows = rows+5
     seq = str(slot.sequence)
     _seq = '_' + str(slot.sequence)
 
@@ -513,44 +673,27 @@ def show_book_users_page(page_data, slot, offset=0, names=True):
         page_data['next', 'link_ident'] = 'members'
         page_data['previous', 'link_ident'] = 'members'
 
-    # get_users returns user_id, username, role, membership number
+    # get_users_page returns a list of user_id, username, role, membership number
+    # and the keys of this, the next and the previous pages
 
-    if not offset:
-        u_list = database_ops.get_users(limit=getrows, names=names)
-        if len(u_list) == getrows:
-            u_list = u_list[:-5]
-            page_data['next', 'get_field1'] = rows
-            page_data['next', 'get_field2'] = seq
-        else:
-            page_data['next', 'show'] = False
-        for u in u_list:
-            user_row = [u[1], u[3], str(u[0]) + _seq ]
-            contents.append(user_row)
-        page_data['users', 'contents'] = contents
-        # no previous button
-        page_data['previous', 'show'] = False
-        return
-    # so an offset is given
-    u_list = database_ops.get_users(limit=getrows, offset=offset, names=names)
-    if len(u_list) == getrows:
-        u_list = u_list[:-5]
-        page_data['next', 'get_field1'] = offset + rows
-        page_data['next', 'get_field2'] = seq
-    else:
-        page_data['next', 'show'] = False
-    str_offset = str(offset)
+    u_page = database_ops.get_users_page(page_key, rows=rows, names=names)
+    if u_page is None:
+        raise FailPage("Database access error")
+    u_list, this_key, next_key, previous_key = u_page
     for u in u_list:
         user_row = [u[1], u[3], str(u[0]) + _seq]
         contents.append(user_row)
     page_data['users', 'contents'] = contents
-    # set previous button
-    if offset == 0:
+    # set next and previous buttons
+    if next_key is None:
+        page_data['next', 'show'] = False
+    else:
+        page_data['next', 'get_field1'] = next_key
+        page_data['next', 'get_field2'] = seq
+    if previous_key is None:
         page_data['previous', 'show'] = False
-    elif offset < rows:
-        page_data['previous', 'get_field1'] = 0
-        page_data['previous', 'get_field2'] = seq
     else:
-        page_data['previous', 'get_field1'] = offset - rows
+        page_data['previous', 'get_field1'] = previous_key
         page_data['previous', 'get_field2'] = seq
 
 
@@ -577,7 +720,7 @@ def book_users(skicall):
 
     page_data['timeslot', 'para_text'] = slot.starttime.strftime("%A %B %d, %Y") + "\n" + str(slot)
 
-    show_book_users_page(page_data, slot, offset=0, names=True)
+    show_book_users_page(page_data, slot, names=True)
 
     call_data['set_values']["session_date_ident"] = call_data["startday"].isoformat().replace('-','_')
 
@@ -605,7 +748,7 @@ def book_members(skicall):
 
     page_data['timeslot', 'para_text'] = slot.starttime.strftime("%A %B %d, %Y") + "\n" + str(slot)
 
-    show_book_users_page(page_data, slot, offset=0, names=False)
+    show_book_users_page(page_data, slot, names=False)
 
     call_data['set_values']["session_date_ident"] = call_data["startday"].isoformat().replace('-','_')
 
@@ -689,20 +832,14 @@ def next_users(skicall):
     slot = _get_slot(seq, call_data)
 
     if (('next', 'get_field1') in call_data) and call_data['next', 'get_field1']:
-        try:
-            offset = int(call_data['next', 'get_field1'])
-        except:
-            offset = 0
+        page_key = call_data['next', 'get_field1']
     elif (('previous', 'get_field1') in call_data) and call_data['previous', 'get_field1']:
-        try:
-            offset = int(call_data['previous', 'get_field1'])
-        except:
-            offset = 0
+        page_key = call_data['previous', 'get_field1']
     else:
-        offset = 0
+        page_key = ''
 
     page_data['timeslot', 'para_text'] = slot.starttime.strftime("%A %B %d, %Y") + "\n" + str(slot)
-    show_book_users_page(page_data, slot, offset=offset, names=True)
+    show_book_users_page(page_data, slot, page_key=page_key, names=True)
     call_data['set_values']["session_date_ident"] = call_data["startday"].isoformat().replace('-','_')
 
 
@@ -729,20 +866,14 @@ def next_members(skicall):
     slot = _get_slot(seq, call_data)
 
     if (('next', 'get_field1') in call_data) and call_data['next', 'get_field1']:
-        try:
-            offset = int(call_data['next', 'get_field1'])
-        except:
-            offset = 0
+        page_key = call_data['next', 'get_field1']
     elif (('previous', 'get_field1') in call_data) and call_data['previous', 'get_field1']:
-        try:
-            offset = int(call_data['previous', 'get_field1'])
-        except:
-            offset = 0
+        page_key = call_data['previous', 'get_field1']
     else:
-        offset = 0
+        page_key = ''
 
     page_data['timeslot', 'para_text'] = slot.starttime.strftime("%A %B %d, %Y") + "\n" + str(slot)
-    show_book_users_page(page_data, slot, offset=offset, names=False)
+    show_book_users_page(page_data, slot, page_key=page_key, names=False)
     call_data['set_values']["session_date_ident"] = call_data["startday"].isoformat().replace('-','_')
 
 
@@ -264,9 +264,10 @@ Please log on and change the password as soon as possible.""" % (org_name, newus
 
 
 
-def show_edit_users_page(page_data, offset=0, names=True):
+def show_edit_users_page(page_data, page_key='', names=True):
     """Fills in editusers index page, populates table ordered by name or membership number
-          Called by multiple functions in this module to re-fill the page after an edit operation"""
+          Called by multiple functions in this module to re-fill the page after an edit operation
+          page_key is '' for the first page, or a key given by database_ops.get_users_page"""
 
     #      The users,contents widgfield is a list of lists to fill the table
     #               col 0, 1 and 2 is the text to place in the first three columns,
@@ -276,7 +277,6 @@ def show_edit_users_page(page_data, offset=0, names=True):
     #               col 8 - True if the second button and link is to be shown, False if not
     contents = []
     rows = 10
-    getrows = rows+5
 
     # table can be ordered by name or membership number
 
@@ -295,51 +295,35 @@ def show_edit_users_page(page_data, offset=0, names=True):
         page_data['users', 'link_ident2'] = 'confirm_delete_member'
         page_data['users', 'json_ident2'] = 'json_confirm_delete_member'
 
-    if not offset:
-        u_list = database_ops.get_users(limit=getrows, names=names)
-        if len(u_list) == getrows:
-            u_list = u_list[:-5]
-            page_data['next', 'get_field1'] = rows
-        else:
-            page_data['next', 'show'] = False
-        for u in u_list:
-            user_row = [u[1], u[2], u[3], u[0], '', u[0], '0', True, True]
-            contents.append(user_row)
-        page_data['users', 'contents'] = contents
-        # no previous button
-        page_data['previous', 'show'] = False
-        return
-    # so an offset is given
-    u_list = database_ops.get_users(limit=getrows, offset=offset, names=names)
-    if len(u_list) == getrows:
-        u_list = u_list[:-5]
-        page_data['next', 'get_field1'] = offset + rows
-    else:
-        page_data['next', 'show'] = False
-    str_offset = str(offset)
+    u_page = database_ops.get_users_page(page_key, rows=rows, names=names)
+    if u_page is None:
+        raise FailPage("Database access error")
+    u_list, this_key, next_key, previous_key = u_page
     for u in u_list:
-        user_row = [u[1], u[2], u[3], u[0], '', u[0], str_offset, True, True]
+        user_row = [u[1], u[2], u[3], u[0], '', u[0], this_key, True, True]
         contents.append(user_row)
     page_data['users', 'contents'] = contents
-    # set previous button
-    if offset == 0:
+    # set next and previous buttons
+    if next_key is None:
+        page_data['next', 'show'] = False
+    else:
+        page_data['next', 'get_field1'] = next_key
+    if previous_key is None:
         page_data['previous', 'show'] = False
-    elif offset < rows:
-        page_data['previous', 'get_field1'] = 0
     else:
-        page_data['previous', 'get_field1'] = offset - rows
+        page_data['previous', 'get_field1'] = previous_key
 
 
 def edit_users(skicall):
     "Fills in editusers index page, populates table ordered by name"
     # Called by responder 3040
-    show_edit_users_page(skicall.page_data, offset=0, names=True)
+    show_edit_users_page(skicall.page_data, names=True)
 
 
 def edit_members(skicall):
     "Fills in editusers index page, populates table ordered by membership number"
     # Called by responder 3050
-    show_edit_users_page(skicall.page_data, offset=0, names=False)
+    show_edit_users_page(skicall.page_data, names=False)
 
 
 def next_users(skicall):
@@ -350,18 +334,12 @@ def next_users(skicall):
 
     # Called by responder 3041
     if (('next', 'get_field1') in call_data) and call_data['next', 'get_field1']:
-        try:
-            offset = int(call_data['next', 'get_field1'])
-        except:
-            offset = 0
+        page_key = call_data['next', 'get_field1']
     elif (('previous', 'get_field1') in call_data) and call_data['previous', 'get_field1']:
-        try:
-            offset = int(call_data['previous', 'get_field1'])
-        except:
-            offset = 0
+        page_key = call_data['previous', 'get_field1']
     else:
-        offset = 0
-    show_edit_users_page(page_data, offset=offset, names=True)
+        page_key = ''
+    show_edit_users_page(page_data, page_key=page_key, names=True)
 
 
 def next_members(skicall):
@@ -372,18 +350,12 @@ def next_members(skicall):
 
     # Called by responder 3051
     if (('next', 'get_field1') in call_data) and call_data['next', 'get_field1']:
-        try:
-            offset = int(call_data['next', 'get_field1'])
-        except:
-            offset = 0
+        page_key = call_data['next', 'get_field1']
     elif (('previous', 'get_field1') in call_data) and call_data['previous', 'get_field1']:
-        try:
-            offset = int(call_data['previous', 'get_field1'])
-        except:
-            offset = 0
+        page_key = call_data['previous', 'get_field1']
     else:
-        offset = 0
-    show_edit_users_page(page_data, offset=offset, names=False)
+        page_key = ''
+    show_edit_users_page(page_data, page_key=page_key, names=False)
 
 
 def confirm_delete_user(skicall):
@@ -401,16 +373,16 @@ def confirm_delete_user(skicall):
     if user is None:
         raise FailPage("User ID not recognised.")
     if ('users', 'get_field2_2') in call_data:
-        offset = int(call_data['users', 'get_field2_2'])
+        page_key = call_data['users', 'get_field2_2']
     else:
-        offset=0
-    show_edit_users_page(page_data, offset=offset, names=True)
+        page_key = ''
+    show_edit_users_page(page_data, page_key=page_key, names=True)
     page_data['confirm', 'hide'] = False
     page_data['confirm', 'para_text'] = "Confirm delete user %s" % user[0]
     page_data['confirm','get_field1_1'] = 'username'
-    page_data['confirm','get_field1_2'] = str(offset)
+    page_data['confirm','get_field1_2'] = page_key
     page_data['confirm','get_field2_1'] = 'username'
-    page_data['confirm','get_field2_2'] = str(offset)
+    page_data['confirm','get_field2_2'] = page_key
     page_data['confirm','get_field2_3'] = str(user_id)
 
 
@@ -429,19 +401,16 @@ def confirm_delete_member(skicall):
     if user is None:
         raise FailPage("User ID not recognised.")
     if ('users', 'get_field2_2') in call_data:
-        try:
-            offset = int(call_data['users', 'get_field2_2'])
-        except:
-            offset = 0
+        page_key = call_data['users', 'get_field2_2']
     else:
-        offset = 0
-    show_edit_users_page(page_data, offset=offset, names=False)
+        page_key = ''
+    show_edit_users_page(page_data, page_key=page_key, names=False)
     page_data['confirm', 'hide'] = False
     page_data['confirm', 'para_text'] = "Confirm delete user %s" % user[0]
     page_data['confirm','get_field1_1'] = 'member'
-    page_data['confirm','get_field1_2'] = str(offset)
+    page_data['confirm','get_field1_2'] = page_key
     page_data['confirm','get_field2_1'] = 'member'
-    page_data['confirm','get_field2_2'] = str(offset)
+    page_data['confirm','get_field2_2'] = page_key
     page_data['confirm','get_field2_3'] = str(user_id)
 
 
@@ -460,15 +429,15 @@ def json_confirm_delete_user(skicall):
     if user is None:
         raise FailPage("User ID not recognised.")
     if ('users', 'get_field2_2') in call_data:
-        offset = int(call_data['users', 'get_field2_2'])
+        page_key = call_data['users', 'get_field2_2']
     else:
-        offset=0
+        page_key = ''
     page_data['confirm', 'hide'] = False
     page_data['confirm', 'para_text'] = "Confirm delete user %s" % user[0]
     page_data['confirm','get_field1_1'] = 'username'
-    page_data['confirm','get_field1_2'] = str(offset)
+    page_data['confirm','get_field1_2'] = page_key
     page_data['confirm','get_field2_1'] = 'username'
-    page_data['confirm','get_field2_2'] = str(offset)
+    page_data['confirm','get_field2_2'] = page_key
     page_data['confirm','get_field2_3'] = str(user_id)
 
 
@@ -487,18 +456,15 @@ def json_confirm_delete_member(skicall):
     if user is None:
         raise FailPage("User ID not recognised.")
     if ('users', 'get_field2_2') in call_data:
-        try:
-            offset = int(call_data['users', 'get_field2_2'])
-        except:
-            offset = 0
+        page_key = call_data['users', 'get_field2_2']
     else:
-        offset = 0
+        page_key = ''
     page_data['confirm', 'hide'] = False
     page_data['confirm', 'para_text'] = "Confirm delete user %s" % user[0]
     page_data['confirm','get_field1_1'] = 'member'
-    page_data['confirm','get_field1_2'] = str(offset)
+    page_data['confirm','get_field1_2'] = page_key
     page_data['confirm','get_field2_1'] = 'member'
-    page_data['confirm','get_field2_2'] = str(offset)
+    page_data['confirm','get_field2_2'] = page_key
     page_data['confirm','get_field2_3'] = str(user_id)
 
 
@@ -517,13 +483,10 @@ def cancel_delete(skicall):
     else:
         names=True
     if ('confirm','get_field1_2') in call_data:
-        try:
-            offset = int(call_data['confirm','get_field1_2'])
-        except:
-            offset=0
+        page_key = call_data['confirm','get_field1_2']
     else:
-        offset=0
-    show_edit_users_page(page_data, offset=offset, names=names)
+        page_key = ''
+    show_edit_users_page(page_data, page_key=page_key, names=names)
 
 
 def delete_user(skicall):
@@ -559,13 +522,10 @@ def delete_user(skicall):
     else:
         names=True
     if ('confirm','get_field2_2') in call_data:
-        try:
-            offset = int(call_data['confirm','get_field2_2'])
-        except:
-            offset=0
+        page_key = call_data['confirm','get_field2_2']
     else:
-        offset=0
-    show_edit_users_page(page_data, offset=offset, names=names)
+        page_key = ''
+    show_edit_users_page(page_data, page_key=page_key, names=names)
 
 
 def edituser(skicall):
@@ -0,0 +1,86 @@
+####################################################
+#
+# The astronomy centre context, created once in each process
+# and shared by every call, holding the observatory EarthLocation,
+# the astroplan Observer, and with the jpl solar system ephemeris
+# set into astropy, rather than these being created within each
+# function call.
+#
+# warm_up() is called as the web service starts, so the first
+# chart request does not wait for the kernel and tables to load.
+#
+####################################################
+
+
+import threading
+
+from datetime import datetime, timezone
+
+from .cfg import observatory
+from . import astro_data
+
+
+_LOCK = threading.Lock()
+
+_LOCATION = None
+
+_OBSERVER = None
+
+# set True once the jpl ephemeris is set, which loads the kernel
+_JPL = False
+
+
+def centre_location():
+    "Returns the EarthLocation of the astronomy centre"
+    global _LOCATION
+    if _LOCATION is None:
+        # astropy is set to use the local IERS and kernel files before its first use
+        astro_data.configure()
+        from astropy.coordinates import EarthLocation
+        longitude, latitude, elevation = observatory()
+        _LOCATION = EarthLocation.from_geodetic(longitude, latitude, elevation)
+    return _LOCATION
+
+
+def centre_observer():
+    "Returns the astroplan Observer of the astronomy centre"
+    global _OBSERVER
+    if _OBSERVER is None:
+        from astroplan import Observer
+        _OBSERVER = Observer(location=centre_location(), name="centre_observer", timezone="utc")
+    return _OBSERVER
+
+
+def centre_altaz(obstime):
+    "Returns an AltAz frame at the astronomy centre for the given astropy Time"
+    from astropy.coordinates import AltAz
+    return AltAz(obstime=obstime, location=centre_location())
+
+
+def use_jpl():
+    """Sets the astropy solar system ephemeris to the local jpl kernel, the kernel is only loaded on the first call,
+       if there is no local kernel, astropy's cached jpl kernel is used, or failing that the builtin ephemeris"""
+    global _JPL
+    if _JPL:
+        return
+    with _LOCK:
+        if _JPL:
+            return
+        from astropy.coordinates import solar_system_ephemeris
+        solar_system_ephemeris.set(astro_data.ephemeris())
+        _JPL = True
+
+
+def warm_up():
+    """Creates the location and observer, loads the jpl kernel and the earth rotation
+       tables by calculating a planet position, returns True on success, False on failure"""
+    try:
+        from astropy.coordinates import get_body
+        from astropy.time import Time
+        use_jpl()
+        centre_observer()
+        now = Time(datetime.now(timezone.utc), format='datetime', scale='utc')
+        get_body('jupiter', now, centre_location()).transform_to(centre_altaz(now))
+    except:
+        return False
+    return True
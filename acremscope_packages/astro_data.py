@@ -0,0 +1,237 @@
+####################################################
+#
+# Keeps versioned local copies of the IERS bulletin A table and the
+# JPL solar system kernel in the astrodata/astropy_data directory,
+# and configures astropy to use only these, so a request is never
+# held while astropy downloads or refreshes its data.
+#
+# refresh() downloads new copies, it is called by astrodata/IERS_A.py
+# and not by the web service. Each download is written to a new versioned
+# file, and then manifest.json, naming the current files, is replaced
+# atomically, so a reader always sees a complete set.
+#
+# configure() is called on the first use of astropy, and sets the
+# current files into astropy, with automatic downloads disabled.
+# start_watcher() runs a thread in the web service which installs
+# new files when the manifest changes.
+#
+# The kernel is opened by jplephem, which memory maps the file, so every
+# process using the same kernel file shares one copy in memory.
+#
+####################################################
+
+
+import os, json, shutil, threading, time
+
+from datetime import datetime
+
+from .cfg import get_astropy_data_directory, iers_max_age
+
+
+_LOCK = threading.Lock()
+
+_MANIFEST = "manifest.json"
+
+# the number of versions of each file kept, including the current one
+_KEEP = 2
+
+# the modification time of the manifest installed into astropy, None if not yet configured
+_INSTALLED = None
+
+# set True once the jpl ephemeris is wanted, so a new kernel is then set into astropy
+_WANT_JPL = False
+
+
+def _manifest_path():
+    return os.path.join(get_astropy_data_directory(), _MANIFEST)
+
+
+def read_manifest():
+    "Returns the manifest dictionary, empty if there is none"
+    try:
+        with open(_manifest_path()) as f:
+            return json.load(f)
+    except:
+        return {}
+
+
+def _write_manifest(manifest):
+    "Writes the manifest atomically"
+    path = _manifest_path()
+    tempfile = path + ".tmp"
+    with open(tempfile, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tempfile, path)
+
+
+def local_file(name):
+    "Returns the path of the current local file for name, 'iers_a' or 'jpl', or None if there is none"
+    entry = read_manifest().get(name)
+    if entry:
+        path = os.path.join(get_astropy_data_directory(), entry['file'])
+        if os.path.isfile(path):
+            return path
+
+
+def _jpl_url():
+    "Returns the url of the kernel astropy uses for the 'jpl' ephemeris"
+    from astropy.coordinates.solar_system import DEFAULT_JPL_EPHEMERIS
+    return f"https://naif.jpl.nasa.gov/pub/naif/generic_kernels/spk/planets/{DEFAULT_JPL_EPHEMERIS.lower()}.bsp"
+
+
+def ephemeris():
+    """Returns the value to set as the astropy solar system ephemeris, the local kernel,
+       or if there is none, 'jpl' if astropy already has it cached, otherwise 'builtin'"""
+    global _WANT_JPL
+    configure()
+    _WANT_JPL = True
+    path = local_file('jpl')
+    if path:
+        return path
+    from astropy.utils.data import is_url_in_cache
+    if is_url_in_cache(_jpl_url()):
+        return 'jpl'
+    return 'builtin'
+
+
+def _install():
+    "Sets the current local files into astropy"
+    global _INSTALLED
+    from astropy.utils import iers
+    # never download at request time, and warn rather than fail for times beyond the table
+    iers.conf.auto_download = False
+    iers.conf.iers_degraded_accuracy = 'warn'
+    try:
+        mtime = os.stat(_manifest_path()).st_mtime
+    except:
+        mtime = 0
+    path = local_file('iers_a')
+    if path:
+        iers.earth_orientation_table.set(iers.IERS_A.open(path))
+    if _WANT_JPL:
+        # a new kernel, once the ephemeris is in use
+        from astropy.coordinates import solar_system_ephemeris
+        kernel = local_file('jpl')
+        if kernel and solar_system_ephemeris.get() != kernel:
+            solar_system_ephemeris.set(kernel)
+    _INSTALLED = mtime
+
+
+def configure():
+    "Configures astropy to use the local files, only acts on the first call"
+    if _INSTALLED is not None:
+        return
+    with _LOCK:
+        if _INSTALLED is None:
+            _install()
+
+
+def check():
+    "Installs the local files if the manifest has changed since they were installed, returns True if installed"
+    try:
+        mtime = os.stat(_manifest_path()).st_mtime
+    except:
+        return False
+    with _LOCK:
+        if mtime == _INSTALLED:
+            return False
+        try:
+            _install()
+        except:
+            return False
+    return True
+
+
+def _watch(interval):
+    while True:
+        time.sleep(interval)
+        check()
+
+
+def start_watcher(interval=600):
+    "Starts a thread which checks the manifest every interval seconds, installing new files"
+    threading.Thread(target=_watch, args=(interval,), name="astro_data", daemon=True).start()
+
+
+def _download(url, filename, validate=None):
+    "Downloads url into a new versioned file, returns the file name"
+    from astropy.utils.data import download_file
+    directory = get_astropy_data_directory()
+    stem, ext = os.path.splitext(filename)
+    versioned = f"{stem}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}{ext}"
+    downloaded = download_file(url, cache=False, show_progress=False)
+    path = os.path.join(directory, versioned)
+    shutil.move(downloaded, path + ".tmp")
+    if validate is not None:
+        try:
+            validate(path + ".tmp")
+        except:
+            os.remove(path + ".tmp")
+            raise
+    os.replace(path + ".tmp", path)
+    return versioned
+
+
+def _validate_kernel(path):
+    "Raises an exception if the file is not a readable kernel"
+    from jplephem.spk import SPK
+    SPK.open(path).close()
+
+
+def _prune(manifest):
+    "Removes old versions, keeping the most recent of each file"
+    directory = get_astropy_data_directory()
+    for name, entry in manifest.items():
+        versions = entry.get('versions', [])
+        for old in versions[_KEEP:]:
+            try:
+                os.remove(os.path.join(directory, old))
+            except:
+                pass
+        entry['versions'] = versions[:_KEEP]
+
+
+def refresh():
+    """Downloads a new IERS bulletin A if the local copy is older than cfg iers_max_age days,
+       and the JPL kernel if there is no local copy, returns a message of the result"""
+    from astropy.utils import iers
+    os.makedirs(get_astropy_data_directory(), exist_ok=True)
+    manifest = read_manifest()
+    messages = []
+    changed = False
+    now = datetime.utcnow()
+
+    entry = manifest.get('iers_a')
+    if (not entry) or (local_file('iers_a') is None) or ((now - datetime.fromisoformat(entry['downloaded'])).days >= iers_max_age()):
+        for url in (iers.IERS_A_URL, iers.IERS_A_URL_MIRROR):
+            try:
+                versioned = _download(url, "finals2000A.all", validate=iers.IERS_A.open)
+            except:
+                continue
+            versions = [versioned] + (entry['versions'] if entry else [])
+            manifest['iers_a'] = {'file':versioned, 'downloaded':now.isoformat(), 'url':url, 'versions':versions}
+            messages.append("IERS Bulletin A has been downloaded")
+            changed = True
+            break
+        else:
+            messages.append("IERS Bulletin A download has failed")
+
+    entry = manifest.get('jpl')
+    if (not entry) or (local_file('jpl') is None):
+        url = _jpl_url()
+        try:
+            versioned = _download(url, os.path.basename(url), validate=_validate_kernel)
+        except:
+            messages.append("JPL kernel download has failed")
+        else:
+            versions = [versioned] + (entry['versions'] if entry else [])
+            manifest['jpl'] = {'file':versioned, 'downloaded':now.isoformat(), 'url':url, 'versions':versions}
+            messages.append("JPL kernel has been downloaded")
+            changed = True
+
+    if changed:
+        _prune(manifest)
+        _write_manifest(manifest)
+    if messages:
+        return ", ".join(messages)
+    return "IERS Bulletin A and JPL kernel are up to date"
@@ -15,13 +15,25 @@ _CONFIG = {
             'redis_ip' : 'localhost',
             'redis_port' : 6379,
             'redis_auth' : '',
+            'redis_memory' : 100000000,                # bytes, used to set session expiry times if redis has no maxmemory
             'postgresql_ip' : '10.105.192.252',
             #'postgresql_ip' : 'localhost',
             'postgresql_dbname' : 'astrodb',
             'postgresql_username' : 'astro',
             'postgresql_password' : 'xxSgham',
+            'postgresql_maxconn' : 10,                 # maximum number of pooled database connections
+            'postgresql_wait' : 10,                    # seconds a request waits for a free pooled connection
             'door_name' : "Roll off door",             # The name as given by the indi driver
-            'telescope_name' : 'Telescope Simulator'   # The name as given by the indi driver
+            'telescope_name' : 'Telescope Simulator',  # The name as given by the indi driver
+            'messages_window' : 10,                    # The number of messages shown on the home page
+            'ident_tokens' : False,                    # True to carry planning values in signed ident_data tokens, rather than redis
+            'ident_secret' : '',                       # key signing the tokens, must be set if several processes serve the site
+            'ident_token_size' : 400,                  # maximum token length, larger values are stored in redis
+            'sse_clients' : 16,                        # maximum number of open event streams, further pages poll instead
+            'sse_lifetime' : 300,                      # seconds before an event stream is closed, the browser then reconnects
+            'rechart_fraction' : 0.05,                 # the chart is redrawn when the telescope moves this fraction of the field of view
+            'ephemeris_max_age' : 24,                  # hours before a cached minor planet or comet ephemeris is fetched again
+            'iers_max_age' : 7                         # days before the local IERS bulletin A is downloaded again
           }
 
 # This is a dictionary of nominal planet magnitudes for the star chart
@@ -44,6 +56,11 @@ def set_projectfiles(projectfiles):
     _CONFIG['astrodata_directory'] = os.path.join(projectfiles, 'astrodata')
     _CONFIG['servedfiles_directory'] = os.path.join(projectfiles, 'astrodata', 'served')
     _CONFIG['planetdb'] = os.path.join(projectfiles, 'astrodata', 'planet.db')
+    _CONFIG['suntimes'] = os.path.join(projectfiles, 'astrodata', 'suntimes.dat')
+    _CONFIG['names'] = os.path.join(projectfiles, 'astrodata', 'names.db')
+    _CONFIG['namecache'] = os.path.join(projectfiles, 'astrodata', 'namecache.db')
+    _CONFIG['mpccache'] = os.path.join(projectfiles, 'astrodata', 'mpccache.db')
+    _CONFIG['astropy_data'] = os.path.join(projectfiles, 'astrodata', 'astropy_data')
     _CONFIG['constellation_lines'] = os.path.join(projectfiles, 'astrodata', 'lines.csv')
     _CONFIG['star_catalogs'] = os.path.join(projectfiles, 'astrodata', 'dbases')
     
@@ -67,10 +84,22 @@ def get_postgresql():
     "Returns tuple of postgresql ip, dbname, username, password"
     return (_CONFIG['postgresql_ip'], _CONFIG['postgresql_dbname'], _CONFIG['postgresql_username'], _CONFIG['postgresql_password'])
 
+def get_postgresql_maxconn():
+    "Returns the maximum number of pooled postgresql connections"
+    return _CONFIG['postgresql_maxconn']
+
+def get_postgresql_wait():
+    "Returns the seconds a request waits for a free pooled postgresql connection"
+    return _CONFIG['postgresql_wait']
+
 def get_redis():
     "Returns tuple of redis ip, port, auth"
     return (_CONFIG['redis_ip'], _CONFIG['redis_port'], _CONFIG['redis_auth'])
 
+def get_redis_memory():
+    "Returns the redis memory size in bytes used to set session expiry times, if redis maxmemory is not set"
+    return _CONFIG['redis_memory']
+
 def get_astrodata_directory():
     "Returns the directory of support files"
     return _CONFIG['astrodata_directory']
@@ -87,6 +116,34 @@ def get_planetdb():
     "Returns the path to the database file which stores planet positions"
     return _CONFIG['planetdb']
 
+def get_suntimes():
+    "Returns the path to the file of sunrise and sunset times, made by astrodata/make_suntimes.py"
+    return _CONFIG.get('suntimes')
+
+def get_names():
+    "Returns the path to the database of object names, made by astrodata/make_names.py"
+    return _CONFIG.get('names')
+
+def get_namecache():
+    "Returns the path to the database caching names resolved by the remote name service"
+    return _CONFIG.get('namecache')
+
+def get_mpccache():
+    "Returns the path to the database caching minor planet and comet ephemerides"
+    return _CONFIG.get('mpccache')
+
+def ephemeris_max_age():
+    "Returns the number of hours a cached minor planet or comet ephemeris is used"
+    return _CONFIG['ephemeris_max_age']
+
+def get_astropy_data_directory():
+    "Returns the directory of the local IERS and JPL kernel files used by astropy"
+    return _CONFIG.get('astropy_data')
+
+def iers_max_age():
+    "Returns the number of days before the local IERS bulletin A is downloaded again"
+    return _CONFIG['iers_max_age']
+
 def observatory():
     "Returns the observatory longitude, latitude, elevation"
     return _CONFIG['longitude'], _CONFIG['latitude'], _CONFIG['elevation']
@@ -99,6 +156,34 @@ def door():
     "Returns the door name, as given by its indi driver"
     return _CONFIG['door_name']
 
+def ident_tokens():
+    "Returns True if planning values are carried in signed ident tokens"
+    return _CONFIG['ident_tokens']
+
+def get_ident_secret():
+    "Returns the secret used to sign ident tokens"
+    return _CONFIG['ident_secret']
+
+def ident_token_size():
+    "Returns the maximum length of an ident token"
+    return _CONFIG['ident_token_size']
+
+def sse_clients():
+    "Returns the maximum number of open event streams"
+    return _CONFIG['sse_clients']
+
+def sse_lifetime():
+    "Returns the number of seconds before an event stream is closed"
+    return _CONFIG['sse_lifetime']
+
+def rechart_fraction():
+    "Returns the fraction of the field of view the telescope moves before the chart is redrawn"
+    return _CONFIG['rechart_fraction']
+
+def messages_window():
+    "Returns the number of messages shown on the home page"
+    return _CONFIG['messages_window']
+
 
 
 
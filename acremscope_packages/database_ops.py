@@ -4,13 +4,15 @@ Module to create and query the members sqlite database
 """
 
 
-import os, psycopg2, hashlib, random, shutil
+import os, psycopg2, hashlib, random, shutil, threading
+
+import psycopg2.pool, psycopg2.extensions
 
 from datetime import datetime, timedelta
 
 from skipole import ServerError
 
-from . import cfg
+from . import cfg, redis_ops
 
 # This is the default admin username
 _USERNAME = "admin"
@@ -46,54 +48,234 @@ def hash_pin(pin, seed):
     return hashed_pin
 
 
+class _Connection(psycopg2.extensions.connection):
+    "A database connection which records the names of the statements prepared on it"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+# The pool of database connections, created on the first call to open_database
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+# held for each connection taken from the pool, so when all are in use a request
+# waits for one to be returned, rather than the pool failing at once
+_POOL_SLOTS = None
+
+
 def open_database():
-    "Opens the database, and returns the database connection"
-    # connect to database
-    postgresql_ip, postgresql_dbname, postgresql_username, postgresql_password = cfg.get_postgresql()
+    "Opens the database, and returns the database connection, taken from the pool of connections"
+    global _POOL, _POOL_SLOTS
+    try:
+        if _POOL is None:
+            with _POOL_LOCK:
+                if _POOL is None:
+                    # connect to database
+                    postgresql_ip, postgresql_dbname, postgresql_username, postgresql_password = cfg.get_postgresql()
+                    _POOL_SLOTS = threading.BoundedSemaphore(cfg.get_postgresql_maxconn())
+                    _POOL = psycopg2.pool.ThreadedConnectionPool(1, cfg.get_postgresql_maxconn(),
+                                                                 dbname=postgresql_dbname,
+                                                                 user=postgresql_username,
+                                                                 password=postgresql_password,
+                                                                 host=postgresql_ip,
+                                                                 connection_factory=_Connection)
+    except:
+        raise ServerError(message="Failed database connection.")
+    if not _POOL_SLOTS.acquire(timeout=cfg.get_postgresql_wait()):
+        raise ServerError(message="Failed database connection.")
     try:
-        con = psycopg2.connect(dbname=postgresql_dbname,
-                               user=postgresql_username,
-                               password=postgresql_password,
-                               host=postgresql_ip)
+        con = _POOL.getconn()
     except:
+        _POOL_SLOTS.release()
         raise ServerError(message="Failed database connection.")
     return con
 
 
 def close_database(con):
-    "Closes database connection"
-    con.close()
+    """Returns database connection to the pool, any uncommitted changes are rolled back,
+       must be called once for every connection from open_database, even after a failure"""
+    if _POOL is None:
+        con.close()
+        return
+    broken = bool(con.closed)
+    try:
+        if not broken:
+            con.rollback()
+    except:
+        # the server has gone, or the network failed
+        broken = True
+    try:
+        # a broken connection is discarded by the pool rather than kept
+        _POOL.putconn(con, close=broken)
+    finally:
+        _POOL_SLOTS.release()
+
+
+############################################################
+#
+# The most frequently called queries are prepared as named
+# statements on each pooled connection, when first used on
+# that connection, so they are only planned once.
+# _PREPARED is the registry of these statements, each
+# parameter given as $1, $2 etc
+#
+############################################################
+
+_PREPARED = {
+    'user_from_id' : "select username, role, email, member from users where user_id = $1",
+    'slot_status' : "select status, user_id from slots where starttime = $1",
+    'serversettings' : "select emailuser, emailpassword, emailserver, no_reply, starttls, sessions from serversettings where server_id = '1'",
+    'variabletext' : "select variable_name, variable_text from variabletext"
+    }
+
+
+def prepared_statements(con=None):
+    """Return a list of the names of the registered prepared statements,
+       or if con is given, the names of those prepared on that connection"""
+    if con is None:
+        return list(_PREPARED)
+    return [ name for name in _PREPARED if name in con.prepared ]
+
+
+def _execute(cur, name, parameters=()):
+    "Executes the registered statement name with the cursor, preparing it on the cursor connection if not yet done"
+    con = cur.connection
+    if name not in con.prepared:
+        cur.execute("prepare " + name + " as " + _PREPARED[name])
+        con.prepared.add(name)
+    if parameters:
+        cur.execute("execute " + name + " (" + ", ".join(["%s"]*len(parameters)) + ")", parameters)
+    else:
+        cur.execute("execute " + name)
 
 
-def get_emailuserpass(con=None):
-    "Return (emailusername, emailpassword) for server email account, return None on failure"
+# indexes which are created, if they do not already exist, by create_indexes
+_INDEXES = ("create index if not exists messages_mess_id_idx on messages (mess_id DESC)",
+            "create index if not exists users_username_idx on users (username)",
+            "create index if not exists users_member_int_idx on users ((cast(member as integer)), username)")
+
+
+def create_indexes(con=None):
+    "Creates any missing indexes, return True on success, False on failure, if con given does not commit"
     if con is None:
-        con = open_database()
-        result = get_emailuserpass(con)
-        con.close()
-    else:
+        try:
+            con = open_database()
+            try:
+                result = create_indexes(con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
+            return result
+        except:
+            return False
+    try:
         cur = con.cursor()
-        cur.execute("select emailuser, emailpassword from serversettings where server_id = '1'")
-        result = cur.fetchone()
-        if not result:
-            return None
-    return result
+        for index in _INDEXES:
+            cur.execute(index)
+    except:
+        return False
+    return True
 
-def get_emailserver(con=None):
-    "Return (emailserver, no_reply, starttls) for server email account, return None on failure"
-    if con is None:
-        con = open_database()
-        result = get_emailserver(con)
-        con.close()
-        return result
+
+############################################################
+#
+# The variabletext rows, the serversettings row and the text
+# of the latest messages are held in memory. A version number
+# in redis is incremented whenever they are changed, and each
+# worker process reloads its copy from the database only when
+# that version differs from the version it last loaded
+#
+############################################################
+
+# redis key prefix and connection holding the settings version, set by set_settings_redis
+_SETTINGS_REDIS = {'prefix':'', 'rconn':None}
+
+# tuple of (version, settings dictionary), replaced as a whole on reload
+_SETTINGS = (None, None)
+
+
+def set_settings_redis(prefix, rconn):
+    "Sets the redis prefix and connection used to hold the settings version"
+    _SETTINGS_REDIS['prefix'] = prefix
+    _SETTINGS_REDIS['rconn'] = rconn
+
+
+def settings_changed():
+    """Increments the settings version, so all processes reload their settings, this is called by the
+       setters which change settings, but if they are given con, it should be called after the commit"""
+    redis_ops.incr_settings_version(_SETTINGS_REDIS['prefix'], _SETTINGS_REDIS['rconn'])
+
+
+def _load_settings(con):
+    "Return a dictionary of all variabletext rows and the serversettings row, return None on failure"
     cur = con.cursor()
-    cur.execute("select emailserver, no_reply, starttls from serversettings where server_id = '1'")
+    _execute(cur, 'variabletext')
+    text = { row[0]:row[1] for row in cur }
+    _execute(cur, 'serversettings')
     result = cur.fetchone()
     if not result:
+        return
+    messages = get_messages(cfg.messages_window(), con=con)
+    return {'text':text,
+            'emailuserpass':(result[0], result[1]),
+            'emailserver':(result[2], result[3], bool(result[4])),
+            'sessions':bool(result[5]),
+            'messages':_render_messages(messages)}
+
+
+def _get_settings(con=None):
+    """Return the settings dictionary, from memory if the redis version is unchanged,
+       otherwise from the database, return None on failure"""
+    global _SETTINGS
+    version = redis_ops.get_settings_version(_SETTINGS_REDIS['prefix'], _SETTINGS_REDIS['rconn'])
+    loaded_version, settings = _SETTINGS
+    if (version is not None) and (version == loaded_version):
+        return settings
+    if con is None:
+        con = open_database()
+        try:
+            settings = _load_settings(con)
+        finally:
+            close_database(con)
+    else:
+        settings = _load_settings(con)
+    # if redis is not available, version is None, and the settings are not kept
+    if (settings is not None) and (version is not None):
+        _SETTINGS = (version, settings)
+    return settings
+
+
+def get_emailuserpass(con=None):
+    "Return (emailusername, emailpassword) for server email account, return None on failure"
+    settings = _get_settings(con)
+    if settings is None:
+        return None
+    return settings['emailuserpass']
+
+def get_emailserver(con=None):
+    "Return (emailserver, no_reply, starttls) for server email account, return None on failure"
+    settings = _get_settings(con)
+    if settings is None:
+        return None
+    emailserver = settings['emailserver']
+    if (not emailserver[0]) or (not emailserver[1]):
         return None
-    if (not result[0]) or (not result[1]):
+    return emailserver
+
+
+def get_emailsettings(con=None):
+    """Return ((emailserver, no_reply, starttls), (emailusername, emailpassword)) for server email account,
+       return None on failure"""
+    settings = _get_settings(con)
+    if settings is None:
+        return None
+    emailserver = settings['emailserver']
+    if (not emailserver[0]) or (not emailserver[1]):
         return None
-    return (result[0], result[1], bool(result[2]))
+    return emailserver, settings['emailuserpass']
 
 
 def set_emailserver(emailuser, emailpassword, emailserver, no_reply, starttls, con=None):
@@ -103,10 +285,13 @@ def set_emailserver(emailuser, emailpassword, emailserver, no_reply, starttls, c
     if con is None:
         try:
             con = open_database()
-            result = set_emailserver(emailuser, emailpassword, emailserver, no_reply, starttls, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = set_emailserver(emailuser, emailpassword, emailserver, no_reply, starttls, con)
+                if result:
+                    con.commit()
+                    settings_changed()
+            finally:
+                close_database(con)
             return result
         except:
             return False
@@ -130,10 +315,12 @@ def adduser(project, sponsor_id, username, role="MEMBER", member="0000", email=N
     if con is None:
         try:
             con = open_database()
-            result = adduser(project, sponsor_id, username, role, member, email, con)
-            if result is not None:
-                con.commit()
-            con.close()
+            try:
+                result = adduser(project, sponsor_id, username, role, member, email, con)
+                if result is not None:
+                    con.commit()
+            finally:
+                close_database(con)
         except:
             return
     else:
@@ -168,8 +355,10 @@ def get_hashed_password_user_id(username, con=None):
         return
     if con is None:
         con = open_database()
-        result = get_hashed_password_user_id(username, con)
-        con.close()
+        try:
+            result = get_hashed_password_user_id(username, con)
+        finally:
+            close_database(con)
     else:
         cur = con.cursor()
         cur.execute("select password, user_id from users where username = %s", (username,))
@@ -185,8 +374,10 @@ def get_hashed_password(user_id, con=None):
         return
     if con is None:
         con = open_database()
-        result = get_hashed_password(user_id, con)
-        con.close()
+        try:
+            result = get_hashed_password(user_id, con)
+        finally:
+            close_database(con)
     else:
         cur = con.cursor()
         cur.execute("select password from users where user_id = %s", (user_id,))
@@ -204,10 +395,12 @@ def set_password(project, user_id, password, con=None):
     if con is None:
         try:
             con = open_database()
-            result = set_password(project, user_id, password, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = set_password(project, user_id, password, con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
         except:
             return False
         return result
@@ -229,10 +422,12 @@ def new_password(project, user_id, con=None):
     if con is None:
         try:
             con = open_database()
-            password = new_password(project, user_id, con)
-            if password:
-                con.commit()
-            con.close()
+            try:
+                password = new_password(project, user_id, con)
+                if password:
+                    con.commit()
+            finally:
+                close_database(con)
             return password
         except:
             return
@@ -278,8 +473,10 @@ def get_user_id(username, con=None):
         return
     if con is None:
         con = open_database()
-        user_id = get_user_id(username, con)
-        con.close()
+        try:
+            user_id = get_user_id(username, con)
+        finally:
+            close_database(con)
     else:
         cur = con.cursor()
         cur.execute("select user_id from users where username = %s", (username,))
@@ -296,8 +493,10 @@ def number_of_guests(sponsor_id, con=None):
         return
     if con is None:
         con = open_database()
-        number = number_of_guests(sponsor_id, con)
-        con.close()
+        try:
+            number = number_of_guests(sponsor_id, con)
+        finally:
+            close_database(con)
     else:
         cur = con.cursor()
         cur.execute("select guests from users where user_id = %s", (sponsor_id,))
@@ -319,8 +518,10 @@ def get_guests(sponsor_id, con=None):
         return
     if con is None:
         con = open_database()
-        number, guests = get_guests(sponsor_id, con)
-        con.close()
+        try:
+            number, guests = get_guests(sponsor_id, con)
+        finally:
+            close_database(con)
     else:
         cur = con.cursor()
         cur.execute("select guests from users where user_id = %s", (sponsor_id,))
@@ -349,10 +550,12 @@ def set_guests(user_id, guest_number, con=None):
     if con is None:
         try:
             con = open_database()
-            result = set_guests(user_id, guest_number, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = set_guests(user_id, guest_number, con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
             return result
         except:
             return False
@@ -372,8 +575,10 @@ def get_role(user_id, con=None):
         return
     if con is None:
         con = open_database()
-        role = get_role(user_id, con)
-        con.close()
+        try:
+            role = get_role(user_id, con)
+        finally:
+            close_database(con)
     else:
         cur = con.cursor()
         cur.execute("select role from users where user_id = %s", (user_id,))
@@ -398,10 +603,12 @@ def set_role(sponsor_id, user_id, role, con=None):
     if con is None:
         try:
             con = open_database()
-            result = set_role(sponsor_id, user_id, role, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = set_role(sponsor_id, user_id, role, con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
             return result
         except:
             return False
@@ -433,8 +640,10 @@ def get_email(user_id, con=None):
         return
     if con is None:
         con = open_database()
-        email = get_email(user_id, con)
-        con.close()
+        try:
+            email = get_email(user_id, con)
+        finally:
+            close_database(con)
     else:
         cur = con.cursor()
         cur.execute("select email from users where user_id = %s", (user_id,))
@@ -454,10 +663,12 @@ def set_email(user_id, email, con=None):
     if con is None:
         try:
             con = open_database()
-            result = set_email(user_id, email, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = set_email(user_id, email, con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
             return result
         except:
             return False
@@ -474,11 +685,13 @@ def get_user_from_id(user_id, con=None):
     "Return (username, role, email, member) or None on failure"
     if con is None:
         con = open_database()
-        user = get_user_from_id(user_id, con)
-        con.close()
+        try:
+            user = get_user_from_id(user_id, con)
+        finally:
+            close_database(con)
     else:
         cur = con.cursor()
-        cur.execute("select username, role, email, member from users where user_id = %s", (user_id,))
+        _execute(cur, 'user_from_id', (user_id,))
         user = cur.fetchone()
         if not user:
             return
@@ -489,8 +702,10 @@ def get_user_from_username(username, con=None):
     "Return (user_id, role, email, member) or None on failure"
     if con is None:
         con = open_database()
-        user = get_user_from_username(username, con)
-        con.close()
+        try:
+            user = get_user_from_username(username, con)
+        finally:
+            close_database(con)
     else:
         cur = con.cursor()
         cur.execute("select user_id, role, email, member from users where username = %s", (username,))
@@ -509,10 +724,14 @@ def set_message(username, message, con=None):
     try:
         if con is None:
             con = open_database()
-            result = set_message(username, message, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = set_message(username, message, con)
+                if result:
+                    con.commit()
+                    # the home page message text is rebuilt
+                    settings_changed()
+            finally:
+                close_database(con)
         else:
             cur = con.cursor()
             cur.execute("insert into messages (mess_id, message, time, username) values (default, %s, %s, %s)", (message, thistime, username))
@@ -523,27 +742,50 @@ def set_message(username, message, con=None):
     return result
 
 
-def get_all_messages(con=None):
-    "Return string containing all messages return None on failure"
+def get_messages(limit=None, offset=None, con=None):
+    """Return list of lists [mess_id, time, username, message], newest first, limit defaults to the
+       configured messages window, return None on failure"""
+    if limit is None:
+        limit = cfg.messages_window()
     if con is None:
         con = open_database()
-        m_string = get_all_messages(con)
-        con.close()
+        try:
+            m_list = get_messages(limit, offset, con)
+        finally:
+            close_database(con)
     else:
         cur = con.cursor()
-        cur.execute("select message, time, username from messages order by mess_id DESC")
-        m_string = ''
-        for m in cur:
-            m_string += m[1].strftime("%d %b %Y %H:%M:%S") + "\nFrom  " + m[2] + "\n" + m[0] + "\n\n"
-    return m_string
+        if offset is None:
+            cur.execute("select mess_id, time, username, message from messages order by mess_id DESC limit %s", (limit,))
+        else:
+            cur.execute("select mess_id, time, username, message from messages order by mess_id DESC limit %s offset %s", (limit, offset))
+        m_list = [ list(m) for m in cur ]
+    return m_list
+
+
+def _render_messages(messages):
+    "Return string of the given messages as displayed on the home page"
+    if not messages:
+        return ''
+    return ''.join(m[1].strftime("%d %b %Y %H:%M:%S") + "\nFrom  " + m[2] + "\n" + m[3] + "\n\n" for m in messages)
+
+
+def get_messages_text(con=None):
+    "Return string containing the latest messages, up to the configured messages window, return None on failure"
+    settings = _get_settings(con)
+    if settings is None:
+        return
+    return settings['messages']
 
 
 def get_users(limit=None, offset=None, names=True, con=None):
     "Return list of lists [user_id, username, role, membership number] apart from Admin user with user id 1"
     if con is None:
         con = open_database()
-        u_list = get_users(limit, offset, names, con)
-        con.close()
+        try:
+            u_list = get_users(limit, offset, names, con)
+        finally:
+            close_database(con)
     else:
         cur = con.cursor()
         if names:
@@ -573,6 +815,97 @@ def get_users(limit=None, offset=None, names=True, con=None):
     return u_list
 
 
+def _users_key(user, names):
+    "Return the key of a user list [user_id, username, role, member] as used by get_users_page"
+    if names:
+        return user[1]
+    if user[3]:
+        return str(int(user[3])) + "," + user[1]
+    return "0," + user[1]
+
+
+def get_users_page(page_key='', rows=10, names=True, con=None):
+    """Return (u_list, this_key, next_key, previous_key) where u_list is a list of up to rows lists
+       [user_id, username, role, membership number] apart from Admin user with user id 1, ordered by
+       username, or by membership number if names is False.
+       Pages are found by key rather than by offset, page_key is '' for the first page, or one of the
+       keys returned by a previous call, next_key and previous_key are None if there is no such page.
+       Return None on failure"""
+    if con is None:
+        try:
+            con = open_database()
+            try:
+                result = get_users_page(page_key, rows, names, con)
+            finally:
+                close_database(con)
+        except:
+            return
+        return result
+
+    # page_key is 'f' followed by the key of the first user on the page
+    # or 'b' followed by the key of the user following the page
+    key = None
+    before = False
+    if page_key and (page_key[0] in ('f', 'b')):
+        before = bool(page_key[0] == 'b')
+        if names:
+            key = (page_key[1:],)
+        else:
+            member, sep, username = page_key[1:].partition(',')
+            try:
+                key = (int(member), username)
+            except:
+                key = None
+    if key is None:
+        before = False
+
+    if names:
+        order = "username"
+        keycolumns = "username >= %s"
+        beforecolumns = "username < %s"
+        reverseorder = "username DESC"
+    else:
+        order = "cast(member as integer), username"
+        keycolumns = "(cast(member as integer), username) >= (%s, %s)"
+        beforecolumns = "(cast(member as integer), username) < (%s, %s)"
+        reverseorder = "cast(member as integer) DESC, username DESC"
+
+    cur = con.cursor()
+    if before:
+        cur.execute("select user_id, username, role, member from users where user_id != 1 and " + beforecolumns + " order by " + reverseorder + " limit %s", key + (rows+1,))
+        result = cur.fetchall()
+        if len(result) <= rows:
+            # no further page before this one, so show the first page
+            key = None
+            before = False
+        else:
+            result = result[:rows]
+            result.reverse()
+            # and the page following this is the page the key was taken from
+            next_key = 'f' + page_key[1:]
+    if not before:
+        if key is None:
+            cur.execute("select user_id, username, role, member from users where user_id != 1 order by " + order + " limit %s", (rows+1,))
+        else:
+            cur.execute("select user_id, username, role, member from users where user_id != 1 and " + keycolumns + " order by " + order + " limit %s", key + (rows+1,))
+        result = cur.fetchall()
+        if (key is not None) and (not result):
+            # no users from this key, possibly deleted, so show the first page
+            return get_users_page('', rows, names, con)
+        if len(result) > rows:
+            next_key = 'f' + _users_key(result[rows], names)
+            result = result[:rows]
+        else:
+            next_key = None
+
+    u_list = [ [u[0], u[1], u[2], u[3] if u[3] else ''] for u in result ]
+    if (key is None) or (not u_list):
+        # this is the first page
+        return u_list, '', next_key, None
+    this_key = 'f' + _users_key(u_list[0], names)
+    return u_list, this_key, next_key, 'b' + _users_key(u_list[0], names)
+
+
 def delete_user_id(user_id, con=None):
     """Delete user with given user_id. Return True on success, False on failure, if con given does not commit
           Trying to delete user_id of 1 is a failure - cannot delete special user Admin"""
@@ -583,10 +916,12 @@ def delete_user_id(user_id, con=None):
     if con is None:
         try:
             con = open_database()
-            result = delete_user_id(user_id, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = delete_user_id(user_id, con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
             return result
         except:
             return False
@@ -610,10 +945,12 @@ def set_username(user_id, new_username, con=None):
     if con is None:
         try:
             con = open_database()
-            result = set_username(user_id, new_username, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = set_username(user_id, new_username, con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
             return result
         except:
             return False
@@ -633,10 +970,12 @@ def set_membership_number(user_id, new_member, con=None):
     if con is None:
         try:
             con = open_database()
-            result = set_membership_number(user_id, new_member, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = set_membership_number(user_id, new_member, con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
             return result
         except:
             return False
@@ -656,10 +995,12 @@ def set_pin(project, user_id, new_pin, con=None):
     if con is None:
         try:
             con = open_database()
-            result = set_pin(project, user_id, new_pin, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = set_pin(project, user_id, new_pin, con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
             return result
         except:
             return False
@@ -688,8 +1029,10 @@ def get_admin(user_id, con=None):
         return
     if con is None:
         con = open_database()
-        result = get_admin(user_id, con)
-        con.close()
+        try:
+            result = get_admin(user_id, con)
+        finally:
+            close_database(con)
     else:
         cur = con.cursor()
         cur.execute("select * from admins where user_id = %s", (user_id,))
@@ -714,10 +1057,12 @@ def make_admin(project, sponsor_id, user_id, con=None):
     if con is None:
         try:
             con = open_database()
-            result = make_admin(project, sponsor_id, user_id, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = make_admin(project, sponsor_id, user_id, con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
         except:
             return
         return result
@@ -736,8 +1081,10 @@ def get_administrators(con=None):
     if con is None:
         try:
             con = open_database()
-            result = get_administrators(con)
-            con.close()
+            try:
+                result = get_administrators(con)
+            finally:
+                close_database(con)
         except:
             return
         return result
@@ -761,14 +1108,16 @@ def get_slot_status(slot, con=None):
     if con is None:
         try:
             con = open_database()
-            result = get_slot_status(slot, con)
-            con.close()
+            try:
+                result = get_slot_status(slot, con)
+            finally:
+                close_database(con)
         except:
             return
         return result
     starttime = slot.starttime
     cur = con.cursor()
-    cur.execute("select status, user_id from slots where starttime = %s", (starttime,))
+    _execute(cur, 'slot_status', (starttime,))
     status_id = cur.fetchone()
     if status_id is None:
         return (0, None)
@@ -782,10 +1131,12 @@ def disable_slot(slot, con=None):
     if con is None:
         try:
             con = open_database()
-            result = disable_slot(slot, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = disable_slot(slot, con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
             return result
         except:
             return False
@@ -807,10 +1158,12 @@ def book_slot(slot, user_id, con=None):
     if con is None:
         try:
             con = open_database()
-            result = book_slot(slot, user_id, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = book_slot(slot, user_id, con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
             return result
         except:
             return False
@@ -832,10 +1185,12 @@ def delete_slot(slot, con=None):
     if con is None:
         try:
             con = open_database()
-            result = delete_slot(slot, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = delete_slot(slot, con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
             return result
         except:
             return False
@@ -848,6 +1203,105 @@ def delete_slot(slot, con=None):
     return True
 
 
+def get_slots_status(starttimes, con=None):
+    """Given a list of slot starttimes, returns a dictionary of starttime:(status_integer, user_id, username, role, member)
+       for those slots which are booked or disabled, slots not in the dictionary are free.
+       returns None on failure"""
+    if con is None:
+        try:
+            con = open_database()
+            try:
+                result = get_slots_status(starttimes, con)
+            finally:
+                close_database(con)
+        except:
+            return
+        return result
+    if not starttimes:
+        return {}
+    cur = con.cursor()
+    cur.execute("""select slots.starttime, slots.status, slots.user_id, users.username, users.role, users.member
+                   from slots left join users on slots.user_id = users.user_id where slots.starttime = any(%s)""", (list(starttimes),))
+    return { row[0]:row[1:] for row in cur }
+
+
+def disable_slots(starttimes, con=None):
+    """Disables every free slot of the given list of slot starttimes, booked slots are unchanged.
+       Return True on success, False on failure, if con given does not commit"""
+    if con is None:
+        try:
+            con = open_database()
+            try:
+                result = disable_slots(starttimes, con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
+            return result
+        except:
+            return False
+    if not starttimes:
+        return True
+    try:
+        # a free slot has no row, so insert rows with status 2 for disabled, existing rows are left as they are
+        cur = con.cursor()
+        cur.execute("""insert into slots (starttime, status, user_id) select unnest(%s::timestamp[]), 2, NULL
+                       on conflict (starttime) do nothing""", (list(starttimes),))
+    except:
+        return False
+    return True
+
+
+def enable_slots(starttimes, con=None):
+    """Enables every disabled slot of the given list of slot starttimes.
+       Return True on success, False on failure, if con given does not commit"""
+    if con is None:
+        try:
+            con = open_database()
+            try:
+                result = enable_slots(starttimes, con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
+            return result
+        except:
+            return False
+    if not starttimes:
+        return True
+    try:
+        cur = con.cursor()
+        cur.execute("delete from slots where status = 2 and starttime = any(%s)", (list(starttimes),))
+    except:
+        return False
+    return True
+
+
+def free_slots(starttimes, con=None):
+    """Frees every booked slot of the given list of slot starttimes.
+       Return True on success, False on failure, if con given does not commit"""
+    if con is None:
+        try:
+            con = open_database()
+            try:
+                result = free_slots(starttimes, con)
+                if result:
+                    con.commit()
+            finally:
+                close_database(con)
+            return result
+        except:
+            return False
+    if not starttimes:
+        return True
+    try:
+        cur = con.cursor()
+        cur.execute("delete from slots where status = 1 and starttime = any(%s)", (list(starttimes),))
+    except:
+        return False
+    return True
+
+
 def get_users_sessions(starttime, endtime, user_id, con=None):
     """starttime, endtime are datetime objects, returns each session booked by
        the user between these times as a list of slot startimes, if none found
@@ -857,8 +1311,10 @@ def get_users_sessions(starttime, endtime, user_id, con=None):
     if con is None:
         try:
             con = open_database()
-            result = get_users_sessions(starttime, endtime, user_id, con)
-            con.close()
+            try:
+                result = get_users_sessions(starttime, endtime, user_id, con)
+            finally:
+                close_database(con)
         except:
             return
         return result
@@ -879,8 +1335,10 @@ def get_users_next_session(starttime, user_id, con=None):
     if con is None:
         try:
             con = open_database()
-            result = get_users_next_session(starttime, user_id, con)
-            con.close()
+            try:
+                result = get_users_next_session(starttime, user_id, con)
+            finally:
+                close_database(con)
         except:
             return
         return result
@@ -898,17 +1356,10 @@ def get_users_next_session(starttime, user_id, con=None):
 
 def get_sessions(con=None):
     "Return sessions, True if enabled, False if not, return None on failure"
-    if con is None:
-        con = open_database()
-        result = get_sessions(con)
-        con.close()
-        return result
-    cur = con.cursor()
-    cur.execute("select sessions from serversettings where server_id = '1'")
-    result = cur.fetchone()
-    if not result:
+    settings = _get_settings(con)
+    if settings is None:
         return None
-    return bool(result[0])
+    return settings['sessions']
 
 
 def set_sessions(sessions, con=None):
@@ -916,10 +1367,13 @@ def set_sessions(sessions, con=None):
     if con is None:
         try:
             con = open_database()
-            result = set_sessions(sessions, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = set_sessions(sessions, con)
+                if result:
+                    con.commit()
+                    settings_changed()
+            finally:
+                close_database(con)
             return result
         except:
             return False
@@ -939,19 +1393,12 @@ def get_text(variable_name, con=None):
     "Return variable_text for given variable_name, return None on failure"
     if not variable_name:
         return
-    if con is None:
-        con = open_database()
-        variable_text = get_text(variable_name, con)
-        con.close()
-    else:
-        cur = con.cursor()
-        cur.execute("select variable_text from variabletext where variable_name = %s", (variable_name,))
-        result = cur.fetchone()
-        if result is None:
-            return
-        variable_text = result[0]
-        if not variable_text:
-            return
+    settings = _get_settings(con)
+    if settings is None:
+        return
+    variable_text = settings['text'].get(variable_name)
+    if not variable_text:
+        return
     return variable_text
 
 
@@ -962,10 +1409,13 @@ def set_text(variable_name, variable_text, con=None):
     if con is None:
         try:
             con = open_database()
-            result = set_text(variable_name, variable_text, con)
-            if result:
-                con.commit()
-            con.close()
+            try:
+                result = set_text(variable_name, variable_text, con)
+                if result:
+                    con.commit()
+                    settings_changed()
+            finally:
+                close_database(con)
             return result
         except:
             return False
@@ -0,0 +1,174 @@
+####################################################
+#
+# A cache of minor planet and comet ephemerides, so the slow
+# Minor Planet Center query is made once per object and day,
+# rather than on each planning or GOTO request.
+#
+# Each table of positions is fetched for a whole UTC day at hourly
+# steps, and stored in the sqlite file mpccache.db keyed by
+# (object, start, step, observer), positions at any time of the day
+# are then interpolated from the table.
+#
+# A table expires when it is older than cfg ephemeris_max_age hours,
+# as the orbits held by the MPC are refined, and comets can change.
+#
+# The fetcher is a function fetcher(target_name, start, step, number, location)
+# returning a list of number (ra, dec) in degrees at start, start+step .. or
+# None if the object is not known. The default queries the MPC, and
+# set_fetcher replaces it, for example with a local stand-in for tests.
+#
+####################################################
+
+
+import math, sqlite3, threading
+
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from .cfg import get_mpccache, ephemeris_max_age
+
+
+# the step and number of positions of each table, covering a day from midnight to midnight
+_STEP = timedelta(hours=1)
+_NUMBER = 25
+
+# only one fetch is made at a time, so a second request for the same object finds it cached
+_FETCH_LOCK = threading.Lock()
+
+
+def mpc_fetcher(target_name, start, step, number, location=None):
+    """Returns a list of (ra, dec) in degrees of the minor planet or comet from the Minor Planet Center,
+       or None if not found"""
+    # astroquery is slow to import, so is only imported when a minor planet is looked up
+    from astroquery.mpc import MPC
+    from astroquery.exceptions import InvalidQueryError
+    from astropy.time import Time
+    seconds = int(step.total_seconds())
+    if seconds < 60:
+        stepstring = str(seconds) + "second"
+    elif seconds < 3600:
+        stepstring = str(seconds//60) + "minute"
+    else:
+        stepstring = str(seconds//3600) + "hour"
+    try:
+        if location is None:
+            eph = MPC.get_ephemeris(target_name, step=stepstring, start=Time(start, format='datetime', scale='utc'), number=number)
+        else:
+            eph = MPC.get_ephemeris(target_name, location=location, step=stepstring, start=Time(start, format='datetime', scale='utc'), number=number)
+    except InvalidQueryError:
+        return
+    return [(float(eph['RA'][idx]), float(eph['Dec'][idx])) for idx in range(number)]
+
+
+_FETCHER = mpc_fetcher
+
+
+def set_fetcher(fetcher):
+    "Sets the function which fetches ephemerides, returns the previous fetcher"
+    global _FETCHER
+    previous = _FETCHER
+    _FETCHER = fetcher
+    return previous
+
+
+def _open_cache():
+    "Returns a connection to the cache, creating its table if it does not exist"
+    con = sqlite3.connect(get_mpccache(), timeout=5, detect_types=sqlite3.PARSE_DECLTYPES)
+    con.execute("""CREATE TABLE IF NOT EXISTS EPHEMERIS(NAME TEXT NOT NULL,
+                                                         START timestamp NOT NULL,
+                                                         STEP INTEGER NOT NULL,
+                                                         OBSERVER TEXT NOT NULL,
+                                                         FETCHED timestamp,
+                                                         POSITIONS BLOB,
+                                                         PRIMARY KEY(NAME,START,STEP,OBSERVER))""")
+    return con
+
+
+def _read_table(key):
+    "Returns the array of ra, dec pairs of an unexpired table, or None if not cached"
+    oldest = datetime.utcnow() - timedelta(hours=ephemeris_max_age())
+    try:
+        con = _open_cache()
+        try:
+            row = con.execute("SELECT POSITIONS FROM EPHEMERIS WHERE NAME=? AND START=? AND STEP=? AND OBSERVER=? AND FETCHED>?",
+                              key + (oldest,)).fetchone()
+        finally:
+            con.close()
+    except:
+        return
+    if row is None:
+        return
+    table = array('d')
+    table.frombytes(row[0])
+    return table
+
+
+def _write_table(key, table):
+    "Stores the table, and removes expired tables"
+    now = datetime.utcnow()
+    try:
+        con = _open_cache()
+        try:
+            with con:
+                con.execute("DELETE FROM EPHEMERIS WHERE FETCHED<?", (now - timedelta(hours=ephemeris_max_age()),))
+                con.execute("INSERT OR REPLACE INTO EPHEMERIS(NAME,START,STEP,OBSERVER,FETCHED,POSITIONS) VALUES (?,?,?,?,?,?)",
+                            key + (now, table.tobytes()))
+        finally:
+            con.close()
+    except:
+        pass
+
+
+def _table(target_name, start, location):
+    "Returns the array of ra, dec pairs of the day starting at start, fetching it if not cached, or None if not found"
+    name = " ".join(target_name.lower().split())
+    key = (name, start, int(_STEP.total_seconds()), "geocentric" if location is None else "centre")
+    table = _read_table(key)
+    if table is not None:
+        return table
+    with _FETCH_LOCK:
+        # another thread may have fetched it while waiting
+        table = _read_table(key)
+        if table is not None:
+            return table
+        positions = _FETCHER(target_name, start, _STEP, _NUMBER, location)
+        if not positions or len(positions) != _NUMBER:
+            return
+        table = array('d')
+        for ra, dec in positions:
+            table.append(ra)
+            table.append(dec)
+        _write_table(key, table)
+    return table
+
+
+def _interpolate(table, start, dt):
+    "Returns (ra, dec) at datetime dt, interpolated from the table starting at start"
+    steps = (dt - start)/_STEP
+    index = min(int(steps), _NUMBER - 2)
+    fraction = steps - index
+    ra0, dec0, ra1, dec1 = table[2*index:2*index+4]
+    # ra may wrap through 360 degrees between steps
+    if ra1 - ra0 > 180:
+        ra1 -= 360
+    elif ra0 - ra1 > 180:
+        ra1 += 360
+    ra = math.fmod(ra0 + (ra1 - ra0)*fraction + 360, 360)
+    return ra, dec0 + (dec1 - dec0)*fraction
+
+
+def positions(target_name, times, location=None):
+    """Returns a list of (ra, dec) in degrees of the minor planet or comet at each utc datetime in times,
+       geocentric, or as seen from location if given, returns None if the object is not found"""
+    result = []
+    tables = {}
+    for dt in times:
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+        start = datetime(dt.year, dt.month, dt.day)
+        if start not in tables:
+            tables[start] = _table(target_name, start, location)
+        if tables[start] is None:
+            return
+        result.append(_interpolate(tables[start], start, dt))
+    return result
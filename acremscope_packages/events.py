@@ -0,0 +1,207 @@
+####################################################
+#
+# A server sent events stream, which pushes INDI changes to the
+# control and sensors pages, rather than these pages polling for them
+#
+# EventsApplication wraps the skipole application, serving the stream
+# at URL and passing every other call to the application.
+#
+# Each stream waits on the indi_tracker thread, which refreshes on
+# each from_indi pub/sub notification, and sends only changed values
+#
+# event indi - json of led, door, temperature and network error, sent to anyone
+# event telescope - json of the telescope position, sent to logged in users
+# event chart - sent to logged in users when the telescope has moved more
+#               than cfg rechart_fraction of the field of view, the
+#               control page then calls for the chart to be redrawn
+#
+# The number of open streams, and their lifetime, are limited by cfg
+# so they do not take every server thread, a page whose stream is
+# refused continues to poll as before.
+#
+####################################################
+
+
+import json, math, threading, time
+
+from http.cookies import SimpleCookie
+
+from . import indi_snapshot, indi_tracker, redis_ops, cfg
+
+
+URL = "/acremscope/events"
+
+# seconds between keepalive comments, if nothing else is sent
+_KEEPALIVE = 15
+
+# milliseconds the browser waits before reconnecting after a stream ends
+_RETRY = 5000
+
+
+# This javascript is added to a page, with the page's own event listeners inserted.
+# When the stream opens the skipole interval polling is stopped, and if the
+# stream is refused, polling is started again.
+
+_SCRIPT = """
+  if (typeof(EventSource) !== "undefined") {
+    let source = new EventSource("%s");
+    source.addEventListener("open", function() {
+        if (SKIPOLE.interval_id) {
+            clearInterval(SKIPOLE.interval_id);
+            SKIPOLE.interval_id = null;
+            }
+        });
+    source.addEventListener("error", function() {
+        if ((source.readyState === EventSource.CLOSED) && !SKIPOLE.interval_id && SKIPOLE.interval && SKIPOLE.IntervalTarget) {
+            SKIPOLE.interval_id = setInterval(SKIPOLE.refreshjson, SKIPOLE.interval*1000, SKIPOLE.IntervalTarget);
+            }
+        });
+%s
+    }
+"""
+
+
+def page_script(listeners):
+    "Returns javascript for page_data['add_jscript'], opening the stream, with the given event listeners"
+    return _SCRIPT % (URL, listeners)
+
+
+def _separation(ra1, dec1, ra2, dec2):
+    "Returns the angular separation in degrees of two positions given in degrees"
+    ra1, dec1, ra2, dec2 = (math.radians(angle) for angle in (ra1, dec1, ra2, dec2))
+    hav = math.sin((dec2-dec1)/2)**2 + math.cos(dec1)*math.cos(dec2)*math.sin((ra2-ra1)/2)**2
+    return math.degrees(2*math.asin(min(1.0, math.sqrt(hav))))
+
+
+def _indi_values():
+    "Returns a dictionary of led, door, temperature and network error from the tracked snapshot"
+    snapshot = indi_snapshot.tracked() or indi_snapshot.Snapshot()
+    try:
+        network = snapshot.network_error()
+    except:
+        network = "Network Error : Unable to read monitor timestamp"
+    return {"led":snapshot.led(), "door":snapshot.door(), "temperature":snapshot.last_temperature(), "network":network}
+
+
+def _telescope_values(position):
+    "Returns a dictionary of the telescope position, as shown on the control page"
+    if position is None:
+        return {"status":False}
+    status, actual_position, altaztuple = position
+    if not status:
+        return {"status":False}
+    # the tracking thread has already loaded astropy
+    from astropy import units as u
+    from astropy.coordinates import Angle
+    return {"status":True,
+            "ra":Angle(actual_position.ra*u.deg).to_string(unit=u.hour, sep=':'),
+            "dec":Angle(actual_position.dec*u.deg).to_string(unit=u.degree, sep=':'),
+            "alt":"{:3.3f}".format(altaztuple[0]),
+            "az":"{:3.3f}".format(altaztuple[1])}
+
+
+def _event(name, data):
+    "Returns the bytes of an event"
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+
+
+class _Stream:
+    "The response iterable, releases the stream count when closed, even if never iterated"
+
+    def __init__(self, events, release):
+        self._events = events
+        self._release = release
+
+    def __iter__(self):
+        return self._events
+
+    def close(self):
+        self._events.close()
+        if self._release is not None:
+            self._release()
+            self._release = None
+
+
+class EventsApplication:
+    """Wraps the skipole application, serving the events stream at url, other
+       calls, and attributes, are passed to the wrapped application"""
+
+    def __init__(self, application, url=URL, cookie_name=''):
+        self.application = application
+        self.url = url
+        self.cookie_name = cookie_name
+        self._streams = threading.BoundedSemaphore(cfg.sse_clients())
+
+    def __getattr__(self, name):
+        return getattr(self.application, name)
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO', '').rstrip('/') != self.url:
+            return self.application(environ, start_response)
+
+        proj_data = self.application.proj_data
+        rconn = proj_data.get("rconn")
+        if rconn is None:
+            start_response('503 Service Unavailable', [('Content-Type', 'text/plain')])
+            return [b'Events unavailable']
+
+        if not self._streams.acquire(blocking=False):
+            # too many open streams, the page continues to poll
+            start_response('503 Service Unavailable', [('Content-Type', 'text/plain')])
+            return [b'Too many event streams']
+
+        # the stream is driven by the tracking thread of this process
+        indi_tracker.start(rconn, proj_data.get("redisserver"), proj_data.get("rconn_0"))
+
+        user_id = None
+        try:
+            cookies = SimpleCookie(environ.get('HTTP_COOKIE', ''))
+            if self.cookie_name in cookies:
+                user_id = redis_ops.logged_in(cookies[self.cookie_name].value, proj_data.get("rconn_1"), rconn)
+        except:
+            user_id = None
+
+        start_response('200 OK', [('Content-Type', 'text/event-stream'),
+                                  ('Cache-Control', 'no-cache'),
+                                  ('X-Accel-Buffering', 'no')])   # stops nginx buffering the stream
+        return _Stream(self._events(bool(user_id), proj_data.get("rconn_0"), rconn), self._streams.release)
+
+    def _events(self, loggedin, prefix, rconn):
+        "Generator of the stream, sending changed values until the stream lifetime ends"
+        endtime = time.monotonic() + cfg.sse_lifetime()
+        yield f"retry: {_RETRY}\n\n".encode('utf-8')
+        lastsent = time.monotonic()
+        count = None
+        indi = None
+        telescope = None
+        # the position at the centre of the chart, taken as the position when the stream opens
+        centre = None
+        while time.monotonic() < endtime:
+            count = indi_tracker.wait_refresh(count, _KEEPALIVE)
+            sending = []
+            newindi = _indi_values()
+            if newindi != indi:
+                indi = newindi
+                sending.append(_event("indi", indi))
+            if loggedin:
+                position = indi_tracker.latest_position()
+                newtelescope = _telescope_values(position)
+                if newtelescope != telescope:
+                    telescope = newtelescope
+                    sending.append(_event("telescope", telescope))
+                    if telescope["status"]:
+                        actual_position = position[1]
+                        if centre is None:
+                            centre = actual_position
+                        else:
+                            view = redis_ops.ControlState(prefix, rconn).view
+                            if _separation(centre.ra, centre.dec, actual_position.ra, actual_position.dec) > view*cfg.rechart_fraction():
+                                centre = actual_position
+                                sending.append(_event("chart", {}))
+            if sending:
+                yield b"".join(sending)
+                lastsent = time.monotonic()
+            elif time.monotonic() - lastsent >= _KEEPALIVE:
+                # a comment line, keeps the connection open through proxies
+                yield b": keepalive\n\n"
+                lastsent = time.monotonic()
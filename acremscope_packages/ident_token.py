@@ -0,0 +1,60 @@
+####################################################
+#
+# Signed ident tokens, these carry the planning stored values
+# within ident_data itself, so no redis read or write is needed
+#
+# A token is the marker character, then a base64 HMAC signature
+# then the values joined by a separator character
+#
+####################################################
+
+
+import hmac, hashlib, os
+
+from base64 import urlsafe_b64encode
+
+from .cfg import get_ident_secret, ident_token_size
+
+
+# tokens start with this character, redis keys used as ident_data start with a digit
+_MARKER = 'S'
+
+# The stored values are separated by this character
+_SEPARATOR = '\x1f'
+
+# length of the signature, being 16 bytes of the digest, base64 encoded without padding
+_SIGLENGTH = 22
+
+# if no secret is set in cfg, a random one is used, which is only valid within this process
+_SECRET = get_ident_secret().encode('utf-8') or os.urandom(32)
+
+
+def _signature(payload):
+    "Returns the signature string of the payload string"
+    digest = hmac.new(_SECRET, payload.encode('utf-8'), hashlib.sha256).digest()
+    return urlsafe_b64encode(digest[:16]).rstrip(b"=").decode('ascii')
+
+
+def is_token(ident_data):
+    "Returns True if ident_data is a token rather than a redis key"
+    return bool(ident_data) and ident_data.startswith(_MARKER)
+
+
+def make_token(value_list):
+    "Returns a token holding the list of values, or None if it would be longer than the cfg limit"
+    payload = _SEPARATOR.join(str(val) for val in value_list)
+    token = _MARKER + _signature(payload) + payload
+    if len(token) > ident_token_size():
+        return
+    return token
+
+
+def read_token(ident_data):
+    "Returns the list of values held in the token, or None if the token is invalid"
+    if not is_token(ident_data):
+        return
+    signature = ident_data[1:_SIGLENGTH+1]
+    payload = ident_data[_SIGLENGTH+1:]
+    if not hmac.compare_digest(signature, _signature(payload)):
+        return
+    return payload.split(_SEPARATOR)
@@ -0,0 +1,184 @@
+####################################################
+#
+# Reads, in one pipelined redis call, the INDI devices, properties
+# and elements used by the web pages, and returns them as an
+# immutable Snapshot object
+#
+# The redis keys are those set by indi_mr:
+#
+# keyprefix + devices - a set of device names
+# keyprefix + properties:device - a set of property names
+# keyprefix + elementattributes:element:property:device - a hash of element attributes
+#
+####################################################
+
+
+import time
+
+from datetime import datetime
+
+from types import MappingProxyType
+
+from . import cfg
+
+
+_EMPTY = MappingProxyType({})
+
+
+def _wanted():
+    "Returns a list of (element, property, device) read by every snapshot"
+    door_name = cfg.door()
+    telescope_name = cfg.telescope()
+    return [ ("CLOSED", "DOOR_STATE", door_name),
+             ("OPEN", "DOOR_STATE", door_name),
+             ("OPENING", "DOOR_STATE", door_name),
+             ("CLOSING", "DOOR_STATE", door_name),
+             ("CONNECT", "CONNECTION", telescope_name),
+             ("TRACK_ON", "TELESCOPE_TRACK_STATE", telescope_name),
+             ("RA", "EQUATORIAL_COORD", telescope_name),
+             ("DEC", "EQUATORIAL_COORD", telescope_name),
+             ("ALT", "HORIZONTAL_COORD", telescope_name),
+             ("AZ", "HORIZONTAL_COORD", telescope_name),
+             ("RA", "EQUATORIAL_EOD_COORD", telescope_name),
+             ("DEC", "EQUATORIAL_EOD_COORD", telescope_name),
+             ("LED ON", "LED", "Rempico01"),
+             ("TEMPERATURE", "ATMOSPHERE", "Rempico01"),
+             ("KeepAlive", "TenSecondHeartbeat", "Network Monitor") ]
+
+
+def _decode(fields):
+    "Returns the hash of element attributes decoded as tools.elements_dict does"
+    if not fields:
+        return _EMPTY
+    eldict = {key.decode("utf-8"):value.decode("utf-8") for key,value in fields.items()}
+    if 'float_number' in eldict:
+        eldict['float_number'] = float(eldict['float_number'])
+    return MappingProxyType(eldict)
+
+
+class Snapshot:
+    "An immutable snapshot of the INDI devices, properties and elements used by the web pages"
+
+    __slots__ = ('_devices', '_properties', '_elements')
+
+    def __init__(self, devices=(), properties=None, elements=None):
+        object.__setattr__(self, '_devices', frozenset(devices))
+        object.__setattr__(self, '_properties', MappingProxyType(dict(properties or {})))
+        object.__setattr__(self, '_elements', MappingProxyType(dict(elements or {})))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Snapshot is read only")
+
+    def devices(self):
+        "Returns a frozenset of device names"
+        return self._devices
+
+    def properties(self, device):
+        "Returns a frozenset of the property names of the device"
+        return self._properties.get(device, frozenset())
+
+    def elements_dict(self, elementname, name, device):
+        """Returns a read only dictionary of element attributes for the given element, property and device,
+           empty if not found, or not one of the elements read by the snapshot"""
+        return self._elements.get((elementname, name, device), _EMPTY)
+
+    def led(self):
+        "Return led status string."
+        # led value should be On or Off
+        return self.elements_dict("LED ON", "LED", "Rempico01").get("value", "UNKNOWN")
+
+    def door(self):
+        "Returns one of UNKNOWN, OPEN, CLOSED, OPENING, CLOSING"
+        door_name = cfg.door()
+        for state in ("CLOSED", "OPEN", "OPENING", "CLOSING"):
+            if self.elements_dict(state, "DOOR_STATE", door_name).get('value') == "Ok":
+                return state
+        return 'UNKNOWN'
+
+    def last_temperature(self):
+        """Return last date and temperature.
+
+           String returned is of the form %Y-%m-%d %H:%M temperature, if unable to get
+           the temperature, an empty string is returned"""
+        element_att = self.elements_dict("TEMPERATURE", "ATMOSPHERE", "Rempico01")
+        try:
+            # Convert from Kelvin to Centigrade
+            temperature = float(element_att["formatted_number"]) - 273.15
+            temperature_date, temperature_time = element_att["timestamp"].split("T")
+        except:
+            return ''
+        return f"{temperature_date} {temperature_time} {temperature:.2f}"
+
+
+    def network_error(self):
+        """Returns an error message if the network monitor timestamp is missing or
+           more than 15 seconds old, otherwise an empty string"""
+        monitor = self.elements_dict('KeepAlive', 'TenSecondHeartbeat', 'Network Monitor')
+        if not monitor:
+            return "Network Error : Unable to read monitor timestamp"
+        # note fromisoformat method requires python 3.7 +
+        timed = datetime.utcnow() - datetime.fromisoformat(monitor['timestamp'])
+        if timed.total_seconds() > 15:
+            return "Network Error : Communications to observatory lost"
+        return ''
+
+
+def read_snapshot(rconn, redisserver):
+    "Returns a Snapshot, read with one pipelined redis call, on failure an empty Snapshot is returned"
+    if rconn is None:
+        return Snapshot()
+    keyprefix = redisserver.keyprefix
+    wanted = _wanted()
+    devices = sorted(set(device for elementname, name, device in wanted))
+    try:
+        pipe = rconn.pipeline(transaction=False)
+        pipe.smembers(keyprefix + "devices")
+        for device in devices:
+            pipe.smembers(keyprefix + "properties:" + device)
+        for elementname, name, device in wanted:
+            pipe.hgetall(keyprefix + "elementattributes:" + ":".join((elementname, name, device)))
+        results = pipe.execute()
+        device_set = set(device.decode("utf-8") for device in results[0])
+        properties = {}
+        for device, propertynames in zip(devices, results[1:len(devices)+1]):
+            if device in device_set:
+                properties[device] = frozenset(name.decode("utf-8") for name in propertynames)
+        elements = {}
+        for element, fields in zip(wanted, results[len(devices)+1:]):
+            if element[2] in device_set:
+                elements[element] = _decode(fields)
+    except:
+        return Snapshot()
+    return Snapshot(device_set, properties, elements)
+
+
+# (Snapshot, time.monotonic() when read) kept up to date by the indi_tracker thread
+_TRACKED = None
+
+# seconds after which a tracked snapshot is not used
+_STALE = 5.0
+
+
+def set_tracked(snapshot, refreshed):
+    "Called by the indi_tracker thread to set the latest snapshot"
+    global _TRACKED
+    _TRACKED = (snapshot, refreshed)
+
+
+def tracked():
+    "Returns the latest snapshot set by the indi_tracker thread, or None if it is stale or not set"
+    latest = _TRACKED
+    if (latest is not None) and (time.monotonic() - latest[1] < _STALE):
+        return latest[0]
+
+
+def get_snapshot(skicall):
+    """Returns the Snapshot of this call, the latest tracked snapshot if the tracking
+       thread is running, otherwise read from redis on the first request of the call"""
+    if 'indi_snapshot' not in skicall.call_data:
+        snapshot = tracked()
+        if snapshot is not None:
+            skicall.call_data['indi_snapshot'] = snapshot
+        else:
+            skicall.call_data['indi_snapshot'] = read_snapshot(skicall.proj_data.get("rconn"), skicall.proj_data.get("redisserver"))
+    return skicall.call_data['indi_snapshot']
@@ -0,0 +1,158 @@
+####################################################
+#
+# A background thread in each web process which follows the
+# INDI state, so request handlers need not read and convert it
+#
+# The thread subscribes to the indi_mr from_indi channel, and on
+# each notification, or every second if none arrive, reads a new
+# indi_snapshot.Snapshot. The telescope position is converted
+# with astropy only when the coordinate element timestamps,
+# or the control target frame, change. A new temperature is recorded
+# into temperature_history. After each refresh any waiting event
+# streams are notified.
+#
+####################################################
+
+
+import os, threading, time
+
+from . import indi_snapshot, redis_ops, temperature_history
+
+
+# the coordinate elements whose timestamps decide if the position must be recalculated
+_COORDS = (("RA", "EQUATORIAL_COORD"),
+           ("DEC", "EQUATORIAL_COORD"),
+           ("ALT", "HORIZONTAL_COORD"),
+           ("AZ", "HORIZONTAL_COORD"),
+           ("RA", "EQUATORIAL_EOD_COORD"),
+           ("DEC", "EQUATORIAL_EOD_COORD"))
+
+# seconds after which tracked values are considered stale, and not used
+_STALE = 5.0
+
+# (target_frame, result of remscope.position_from_snapshot, time.monotonic() of the refresh)
+# replaced as a whole by the thread, so readers need no lock
+_POSITION = None
+
+_LOCK = threading.Lock()
+
+# notified after every refresh, event streams wait on this
+_REFRESHED = threading.Condition()
+
+# incremented on every refresh, so a waiting stream can tell it has missed none
+_COUNT = 0
+
+# process id of the running thread, a forked process starts its own
+_STARTED = None
+
+
+def start(rconn, redisserver, prefix=''):
+    """Starts the tracking thread of this process, if not already running, prefix
+       is the rconn_0 prefix of the control state, which holds the target frame"""
+    global _STARTED
+    if rconn is None:
+        return
+    if _STARTED == os.getpid():
+        return
+    with _LOCK:
+        if _STARTED == os.getpid():
+            return
+        _STARTED = os.getpid()
+        thread = threading.Thread(target=_run, args=(rconn, redisserver, prefix), name="indi_tracker", daemon=True)
+        thread.start()
+
+
+def actual_position(target_frame):
+    """Returns the tracked (status, Position, (alt,az)) as remscope.get_actual_position,
+       or None if not available for this target_frame"""
+    position = _POSITION
+    if position is None:
+        return
+    frame, result, refreshed = position
+    if frame != target_frame:
+        return
+    if time.monotonic() - refreshed > _STALE:
+        return
+    return result
+
+
+def latest_position():
+    """Returns the tracked (status, Position, (alt,az)) in the frame of the current
+       control target, or None if not available"""
+    position = _POSITION
+    if position is None:
+        return
+    if time.monotonic() - position[2] > _STALE:
+        return
+    return position[1]
+
+
+def wait_refresh(count, timeout):
+    """Waits up to timeout seconds for a refresh after the given refresh count,
+       returns the current refresh count"""
+    with _REFRESHED:
+        _REFRESHED.wait_for(lambda: _COUNT != count, timeout)
+        return _COUNT
+
+
+def _notify():
+    "Wakes any event streams waiting for a refresh"
+    global _COUNT
+    with _REFRESHED:
+        _COUNT += 1
+        _REFRESHED.notify_all()
+
+
+def _coord_key(snapshot, telescope_name):
+    "Returns the properties and timestamps which the position depends on"
+    properties = snapshot.properties(telescope_name)
+    timestamps = tuple(snapshot.elements_dict(element, name, telescope_name).get('timestamp') for element, name in _COORDS)
+    return properties, timestamps
+
+
+def _run(rconn, redisserver, prefix):
+    "The tracking thread"
+    global _POSITION
+
+    # imported here, as remscope imports this module
+    from .members.remscope import position_from_snapshot
+    from .cfg import telescope
+
+    pubsub = None
+    channel = getattr(redisserver, 'from_indi_channel', None)
+    key = None
+    result = None
+
+    while True:
+        try:
+            if (pubsub is None) and channel:
+                pubsub = rconn.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(channel)
+            if pubsub is None:
+                time.sleep(1.0)
+            else:
+                # wait for a notification, for up to a second
+                if pubsub.get_message(timeout=1.0) is not None:
+                    # read any further queued notifications, one refresh covers them all
+                    while pubsub.get_message(timeout=0) is not None:
+                        pass
+            snapshot = indi_snapshot.read_snapshot(rconn, redisserver)
+            refreshed = time.monotonic()
+            indi_snapshot.set_tracked(snapshot, refreshed)
+            temperature_history.record_snapshot(rconn, prefix, snapshot)
+            target_frame = redis_ops.get_target_frame(prefix, rconn)
+            newkey = (_coord_key(snapshot, telescope()), target_frame)
+            if (result is not None) and not result[0]:
+                # the parked position moves with time, so recalculate it each minute
+                newkey += (int(refreshed//60),)
+            if newkey != key:
+                # the telescope position has changed, so recalculate
+                result = position_from_snapshot(snapshot, target_frame)
+                key = newkey
+            _POSITION = (target_frame, result, refreshed)
+            _notify()
+        except Exception:
+            # on a redis failure, wait and then re-subscribe
+            pubsub = None
+            key = None
+            time.sleep(1.0)
@@ -5,6 +5,8 @@
 #
 ##################################
 
+import hashlib
+
 from datetime import datetime, timezone, timedelta
 from collections import namedtuple
 from struct import pack, unpack
@@ -18,24 +20,43 @@ Position = namedtuple('Position', ['ra', 'dec'])
 _PARKED = (0.0, 180.0)  # altitude, azimuth
 
 import astropy.units as u
-from astropy.coordinates import SkyCoord, EarthLocation, AltAz, name_resolve, solar_system_ephemeris, get_body, Angle
+from astropy.coordinates import SkyCoord, name_resolve, get_body, Angle
 from astropy.time import Time
-from astroquery.mpc import MPC
-from astroquery.exceptions import InvalidQueryError
 
 
 from skipole import FailPage, GoTo, ValidateError, ServerError
 
-from .. import redis_ops
+from .. import events
 
-from ..cfg import observatory, get_planetdb, planetmags
+from ..cfg import get_planetdb, planetmags
 from ..sun import night_slots, Slot
+from ..astro_centre import centre_location, use_jpl
 from ..stars import get_stars, xy_constellation_lines, get_planets, get_named_object, chartpositions
 
 from .sessions import livesession, doorsession
 
 from . import remscope
 
+
+# listeners for the events stream, telescope events update the position text, and
+# chart events call the refresh_chart json page to redraw the chart
+
+_LISTENERS = """
+    source.addEventListener("telescope", function(e) {
+        let scope = JSON.parse(e.data);
+        if (scope.status) {
+            SKIPOLE.setfields({"status:para_text":"Current Telescope Altitude: " + scope.alt + "   Azimuth: " + scope.az,
+                               "scopeposition:para_text":"\\nRA: " + scope.ra + "\\nDEC: " + scope.dec + "\\n"});
+            }
+        else {
+            SKIPOLE.setfields({"status:para_text":"Communications lost. Telescope position unknown!"});
+            }
+        });
+    source.addEventListener("chart", function(e) {
+        SKIPOLE.refreshjson(SKIPOLE.IntervalTarget);
+        });
+"""
+
 # These are mean apparant visual magnitudes, except for pluto, which is a rough guesstimate
 
 _PLANETS = planetmags()
@@ -45,29 +66,27 @@ def get_parked_radec():
     "Returns Position object of the parked position"
     # now work out ra dec
     alt,az = _PARKED
-    solar_system_ephemeris.set('jpl')
-    longitude, latitude, elevation = observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+    use_jpl()
+    astro_centre = centre_location()
     altazcoord = SkyCoord(alt=alt*u.deg, az=az*u.deg, obstime = Time(datetime.utcnow(), format='datetime', scale='utc'), location = astro_centre, frame = 'altaz')
     # transform to ra, dec
     sc = altazcoord.transform_to('icrs')
     return Position(sc.ra.degree, sc.dec.degree)
 
 
-def get_wanted_position(rconn_0, rconn):
-    """Reads Redis to get requested Telescope position"""
-    radec = redis_ops.get_wanted_position(rconn_0, rconn)
-    if radec is not None:
-        wanted_position = Position(*radec)
-    else:
-        wanted_position = get_parked_radec()
-        redis_ops.set_wanted_position(wanted_position.ra, wanted_position.dec, rconn_0, rconn)
+def get_wanted_position(state):
+    """Returns requested Telescope position from the control state, if not set, the parked
+       position is set into the state, to be written by the next state.save()"""
+    if (state.wanted_ra is not None) and (state.wanted_dec is not None):
+        return Position(state.wanted_ra, state.wanted_dec)
+    wanted_position = get_parked_radec()
+    state.update(wanted_ra=wanted_position.ra, wanted_dec=wanted_position.dec)
     return wanted_position
 
 
-def get_chart(rconn_0, rconn):
-    """Read redis to get chart parameters"""
-    return Chart(*redis_ops.get_chart_parameters(rconn_0, rconn))
+def get_chart(state):
+    """Returns chart parameters from the control state"""
+    return Chart(state.view, state.flip, state.rot)
 
 
 # livesession allows the booked in user to access the controls, but only
@@ -78,7 +97,9 @@ def control_template(skicall):
     if not remscope.is_telescope_connected(skicall):
         raise FailPage("Telescope not connected")
     # remove target name from redis
-    redis_ops.del_target_name(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state = remscope.control_state(skicall)
+    state.target_name = None
+    state.save()
     # draw the control page chart
     _draw_chart(skicall)
 
@@ -97,12 +118,16 @@ def _draw_chart(skicall, tstamp=None):
     if tstamp is None:
         tstamp = datetime.utcnow()
 
-    actual = redis_ops.get_chart_actual(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state = remscope.control_state(skicall)
+
+    actual = state.chart_actual
     # True if the chart showing actual positions rather than target position
 
     page_data = skicall.page_data
 
-    wanted_position = get_wanted_position(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    wanted_position = get_wanted_position(state)
+    # writes the parked position if no wanted position was set
+    state.save()
     status,actual_position, altaztuple = remscope.get_actual_position(skicall)
 
     if status:
@@ -114,10 +139,13 @@ RA: {act_ra}
 DEC: {act_dec}
 """
 
-    chart = get_chart(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    chart = get_chart(state)
 
     if actual:
+        # the page is updated by the events stream, polling every 3 seconds if it is unavailable
         page_data['interval']=3
+        page_data['add_jscript'] = events.page_script(_LISTENERS)
+        page_data['ident_data'] = _chart_fingerprint(actual_position.ra, actual_position.dec, chart, tstamp)
         ra = actual_position.ra
         dec = actual_position.dec
     else:
@@ -159,7 +187,7 @@ DEC: {act_dec}
             page_data['status', 'para_text'] = "Communications lost. Telescope position unknown!"
     else:
         page_data['display_target', 'button_text'] = "Display actual"
-        target_name = redis_ops.get_target_name(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+        target_name = state.target_name
         if target_name:
             page_data['status', 'para_text'] = "Target : " + target_name + " Field of view: {:3.2f}\xb0".format(view)
         else:
@@ -186,33 +214,41 @@ def refresh_chart(skicall):
     """Function to refresh the chart by json page interval call, if this is for the target, only the alt az values
        are changed, however if it is for the actual position, the whole chart is redone"""
 
-    actual = redis_ops.get_chart_actual(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state = remscope.control_state(skicall)
+
+    actual = state.chart_actual
     # True if the chart showing actual positions rather than target position
 
     page_data = skicall.page_data
 
     if actual:
         status,actual_position, altaztuple = remscope.get_actual_position(skicall)
-        chart = get_chart(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+        chart = get_chart(state)
         ra = actual_position.ra
         dec = actual_position.dec
         try:
             view = chart.view
         except:
             raise FailPage("Invalid view")
-        # set the transform on the widget
-        page_data['starchart', 'transform'] = _transform(chart.flip, chart.rot)
-        if view>10.0:
-            page_data['starchart', 'lines'] = list(xy_constellation_lines(ra, dec, view))
-        stars, scale, const = get_stars(ra, dec, view)
-        # the planets database are created at 30 minutes past the hour, so get the planets for this hour
-        planets = get_planets(datetime.utcnow(), dec, view, scale, const)
-        if planets:
-            stars.extend(planets)
-        # convert stars ra, dec, to xy positions on the chart
-        stars = chartpositions(stars, ra, dec, view)
-        if stars:
-            page_data['starchart', 'stars'] = stars
+        tstamp = datetime.utcnow()
+        fingerprint = _chart_fingerprint(ra, dec, chart, tstamp)
+        # the browser returns the fingerprint of the chart it shows as its ident_data,
+        # if unchanged, the chart is not modified and is not sent again
+        if skicall.ident_data != fingerprint:
+            page_data['ident_data'] = fingerprint
+            # set the transform on the widget
+            page_data['starchart', 'transform'] = _transform(chart.flip, chart.rot)
+            if view>10.0:
+                page_data['starchart', 'lines'] = list(xy_constellation_lines(ra, dec, view))
+            stars, scale, const = get_stars(ra, dec, view)
+            # the planets database are created at 30 minutes past the hour, so get the planets for this hour
+            planets = get_planets(tstamp, dec, view, scale, const)
+            if planets:
+                stars.extend(planets)
+            # convert stars ra, dec, to xy positions on the chart
+            stars = chartpositions(stars, ra, dec, view)
+            if stars:
+                page_data['starchart', 'stars'] = stars
         if status:
             act_ra = Angle(ra*u.deg).to_string(unit=u.hour, sep=':')
             act_dec = Angle(dec*u.deg).to_string(unit=u.degree, sep=':')
@@ -224,8 +260,9 @@ DEC: {act_dec}
         else:
             page_data['status', 'para_text'] = "Communications lost. Telescope position unknown!"
     else:
-        wanted_position = get_wanted_position(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-        target_name = redis_ops.get_target_name(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+        wanted_position = get_wanted_position(state)
+        state.save()
+        target_name = state.target_name
         if target_name:
             page_data['status', 'para_text'] = "Target : " + target_name
         else:
@@ -247,7 +284,8 @@ def newradec(skicall):
     # If an ra dec value has been input, then clear any
     # name from the name input field, and from redis
     page_data['name', 'input_text'] = ''
-    redis_ops.del_target_name(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state = remscope.control_state(skicall)
+    state.target_name = None
 
     try:
 
@@ -310,10 +348,10 @@ def newradec(skicall):
     else:
         dec = Angle(dec_deg+'d'+dec_min+'m'+dec_sec+'s').degree
 
-    # set these wanted coordinates into redis
-    redis_ops.set_wanted_position(ra, dec, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-    # chart should show target
-    redis_ops.set_chart_actual(False, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    # set these wanted coordinates, and chart should show target
+    state.update(wanted_ra=ra, wanted_dec=dec, chart_actual=False)
+    # and write them to redis in one transaction
+    state.save()
     # now draw the chart
     _draw_chart(skicall)
 
@@ -338,11 +376,11 @@ def namedradec(skicall):
     except:
         raise FailPage("Unable to resolve the target name")
 
-    # set the target name into redis
-    redis_ops.set_target_name(target_name, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-    redis_ops.set_wanted_position(eq_coord.ra.degree, eq_coord.dec.degree, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-    # chart should show wanted target
-    redis_ops.set_chart_actual(False, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    # set the target name and position, and chart should show wanted target
+    state = remscope.control_state(skicall)
+    state.update(target_name=target_name, wanted_ra=eq_coord.ra.degree, wanted_dec=eq_coord.dec.degree, chart_actual=False)
+    # and write them to redis in one transaction
+    state.save()
     # now draw the chart
     _draw_chart(skicall, tstamp=targettime)
 
@@ -350,18 +388,15 @@ def namedradec(skicall):
 @livesession
 def plus_view(skicall):
     "reduce the view by 10%, hence magnify, and call _draw_chart"
-    try:
-        view, flip, rot = redis_ops.get_chart_parameters(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-    except:
-        view = 100.0
-        flip = False
-        rot = 0
+    state = remscope.control_state(skicall)
+    view, flip, rot = get_chart(state)
     view = view * 0.9
     if view < 0.1:
         view = 0.1
     if view > 270.0:
         view = 270.0
-    redis_ops.set_chart_parameters(view, flip, rot, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state.update(view=view, flip=flip, rot=rot)
+    state.save()
     # now draw the chart
     _draw_chart(skicall)
 
@@ -369,18 +404,15 @@ def plus_view(skicall):
 @livesession
 def minus_view(skicall):
     "increase the field of view by 10%, hence reduce magnification, and call _draw_chart"
-    try:
-        view, flip, rot = redis_ops.get_chart_parameters(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-    except:
-        view = 100.0
-        flip = False
-        rot = 0
+    state = remscope.control_state(skicall)
+    view, flip, rot = get_chart(state)
     view = view * 1.1
     if view < 0.1:
         view = 0.1
     if view > 270.0:
         view = 270.0    
-    redis_ops.set_chart_parameters(view, flip, rot, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state.update(view=view, flip=flip, rot=rot)
+    state.save()
     # now draw the chart
     _draw_chart(skicall)
 
@@ -389,12 +421,8 @@ def minus_view(skicall):
 def flip_v(skicall):
     """Flips the chart vertically - this is done with a horizontal flip plus 180 degree rotation"""
 
-    try:
-        view, flip, rot = redis_ops.get_chart_parameters(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-    except:
-        view = 100.0
-        flip = False
-        rot = 0
+    state = remscope.control_state(skicall)
+    view, flip, rot = get_chart(state)
 
     # Do the actual flipping
     if flip:
@@ -407,7 +435,8 @@ def flip_v(skicall):
         rot -= 360
 
     # save the new chart parameters
-    redis_ops.set_chart_parameters(view, flipv, rot, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state.update(flip=flipv, rot=rot)
+    state.save()
     # and send a transform string to the chart
     skicall.page_data['starchart', 'transform'] = _transform(flipv, rot)
 
@@ -416,12 +445,8 @@ def flip_v(skicall):
 def flip_h(skicall):
     """Flips the chart horizontally"""
 
-    try:
-        view, flip, rot = redis_ops.get_chart_parameters(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-    except:
-        view = 100.0
-        flip = False
-        rot = 0
+    state = remscope.control_state(skicall)
+    view, flip, rot = get_chart(state)
 
     # Do the actual flipping
     if flip:
@@ -430,7 +455,8 @@ def flip_h(skicall):
         fliph = True
 
     # save the new chart parameters
-    redis_ops.set_chart_parameters(view, fliph, rot, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state.update(flip=fliph, rot=rot)
+    state.save()
     # and send a transform string to the chart
     skicall.page_data['starchart', 'transform'] = _transform(fliph, rot)
 
@@ -439,12 +465,8 @@ def flip_h(skicall):
 def rotate_plus(skicall):
     """Rotates the chart by 30 degrees"""
 
-    try:
-        view, flip, rot = redis_ops.get_chart_parameters(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-    except:
-        view = 100.0
-        flip = False
-        rot = 0
+    state = remscope.control_state(skicall)
+    view, flip, rot = get_chart(state)
 
     if flip:
         # Do the actual rotating
@@ -458,7 +480,8 @@ def rotate_plus(skicall):
             rot -= 360
 
     # save the new chart parameters
-    redis_ops.set_chart_parameters(view, flip, rot, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state.update(flip=flip, rot=rot)
+    state.save()
     # and send a transform string to the chart
     skicall.page_data['starchart', 'transform'] = _transform(flip, rot)
 
@@ -467,12 +490,8 @@ def rotate_plus(skicall):
 def rotate_minus(skicall):
     """Rotates the chart by -30 degrees"""
 
-    try:
-        view, flip, rot = redis_ops.get_chart_parameters(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-    except:
-        view = 100.0
-        flip = False
-        rot = 0
+    state = remscope.control_state(skicall)
+    view, flip, rot = get_chart(state)
 
     if flip:
         # Do the actual rotating
@@ -486,11 +505,21 @@ def rotate_minus(skicall):
             rot += 360
 
     # save the new chart parameters
-    redis_ops.set_chart_parameters(view, flip, rot, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state.update(flip=flip, rot=rot)
+    state.save()
     # and send a transform string to the chart
     skicall.page_data['starchart', 'transform'] = _transform(flip, rot)
 
 
+def _chart_fingerprint(ra, dec, chart, tstamp):
+    """Returns a string for ident_data, which changes only when the chart of the actual
+       position would be drawn differently"""
+    # ra and dec are quantised to a pixel of the 500 pixel chart, and planets change each hour
+    pixel = chart.view/500.0
+    key = (round(ra/pixel), round(dec/pixel), chart.view, chart.flip, chart.rot, tstamp.strftime("%Y%m%d%H"))
+    return "C" + hashlib.md5(repr(key).encode('utf-8')).hexdigest()[:16]
+
+
 def _transform(flip, rot):
     "Returns transform_string"
     # set the widget transform attribute
@@ -510,11 +539,12 @@ def up_arrow(skicall):
 
     # clear any name from the name input field
     skicall.page_data['name', 'input_text'] = ''
-    redis_ops.del_target_name(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state = remscope.control_state(skicall)
+    state.target_name = None
 
     # The chart is the 'wanted_position'
-    wanted_position = get_wanted_position(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-    chart = get_chart(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    wanted_position = get_wanted_position(state)
+    chart = get_chart(state)
     view = chart.view
     if view > 100.0:
         separation = 10.0
@@ -534,16 +564,11 @@ def up_arrow(skicall):
     if newrot < 0:
         newrot = newrot+360
 
-    # set these wanted coordinates into redis
-    ra = newtarget.ra.degree
-    dec = newtarget.dec.degree
-    redis_ops.set_wanted_position(ra, dec, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    # set these wanted coordinates and the new chart parameters, chart should show target
+    state.update(wanted_ra=newtarget.ra.degree, wanted_dec=newtarget.dec.degree, rot=newrot, chart_actual=False)
 
-    # save the new chart parameters
-    redis_ops.set_chart_parameters(view, chart.flip, newrot, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-
-    # chart should show target
-    redis_ops.set_chart_actual(False, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    # and write the changes to redis in one transaction
+    state.save()
 
     # now draw the chart
     _draw_chart(skicall)
@@ -555,11 +580,12 @@ def left_arrow(skicall):
 
     # clear any name from the name input field
     skicall.page_data['name', 'input_text'] = ''
-    redis_ops.del_target_name(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state = remscope.control_state(skicall)
+    state.target_name = None
 
     # The chart is the 'wanted_position'
-    wanted_position = get_wanted_position(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-    chart = get_chart(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    wanted_position = get_wanted_position(state)
+    chart = get_chart(state)
     view = chart.view
     if view > 100.0:
         separation = 10.0
@@ -584,16 +610,11 @@ def left_arrow(skicall):
     if newrot < 0:
         newrot = newrot+360
 
-    # set these wanted coordinates into redis
-    ra = newtarget.ra.degree
-    dec = newtarget.dec.degree
-    redis_ops.set_wanted_position(ra, dec, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    # set these wanted coordinates and the new chart parameters, chart should show target
+    state.update(wanted_ra=newtarget.ra.degree, wanted_dec=newtarget.dec.degree, rot=newrot, chart_actual=False)
 
-    # save the new chart parameters
-    redis_ops.set_chart_parameters(view, chart.flip, newrot, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-
-    # chart should show target
-    redis_ops.set_chart_actual(False, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    # and write the changes to redis in one transaction
+    state.save()
 
     # now draw the chart
     _draw_chart(skicall)
@@ -605,11 +626,12 @@ def right_arrow(skicall):
 
     # clear any name from the name input field
     skicall.page_data['name', 'input_text'] = ''
-    redis_ops.del_target_name(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state = remscope.control_state(skicall)
+    state.target_name = None
 
     # The chart is the 'wanted_position'
-    wanted_position = get_wanted_position(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-    chart = get_chart(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    wanted_position = get_wanted_position(state)
+    chart = get_chart(state)
     view = chart.view
     if view > 100.0:
         separation = 10.0
@@ -634,16 +656,11 @@ def right_arrow(skicall):
     if newrot < 0:
         newrot = newrot+360
 
-    # set these wanted coordinates into redis
-    ra = newtarget.ra.degree
-    dec = newtarget.dec.degree
-    redis_ops.set_wanted_position(ra, dec, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    # set these wanted coordinates and the new chart parameters, chart should show target
+    state.update(wanted_ra=newtarget.ra.degree, wanted_dec=newtarget.dec.degree, rot=newrot, chart_actual=False)
 
-    # save the new chart parameters
-    redis_ops.set_chart_parameters(view, chart.flip, newrot, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-
-    # chart should show target
-    redis_ops.set_chart_actual(False, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    # and write the changes to redis in one transaction
+    state.save()
 
     # now draw the chart
     _draw_chart(skicall)
@@ -655,11 +672,12 @@ def down_arrow(skicall):
 
     # clear any name from the name input field
     skicall.page_data['name', 'input_text'] = ''
-    redis_ops.del_target_name(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state = remscope.control_state(skicall)
+    state.target_name = None
 
     # The chart is the 'wanted_position'
-    wanted_position = get_wanted_position(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-    chart = get_chart(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    wanted_position = get_wanted_position(state)
+    chart = get_chart(state)
     view = chart.view
     if view > 100.0:
         separation = 10.0
@@ -677,16 +695,11 @@ def down_arrow(skicall):
     if newrot < 0:
         newrot = newrot+360
 
-    # set these wanted coordinates into redis
-    ra = newtarget.ra.degree
-    dec = newtarget.dec.degree
-    redis_ops.set_wanted_position(ra, dec, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-
-    # save the new chart parameters
-    redis_ops.set_chart_parameters(view, chart.flip, newrot, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    # set these wanted coordinates and the new chart parameters, chart should show target
+    state.update(wanted_ra=newtarget.ra.degree, wanted_dec=newtarget.dec.degree, rot=newrot, chart_actual=False)
 
-    # chart should show target
-    redis_ops.set_chart_actual(False, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    # and write the changes to redis in one transaction
+    state.save()
 
     # now draw the chart
     _draw_chart(skicall)
@@ -718,12 +731,10 @@ def _new_ra_dac(ra, dec, position_angle, separation):
 @livesession
 def display_target(skicall):
     """toggles the redis flag to indicate the chart display"""
-    mode = redis_ops.get_chart_actual(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state = remscope.control_state(skicall)
     # save the chart display mode
-    if mode:
-        redis_ops.set_chart_actual(False, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
-    else:
-        redis_ops.set_chart_actual(True, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state.chart_actual = not state.chart_actual
+    state.save()
     # now draw the chart
     _draw_chart(skicall)
 
@@ -732,11 +743,12 @@ def display_target(skicall):
 @livesession
 def telescope_status(skicall):
     "Get the wanted ra and dec, and convert to alt, az, send to telescope"
-    wanted_position = get_wanted_position(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state = remscope.control_state(skicall)
+    wanted_position = get_wanted_position(state)
     try:
         target_ra = wanted_position.ra
         target_dec = wanted_position.dec
-        target_name = redis_ops.get_target_name(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+        target_name = state.target_name
     except:
         raise FailPage("Invalid target")
 
@@ -756,7 +768,8 @@ AZ: {:1.3f}\xb0""".format(target_pg.ra.to_string(unit=u.hour, sep=':'),
                           target_altaz.az.degree)
 
     # chart should show actual
-    redis_ops.set_chart_actual(True, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state.chart_actual = True
+    state.save()
 
     # now draw the chart
     _draw_chart(skicall, tstamp=datetime.utcnow())
@@ -766,7 +779,9 @@ AZ: {:1.3f}\xb0""".format(target_pg.ra.to_string(unit=u.hour, sep=':'),
 def altaz_template(skicall):
     "Fills in the template page of the altaz control"
     # remove target name from redis
-    redis_ops.del_target_name(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state = remscope.control_state(skicall)
+    state.target_name = None
+    state.save()
     # This page consists of two input fields
 
 
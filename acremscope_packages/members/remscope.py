@@ -8,19 +8,17 @@ from datetime import datetime, timedelta
 from collections import namedtuple
 
 import astropy.units as u
-from astropy.coordinates import SkyCoord, EarthLocation, AltAz, name_resolve, solar_system_ephemeris, get_body, Angle, PrecessedGeocentric
+from astropy.coordinates import SkyCoord, name_resolve, get_body, Angle, PrecessedGeocentric
 from astropy.time import Time
-from astroquery.mpc import MPC
-from astroquery.exceptions import InvalidQueryError
 
 from skipole import FailPage, GoTo, ValidateError, ServerError
 
-from .. import sun, stars, database_ops, redis_ops, cfg
+from .. import sun, stars, database_ops, redis_ops, indi_snapshot, indi_tracker, cfg
+from ..astro_centre import centre_location, centre_altaz, use_jpl
 
 from indi_mr import tools
 
 from .sessions import doorsession
-from .. import redis_ops
 
 Position = namedtuple('Position', ['ra', 'dec'])
 
@@ -43,9 +41,8 @@ def get_parked_radec():
     "Returns Position object of the parked position"
     # now work out ra dec
     alt,az = _PARKED
-    solar_system_ephemeris.set('jpl')
-    longitude, latitude, elevation = cfg.observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+    use_jpl()
+    astro_centre = centre_location()
     altazcoord = SkyCoord(alt=alt*u.deg, az=az*u.deg, obstime = Time(datetime.utcnow(), format='datetime', scale='utc'), location = astro_centre, frame = 'altaz')
     # transform to ra, dec
     sc = altazcoord.transform_to('icrs')
@@ -56,7 +53,7 @@ def create_index(skicall):
     "Fills in the remscope index page, also used to refresh the page by JSON"
 
     # door is one of UNKNOWN, OPEN, CLOSED, OPENING, CLOSING
-    door = redis_ops.get_door(skicall.proj_data.get("rconn"), skicall.proj_data.get("redisserver"))
+    door = indi_snapshot.get_snapshot(skicall).door()
     skicall.page_data['door_status', 'para_text'] = "Door : " + door
     if door == 'CLOSED':
         skicall.page_data['door', 'button_text'] = 'Open Door'
@@ -114,7 +111,7 @@ def door_control(skicall):
     door_name = cfg.door()
 
     # check current state of the door to ensure action is valid
-    door = redis_ops.get_door(skicall.proj_data.get("rconn"), skicall.proj_data.get("redisserver"))
+    door = indi_snapshot.get_snapshot(skicall).door()
 
     if (door == 'CLOSED') and (call_data['door', 'action'] == 'open'):
         # open the door
@@ -150,16 +147,13 @@ def is_telescope_connected(skicall):
     "Returns True if the telescope is connected, False otherwise"
     # get telescope name
     telescope_name = cfg.telescope()
-    rconn = skicall.proj_data.get("rconn")
-    redisserver = skicall.proj_data.get("redisserver")
-    device_list = tools.devices(rconn, redisserver)
-    if telescope_name not in device_list:
+    snapshot = indi_snapshot.get_snapshot(skicall)
+    if telescope_name not in snapshot.devices():
         return False
     # so the telescope is a known device, does it have a CONNECTION property
-    properties_list = tools.properties(rconn, redisserver, telescope_name)
-    if "CONNECTION" not in properties_list:
+    if "CONNECTION" not in snapshot.properties(telescope_name):
         return False
-    attribs = tools.elements_dict(rconn, redisserver, "CONNECT", "CONNECTION" , telescope_name)
+    attribs = snapshot.elements_dict("CONNECT", "CONNECTION" , telescope_name)
     if attribs['value'] == "On":
         return True
     return False
@@ -171,11 +165,11 @@ def telescope_connection(skicall, connect):
     telescope_name = cfg.telescope()
     rconn = skicall.proj_data.get("rconn")
     redisserver = skicall.proj_data.get("redisserver")
-    device_list = tools.devices(rconn, redisserver)
-    if telescope_name not in device_list:
+    snapshot = indi_snapshot.get_snapshot(skicall)
+    if telescope_name not in snapshot.devices():
         return
     # so the telescope is a known device, does it have a CONNECTION property
-    properties_list = tools.properties(rconn, redisserver, telescope_name)
+    properties_list = snapshot.properties(telescope_name)
     if "CONNECTION" not in properties_list:
         return
     # and connect/disconnect
@@ -185,20 +179,37 @@ def telescope_connection(skicall, connect):
         tools.newswitchvector(rconn, redisserver, "CONNECTION" , telescope_name, {"CONNECT":"Off", "DISCONNECT":"On"})
 
 
+def control_state(skicall):
+    """Returns the redis_ops.ControlState of the telescope, read from redis once per call
+       and shared by the functions handling this call"""
+    if 'control_state' not in skicall.call_data:
+        skicall.call_data['control_state'] = redis_ops.ControlState(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    return skicall.call_data['control_state']
+
+
 def get_actual_position(skicall):
     """Gets actual Telescope position,
        return (True, Position, (alt,az)) if known, (False, Position (alt,az))
        if unknown"""
+    target_frame = control_state(skicall).target_frame
+    # the indi_tracker thread keeps the converted position, if it is running
+    position = indi_tracker.actual_position(target_frame)
+    if position is not None:
+        return position
+    return position_from_snapshot(indi_snapshot.get_snapshot(skicall), target_frame)
+
+
+def position_from_snapshot(snapshot, target_frame):
+    """Gets actual Telescope position from an indi_snapshot.Snapshot, target_frame is that
+       set in the control state, return (True, Position, (alt,az)) if known,
+       (False, Position (alt,az)) if unknown"""
 
     # get telescope name
     telescope_name = cfg.telescope()
-    rconn = skicall.proj_data.get("rconn")
-    redisserver = skicall.proj_data.get("redisserver")
-    device_list = tools.devices(rconn, redisserver)
-    if telescope_name not in device_list:
+    if telescope_name not in snapshot.devices():
         return False, get_parked_radec(), _PARKED
 
-    properties_list = tools.properties(rconn, redisserver, telescope_name)
+    properties_list = snapshot.properties(telescope_name)
 
     ra_act = None
     dec_act = None
@@ -210,20 +221,20 @@ def get_actual_position(skicall):
     if 'EQUATORIAL_COORD' in properties_list:
         # get ra_act and dec_act
 
-        # tools.elements_dict returns a dictionary of element attributes for the given element, property and device
-        ra_dict = tools.elements_dict(rconn, redisserver, 'RA', 'EQUATORIAL_COORD', telescope_name)
+        # snapshot.elements_dict returns a dictionary of element attributes for the given element, property and device
+        ra_dict = snapshot.elements_dict('RA', 'EQUATORIAL_COORD', telescope_name)
         ra_act = ra_dict['float_number'] * 360.0/24.0
-        dec_dict = tools.elements_dict(rconn, redisserver, 'DEC', 'EQUATORIAL_COORD', telescope_name)
+        dec_dict = snapshot.elements_dict('DEC', 'EQUATORIAL_COORD', telescope_name)
         dec_act = dec_dict['float_number']
         targettime = Time(ra_dict['timestamp'], format='isot', scale='utc')
 
     if 'HORIZONTAL_COORD' in properties_list:
         # get alt_act, az_act
 
-        # tools.elements_dict returns a dictionary of element attributes for the given element, property and device
-        alt_dict = tools.elements_dict(rconn, redisserver, 'ALT', 'HORIZONTAL_COORD', telescope_name)
+        # snapshot.elements_dict returns a dictionary of element attributes for the given element, property and device
+        alt_dict = snapshot.elements_dict('ALT', 'HORIZONTAL_COORD', telescope_name)
         alt_act = alt_dict['float_number']
-        az_dict = tools.elements_dict(rconn, redisserver, 'AZ', 'HORIZONTAL_COORD', telescope_name)
+        az_dict = snapshot.elements_dict('AZ', 'HORIZONTAL_COORD', telescope_name)
         az_act = az_dict['float_number']
         targettime = Time(alt_dict['timestamp'], format='isot', scale='utc')
 
@@ -232,14 +243,13 @@ def get_actual_position(skicall):
         return True, Position(ra_act, dec_act), (alt_act, az_act)
 
     # one or both are missing so need to be able to calculate properties
-    solar_system_ephemeris.set('jpl')
-    longitude, latitude, elevation = cfg.observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+    use_jpl()
+    astro_centre = centre_location()
 
     if 'EQUATORIAL_COORD' in properties_list:
         # 'HORIZONTAL_COORD' is missing so calculate them from equatorial coords
         target = SkyCoord(ra_act*u.deg, dec_act*u.deg, frame='icrs')
-        target_altaz = target.transform_to(AltAz(obstime = targettime, location = astro_centre))
+        target_altaz = target.transform_to(centre_altaz(targettime))
         return True, Position(ra_act, dec_act), (target_altaz.alt.degree, target_altaz.az.degree)
 
     if 'HORIZONTAL_COORD' in properties_list:
@@ -257,14 +267,13 @@ def get_actual_position(skicall):
 
     # must calculate ra,dec, alt and az from EQUATORIAL_EOD_COORD
 
-    # tools.elements_dict returns a dictionary of element attributes for the given element, property and device
-    ra_dict = tools.elements_dict(rconn, redisserver, 'RA', 'EQUATORIAL_EOD_COORD', telescope_name)
+    # snapshot.elements_dict returns a dictionary of element attributes for the given element, property and device
+    ra_dict = snapshot.elements_dict('RA', 'EQUATORIAL_EOD_COORD', telescope_name)
     ra = ra_dict['float_number'] * 360.0/24.0
-    dec_dict = tools.elements_dict(rconn, redisserver, 'DEC', 'EQUATORIAL_EOD_COORD', telescope_name)
+    dec_dict = snapshot.elements_dict('DEC', 'EQUATORIAL_EOD_COORD', telescope_name)
     dec = dec_dict['float_number']
     targettime = Time(ra_dict['timestamp'], format='isot', scale='utc')
 
-    target_frame = redis_ops.get_target_frame(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
     if target_frame == 'icrs':
         # undo the precession calculation to get icrs back
         target = SkyCoord(ra*u.deg, dec*u.deg, obstime = targettime, equinox=targettime, frame='precessedgeocentric')
@@ -276,7 +285,7 @@ def get_actual_position(skicall):
     else:
         return False, get_parked_radec(), _PARKED
 
-    target_altaz = target.transform_to(AltAz(obstime = targettime, location = astro_centre))
+    target_altaz = target.transform_to(centre_altaz(targettime))
 
     return True, Position(target_eq.ra.degree, target_eq.dec.degree), (target_altaz.alt.degree, target_altaz.az.degree)
 
@@ -287,17 +296,14 @@ def set_target(skicall, target_ra, target_dec, target_name):
     telescope_name = cfg.telescope()
     rconn = skicall.proj_data.get("rconn")
     redisserver = skicall.proj_data.get("redisserver")
-    device_list = tools.devices(rconn, redisserver)
-    if telescope_name not in device_list:
+    snapshot = indi_snapshot.get_snapshot(skicall)
+    if telescope_name not in snapshot.devices():
         return
 
-    properties_list = tools.properties(rconn, redisserver, telescope_name)
+    properties_list = snapshot.properties(telescope_name)
 
 
-    solar_system_ephemeris.set('jpl')
-    # longitude, latitude, elevation of the astronomy centre
-    longitude, latitude, elevation = cfg.observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+    use_jpl()
     tstamp = Time(datetime.utcnow(), format='datetime', scale='utc')
 
     try:
@@ -309,7 +315,7 @@ def set_target(skicall, target_ra, target_dec, target_name):
     if not target_name:
         # target name not given, so fixed ra and dec values, find alt az
         target = SkyCoord(target_ra*u.deg, target_dec*u.deg, frame='icrs')
-        target_altaz = target.transform_to(AltAz(obstime=tstamp, location=astro_centre))
+        target_altaz = target.transform_to(centre_altaz(tstamp))
 
     if target.frame.name == 'icrs':
         target_pg = target.transform_to(PrecessedGeocentric(obstime=tstamp, equinox=tstamp))
@@ -318,7 +324,9 @@ def set_target(skicall, target_ra, target_dec, target_name):
         target_pg = target.transform_to(PrecessedGeocentric(obstime=tstamp, equinox=tstamp))
 
     # record the original frame used in redis
-    redis_ops.set_target_frame(target.frame.name, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    state = control_state(skicall)
+    state.target_frame = target.frame.name
+    state.save()
 
     if 'HORIZONTAL_COORD' in properties_list:
         result = tools.newnumbervector(rconn, redisserver, 'HORIZONTAL_COORD', telescope_name, {'ALT':str(target_altaz.alt.degree),
@@ -343,14 +351,14 @@ def altaz_goto(skicall, altitude, azimuth):
     telescope_name = cfg.telescope()
     rconn = skicall.proj_data.get("rconn")
     redisserver = skicall.proj_data.get("redisserver")
-    device_list = tools.devices(rconn, redisserver)
-    if telescope_name not in device_list:
+    snapshot = indi_snapshot.get_snapshot(skicall)
+    if telescope_name not in snapshot.devices():
         return False
     # so the telescope is a known device, does it have a CONNECTION property
-    properties_list = tools.properties(rconn, redisserver, telescope_name)
+    properties_list = snapshot.properties(telescope_name)
     if "CONNECTION" not in properties_list:
         return False
-    attribs = tools.elements_dict(rconn, redisserver, "CONNECT", "CONNECTION" , telescope_name)
+    attribs = snapshot.elements_dict("CONNECT", "CONNECTION" , telescope_name)
     if attribs['value'] == "Off":
         return False
 
@@ -367,9 +375,7 @@ def altaz_goto(skicall, altitude, azimuth):
         else:
             return True
 
-    # longitude, latitude, elevation of the astronomy centre
-    longitude, latitude, elevation = cfg.observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+    astro_centre = centre_location()
     targettime = Time(datetime.utcnow(), format='datetime', scale='utc')
 
     target = SkyCoord(alt=altitude*u.deg, az=azimuth*u.deg, obstime = targettime, location = astro_centre, frame = 'altaz')
@@ -402,16 +408,13 @@ def set_track_state(skicall, state):
 def get_track_state(skicall):
     "Returns On, Off or UKNOWN"
     telescope_name = cfg.telescope()
-    rconn = skicall.proj_data.get("rconn")
-    redisserver = skicall.proj_data.get("redisserver")
-    device_list = tools.devices(rconn, redisserver)
-    if telescope_name not in device_list:
+    snapshot = indi_snapshot.get_snapshot(skicall)
+    if telescope_name not in snapshot.devices():
         return "UNKNOWN"
     # so the telescope is a known device, does it have a TELESCOPE_TRACK_STATE property
-    properties_list = tools.properties(rconn, redisserver, telescope_name)
-    if "TELESCOPE_TRACK_STATE" not in properties_list:
+    if "TELESCOPE_TRACK_STATE" not in snapshot.properties(telescope_name):
         return "UNKNOWN"
-    attribs = tools.elements_dict(rconn, redisserver, "TRACK_ON", "TELESCOPE_TRACK_STATE" , telescope_name)
+    attribs = snapshot.elements_dict("TRACK_ON", "TELESCOPE_TRACK_STATE" , telescope_name)
     if attribs['value'] == "On":
         return "On"
     else:
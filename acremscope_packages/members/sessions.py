@@ -10,7 +10,7 @@ from functools import wraps
 
 from skipole import FailPage, GoTo, ValidateError, ServerError
 
-from .. import sun, database_ops, redis_ops
+from .. import sun, database_ops, indi_snapshot
 
 
 
@@ -39,33 +39,17 @@ def members_sessions_index(skicall):
     # sequence 23 is 11 am of the next day
 
 
-    # get night 0 start and end observing hour
-    hour, minute = sun.sunset(fromdate)
-    start_hour_0 = hour + 1
-    # observing can start after start_hour_0 as the sun will set before it
-    # and convert this to the sequence number start0
-    start0 = start_hour_0 - 12
+    # get night 0 and night 1 start and end observing sequence numbers
+    # observing can start at start0 as the sun will set before it
+    # and must end at end0 as the sun will rise after that hour
+    night_zero = sun.night_calendar(fromdate)
+    start0 = night_zero.start_sequence
+    end0 = night_zero.end_sequence
 
     nextday = fromdate + timedelta(days=1)
-    hour, minute = sun.sunrise(nextday)
-    end_hour_0 = hour
-    # observing must end at end_hour_0 as the sun will rise after that hour
-    # and convert this to the sequence number end0
-    end0 = 12 + end_hour_0
-
-    # get night 1 start and end observing hour
-    hour, minute = sun.sunset(nextday)
-    start_hour_1 = hour + 1
-    # observing can start after start_hour_1 as the sun will set before it
-    # and convert this to the sequence number start1
-    start1 = start_hour_1 - 12
-
-    postday = nextday + timedelta(days=1)
-    hour, minute = sun.sunrise(postday)
-    end_hour_1 = hour
-    # observing must end at end_hour_1 as the sun will rise after that hour
-    # and convert this to the sequence number end1
-    end1 = 12 + end_hour_1
+    night_one = sun.night_calendar(nextday)
+    start1 = night_one.start_sequence
+    end1 = night_one.end_sequence
 
     # get two nights of Slots
     night0, night1 = sun.twoday_slots(fromdate)
@@ -290,7 +274,7 @@ def _slot_from_received_data(received_data):
     except:
         raise FailPage("Invalid date")
 
-    return sun.Slot(startday, sequence), action
+    return sun.night_calendar(startday).slot(sequence), action
 
 
 
@@ -335,10 +319,11 @@ def book_session(skicall):
     if (now.hour < h_rise) and (starttime>midtomorrow):
         raise FailPage("Invalid date")
 
+    calendar = sun.night_calendar(startday)
     # First slot of the night
-    firstslot = sun.Slot(startday, 0)
+    firstslot = calendar.slot(0)
     # Last slot of the night
-    lastslot = sun.Slot(startday, 23)
+    lastslot = calendar.slot(23)
 
     con = database_ops.open_database()
     try:
@@ -424,33 +409,17 @@ def json_refresh_sessions(skicall):
     # sequence 23 is 11 am of the next day
 
 
-    # get night 0 start and end observing hour
-    hour, minute = sun.sunset(fromdate)
-    start_hour_0 = hour + 1
-    # observing can start after start_hour_0 as the sun will set before it
-    # and convert this to the sequence number start0
-    start0 = start_hour_0 - 12
+    # get night 0 and night 1 start and end observing sequence numbers
+    # observing can start at start0 as the sun will set before it
+    # and must end at end0 as the sun will rise after that hour
+    night_zero = sun.night_calendar(fromdate)
+    start0 = night_zero.start_sequence
+    end0 = night_zero.end_sequence
 
     nextday = fromdate + timedelta(days=1)
-    hour, minute = sun.sunrise(nextday)
-    end_hour_0 = hour
-    # observing must end at end_hour_0 as the sun will rise after that hour
-    # and convert this to the sequence number end0
-    end0 = 12 + end_hour_0
-
-    # get night 1 start and end observing hour
-    hour, minute = sun.sunset(nextday)
-    start_hour_1 = hour + 1
-    # observing can start after start_hour_1 as the sun will set before it
-    # and convert this to the sequence number start1
-    start1 = start_hour_1 - 12
-
-    postday = nextday + timedelta(days=1)
-    hour, minute = sun.sunrise(postday)
-    end_hour_1 = hour
-    # observing must end at end_hour_1 as the sun will rise after that hour
-    # and convert this to the sequence number end1
-    end1 = 12 + end_hour_1
+    night_one = sun.night_calendar(nextday)
+    start1 = night_one.start_sequence
+    end1 = night_one.end_sequence
 
     # get two nights of Slots
     night0, night1 = sun.twoday_slots(fromdate)
@@ -614,7 +583,7 @@ def livesession(submit_data):
         if user_id == call_data["booked_user_id"]:
             # the current slot has been booked by the current logged in user,
             # check the door is open
-            if redis_ops.get_door(skicall.proj_data.get("rconn"), skicall.proj_data.get("redisserver")) != "OPEN":
+            if indi_snapshot.get_snapshot(skicall).door() != "OPEN":
                # booked user, but the door is not open
                raise FailPage("The door is not open.")
             # so continue with submit_data
@@ -0,0 +1,163 @@
+####################################################
+#
+# Resolves target names, such as M31, NGC 7000 or Vega, to ICRS
+# positions without a network call where possible, in the order:
+#
+# the catalogue names.db, made by astrodata/make_names.py, of Messier,
+# Caldwell, NGC, IC objects and named bright stars
+#
+# the cache namecache.db of every name previously resolved remotely
+#
+# the remote Sesame service, through SkyCoord.from_name, with each
+# success stored in the cache
+#
+# Names are matched by name_key, so "M 31", "m31" and "Messier 031"
+# are the same name.
+#
+####################################################
+
+
+import re, sqlite3, threading
+
+from datetime import datetime
+
+from .cfg import get_names, get_namecache
+
+
+_LOCK = threading.Lock()
+
+# counts of names found, by where they were found, since this process started
+_COUNTS = {"catalogue":0, "cache":0, "remote":0, "failed":0}
+
+_LONG_NAMES = (("messier", "m"), ("caldwell", "c"))
+
+# a catalogue prefix followed by a number, with leading zeros removed
+_NUMBERED = re.compile(r"([a-z]+)0*(\d+)([a-z]?)")
+
+
+def name_key(name):
+    """Returns the key used to find name in the catalogue and cache,
+       note astrodata/make_names.py has a copy of this function, which must be kept the same"""
+    key = "".join(c for c in name.lower() if c.isalnum())
+    for longname, shortname in _LONG_NAMES:
+        if key.startswith(longname) and key[len(longname):].isdigit():
+            key = shortname + key[len(longname):]
+            break
+    match = _NUMBERED.fullmatch(key)
+    if match:
+        key = "".join(match.groups())
+    return key
+
+
+def _count(found):
+    with _LOCK:
+        _COUNTS[found] += 1
+
+
+def _from_catalogue(key):
+    "Returns (ra, dec) in degrees from the catalogue, or None if not found"
+    try:
+        con = sqlite3.connect(f"file:{get_names()}?mode=ro", uri=True)
+        try:
+            return con.execute("SELECT RA,DEC FROM NAMES WHERE NAME=?", (key,)).fetchone()
+        finally:
+            con.close()
+    except:
+        return
+
+
+def _open_cache():
+    "Returns a connection to the cache, creating its table if it does not exist"
+    con = sqlite3.connect(get_namecache(), timeout=5, detect_types=sqlite3.PARSE_DECLTYPES)
+    con.execute("""CREATE TABLE IF NOT EXISTS RESOLVED(NAME TEXT PRIMARY KEY,
+                                                       RA REAL,
+                                                       DEC REAL,
+                                                       RESOLVED timestamp,
+                                                       HITS INTEGER DEFAULT 0)""")
+    return con
+
+
+def _from_cache(key):
+    "Returns (ra, dec) in degrees from the cache, counting the hit, or None if not found"
+    try:
+        con = _open_cache()
+        try:
+            with con:
+                position = con.execute("SELECT RA,DEC FROM RESOLVED WHERE NAME=?", (key,)).fetchone()
+                if position is not None:
+                    con.execute("UPDATE RESOLVED SET HITS=HITS+1 WHERE NAME=?", (key,))
+            return position
+        finally:
+            con.close()
+    except:
+        return
+
+
+def _to_cache(key, ra, dec):
+    "Stores a remotely resolved position in the cache, returns True on success, False on failure"
+    try:
+        con = _open_cache()
+        try:
+            with con:
+                con.execute("INSERT OR REPLACE INTO RESOLVED(NAME,RA,DEC,RESOLVED,HITS) VALUES (?,?,?,?,0)",
+                            (key, ra, dec, datetime.utcnow()))
+        finally:
+            con.close()
+    except:
+        return False
+    return True
+
+
+def lookup(target_name):
+    "Returns (ra, dec) in degrees of target_name from the catalogue or cache, without a remote call, or None if not found"
+    key = name_key(target_name)
+    if not key:
+        return
+    position = _from_catalogue(key)
+    if position is not None:
+        _count("catalogue")
+        return position
+    position = _from_cache(key)
+    if position is not None:
+        _count("cache")
+        return position
+
+
+def resolve(target_name):
+    """Returns an ICRS SkyCoord of target_name, a drop in replacement of SkyCoord.from_name,
+       raises astropy name_resolve.NameResolveError if not found"""
+    import astropy.units as u
+    from astropy.coordinates import SkyCoord
+    position = lookup(target_name)
+    if position is not None:
+        return SkyCoord(position[0]*u.deg, position[1]*u.deg, frame='icrs')
+    # the last resort, a network call, raises NameResolveError on failure
+    try:
+        target = SkyCoord.from_name(target_name)
+    except:
+        _count("failed")
+        raise
+    _count("remote")
+    key = name_key(target_name)
+    if key:
+        _to_cache(key, float(target.ra.degree), float(target.dec.degree))
+    return target
+
+
+def stats():
+    """Returns a dictionary of counts of names found in the catalogue, the cache, remotely, or failed,
+       since this process started, with hit_rate, the fraction found without a remote call,
+       and cache_hits, the total hits recorded in the cache file"""
+    with _LOCK:
+        counts = dict(_COUNTS)
+    total = sum(counts.values())
+    counts["hit_rate"] = (counts["catalogue"] + counts["cache"])/total if total else 0.0
+    try:
+        con = _open_cache()
+        try:
+            counts["cache_hits"] = con.execute("SELECT COALESCE(SUM(HITS),0) FROM RESOLVED").fetchone()[0]
+        finally:
+            con.close()
+    except:
+        counts["cache_hits"] = None
+    return counts
@@ -9,16 +9,25 @@ from skipole import FailPage, GoTo, ValidateError, ServerError
 
 from indi_mr import tools
 
-from .. import sun, database_ops, redis_ops
+from .. import sun, database_ops, indi_snapshot, events
+
+
+# listener for the events stream, which updates the led status
+_LISTENERS = """
+    source.addEventListener("indi", function(e) {
+        SKIPOLE.setfields({"output01:para_text":"LED : " + JSON.parse(e.data).led});
+        });
+"""
 
 
 def create_index(skicall):
     "Fills in the tests index page"
-    skicall.page_data['output01', 'para_text'] = "LED : " + redis_ops.get_led(skicall.proj_data.get("rconn"), skicall.proj_data.get("redisserver"))
+    skicall.page_data['output01', 'para_text'] = "LED : " + indi_snapshot.get_snapshot(skicall).led()
+    skicall.page_data['add_jscript'] = events.page_script(_LISTENERS)
 
 def refresh_led_status(skicall):
     "Display sensor values, initially just the led status"
-    skicall.page_data['output01', 'para_text'] = "LED : " + redis_ops.get_led(skicall.proj_data.get("rconn"), skicall.proj_data.get("redisserver"))
+    skicall.page_data['output01', 'para_text'] = "LED : " + indi_snapshot.get_snapshot(skicall).led()
 
 
 # tools.newswitchvector(rconn, redisserver, name, device, values, timestamp=None):
@@ -10,9 +10,7 @@ from datetime import date, timedelta, datetime
 
 from skipole import FailPage, GoTo, ValidateError, ServerError
 
-from indi_mr import tools
-
-from .. import sun, database_ops, cfg
+from .. import sun, database_ops, indi_snapshot, cfg
 
 
 def index_page(skicall):
@@ -24,17 +22,13 @@ def index_page(skicall):
         skicall.page_data['home_text', 'para_text'] = home_text
 
 
-    message_string = database_ops.get_all_messages()
+    message_string = database_ops.get_messages_text()
     if message_string:
         skicall.page_data['messages', 'messages', 'para_text'] = message_string
 
     # get timestamp of the network monitor, display alarm if greater than 15 secods
-    # tools.elements_dict returns a dictionary of element attributes for the given element, property and device
-    monitor = tools.elements_dict(skicall.proj_data.get("rconn"),
-                                  skicall.proj_data.get("redisserver"),
-                                  'KeepAlive',
-                                  'TenSecondHeartbeat',
-                                  'Network Monitor')
+    # snapshot.elements_dict returns a dictionary of element attributes for the given element, property and device
+    monitor = indi_snapshot.get_snapshot(skicall).elements_dict('KeepAlive', 'TenSecondHeartbeat', 'Network Monitor')
     if not monitor:
         skicall.page_data['show_error'] = "Network Error : Unable to read monitor timestamp"
         return
@@ -98,33 +92,17 @@ def sessions_index(skicall):
     # sequence 23 is 11 am of the next day
 
 
-    # get night 0 start and end observing hour
-    hour, minute = sun.sunset(fromdate)
-    start_hour_0 = hour + 1
-    # observing can start after start_hour_0 as the sun will set before it
-    # and convert this to the sequence number start0
-    start0 = start_hour_0 - 12
+    # get night 0 and night 1 start and end observing sequence numbers
+    # observing can start at start0 as the sun will set before it
+    # and must end at end0 as the sun will rise after that hour
+    night_zero = sun.night_calendar(fromdate)
+    start0 = night_zero.start_sequence
+    end0 = night_zero.end_sequence
 
     nextday = fromdate + timedelta(days=1)
-    hour, minute = sun.sunrise(nextday)
-    end_hour_0 = hour
-    # observing must end at end_hour_0 as the sun will rise after that hour
-    # and convert this to the sequence number end0
-    end0 = 12 + end_hour_0
-
-    # get night 1 start and end observing hour
-    hour, minute = sun.sunset(nextday)
-    start_hour_1 = hour + 1
-    # observing can start after start_hour_1 as the sun will set before it
-    # and convert this to the sequence number start1
-    start1 = start_hour_1 - 12
-
-    postday = nextday + timedelta(days=1)
-    hour, minute = sun.sunrise(postday)
-    end_hour_1 = hour
-    # observing must end at end_hour_1 as the sun will rise after that hour
-    # and convert this to the sequence number end1
-    end1 = 12 + end_hour_1
+    night_one = sun.night_calendar(nextday)
+    start1 = night_one.start_sequence
+    end1 = night_one.end_sequence
 
     # get two nights of Slots
     night0, night1 = sun.twoday_slots(fromdate)
@@ -5,7 +5,7 @@
 ##################################
 
 
-import os, sys, sqlite3, math, json
+import sys, sqlite3, math
 
 from datetime import date, datetime, timedelta
 from collections import namedtuple
@@ -19,26 +19,19 @@ Target = namedtuple('Target', ['target_name', 'planning_date', 'target_datetime'
 
 
 import astropy.units as u
-from astropy.coordinates import SkyCoord, EarthLocation, AltAz, name_resolve, solar_system_ephemeris, get_body, Angle, PrecessedGeocentric
+from astropy.coordinates import SkyCoord, name_resolve, get_body, Angle, PrecessedGeocentric
 from astropy.time import Time
 
-from ..cfg import observatory, get_planetdb, planetmags, get_astrodata_directory
-from ..sun import Slot
+from ..cfg import observatory, get_planetdb, planetmags
+from ..sun import Slot, night_calendar
+from ..astro_centre import centre_location, centre_altaz, use_jpl
+from .. import weather
 from ..stars import get_stars, xy_constellation_lines, get_planets, get_named_object_slots, get_unnamed_object_slots, get_named_object_intervals, get_unnamed_object_intervals, chartpositions
 
 # These are mean apparant visual magnitudes, except for pluto, which is a rough guesstimate
 
 _PLANETS = planetmags()
 
-SIG_WEATHER = ["Clear night", "Sunny day", "Partly cloudy (night)", "Partly cloudy (day)",
-               "Not used", "Mist", "Fog", "Cloudy", "Overcast", "Light rain shower (night)",
-               "Light rain shower (day)", "Drizzle", "Light rain", "Heavy rain shower (night)",
-               "Heavy rain shower (day)", "Heavy rain", "Sleet shower (night)", "Sleet shower (day)",
-               "Sleet", "Hail shower (night)", "Hail shower (day)", "Hail", "Light snow shower (night)",
-               "Light snow shower (day)", "Light snow", "Heavy snow shower (night)", "Heavy snow shower (day)",
-               "Heavy snow", "Thunder shower (night)", "Thunder shower (day)", "Thunder"]
-
-
 
 def target_from_store(skicall):
     "Returns Target tuple from store, if not found, returns None"
@@ -431,11 +424,7 @@ def show_target(skicall):
     else:
         call_data['set_values']['view_ident'] = "100.0"
 
-    # longitude, latitude, elevation of the astronomy centre
-    longitude, latitude, elevation = observatory()
-    #elevation = elevation * u.m
-
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+    astro_centre = centre_location()
 
     table = []
     # List of lists - each inner list describing a row.
@@ -656,30 +645,17 @@ def detail_planet(skicall):
 
     # datetime needed in a format like 2021-06-13T12:00Z
     thistime = start.strftime("%G-%m-%dT%H:00Z")
-    weatherfile = os.path.join(get_astrodata_directory(),"weather.json")
-    try:
-        with open(weatherfile, 'r') as fp:
-            weather_dict = json.load(fp)
-
-        if thistime not in weather_dict:
-            sd_weather.show = False
-        else:
-            weathernow = weather_dict[thistime]
-            columns = list(zip(*weathernow))
-            sd_weather["wtable","col1"] = columns[0]
-            sd_weather["wtable","col2"] = columns[1]
-            sd_weather["wtable","col3"] = columns[2]
-            sd_weather["weatherhead","large_text"] = f"Met office data for UTC time : {thistime[:-4]}"
-            try:
-                index = columns[0].index("Significant Weather Code")
-                code = int(columns[1][index])
-                sd_weather["weatherhead","small_text"] = "Weather summary : " + SIG_WEATHER[code]
-            except:
-                pass                
-            sd_weather["weatherhead","large_text"]
-    except:
-        # The file does not exist, or is not readable by json
+    hour = weather.forecast(thistime)
+    if hour is None:
+        # The file does not exist, is not readable, or has no forecast for this hour
         sd_weather.show = False
+    else:
+        sd_weather["wtable","col1"] = hour.descriptions
+        sd_weather["wtable","col2"] = hour.values
+        sd_weather["wtable","col3"] = hour.labels
+        sd_weather["weatherhead","large_text"] = f"Met office data for UTC time : {thistime[:-4]}"
+        if hour.summary:
+            sd_weather["weatherhead","small_text"] = "Weather summary : " + hour.summary
 
     pd.update(sd_weather)
     skicall.update(pd)
@@ -831,30 +807,17 @@ def detail(skicall):
 
     # datetime needed in a format like 2021-06-13T12:00Z
     thistime = start.strftime("%G-%m-%dT%H:00Z")
-    weatherfile = os.path.join(get_astrodata_directory(),"weather.json")
-    try:
-        with open(weatherfile, 'r') as fp:
-            weather_dict = json.load(fp)
-
-        if thistime not in weather_dict:
-            sd_weather.show = False
-        else:
-            weathernow = weather_dict[thistime]
-            columns = list(zip(*weathernow))
-            sd_weather["wtable","col1"] = columns[0]
-            sd_weather["wtable","col2"] = columns[1]
-            sd_weather["wtable","col3"] = columns[2]
-            sd_weather["weatherhead","large_text"] = f"Met office data for UTC time : {thistime[:-4]}"
-            try:
-                index = columns[0].index("Significant Weather Code")
-                code = int(columns[1][index])
-                sd_weather["weatherhead","small_text"] = "Weather summary : " + SIG_WEATHER[code]
-            except:
-                pass                
-            sd_weather["weatherhead","large_text"]
-    except:
-        # The file does not exist, or is not readable by json
+    hour = weather.forecast(thistime)
+    if hour is None:
+        # The file does not exist, is not readable, or has no forecast for this hour
         sd_weather.show = False
+    else:
+        sd_weather["wtable","col1"] = hour.descriptions
+        sd_weather["wtable","col2"] = hour.values
+        sd_weather["wtable","col3"] = hour.labels
+        sd_weather["weatherhead","large_text"] = f"Met office data for UTC time : {thistime[:-4]}"
+        if hour.summary:
+            sd_weather["weatherhead","small_text"] = "Weather summary : " + hour.summary
 
     pd.update(sd_weather)
     skicall.update(pd)
@@ -915,13 +878,13 @@ def detailprint(skicall):
     longitude, latitude, elevation = observatory()
     #elevation = elevation * u.m
 
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+    astro_centre = centre_location()
 
     # need seven rows at ten minute intervals
     step = timedelta(minutes=10)
     number = 7
 
-    solar_system_ephemeris.set('jpl')
+    use_jpl()
     if target_name:
         result_list = get_named_object_intervals(target_name, start, step, number, astro_centre)
     else:
@@ -1201,10 +1164,7 @@ def up_arrow(skicall):
     if rot == 360:
         rot = 0
 
-    solar_system_ephemeris.set('jpl')
-    # longitude, latitude, elevation of the astronomy centre
-    longitude, latitude, elevation = observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+    use_jpl()
 
     newtarget, backangle = _new_ra_dac(storedtarget.ra, storedtarget.dec, rot, separation)
     newra, newdec = Angle(newtarget.ra).deg, Angle(newtarget.dec).deg
@@ -1225,7 +1185,7 @@ def up_arrow(skicall):
 
     thisdate_time = storedtarget.target_datetime
     time = Time(thisdate_time.isoformat(sep=' '))
-    newtarget_altaz = newtarget.transform_to(AltAz(obstime = time, location = astro_centre))
+    newtarget_altaz = newtarget.transform_to(centre_altaz(time))
     call_data['stored_values']['target_alt'] = "{:3.2f}".format(newtarget_altaz.alt.degree)
     call_data['stored_values']['target_az'] = "{:3.2f}".format(newtarget_altaz.az.degree)
 
@@ -1270,10 +1230,7 @@ def left_arrow(skicall):
     if rot == 360:
         rot = 0
 
-    solar_system_ephemeris.set('jpl')
-    # longitude, latitude, elevation of the astronomy centre
-    longitude, latitude, elevation = observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+    use_jpl()
 
     if storedtarget.flip:
         newtarget, backangle = _new_ra_dac(storedtarget.ra, storedtarget.dec, rot-90, separation)
@@ -1299,7 +1256,7 @@ def left_arrow(skicall):
 
     thisdate_time = storedtarget.target_datetime
     time = Time(thisdate_time.isoformat(sep=' '))
-    newtarget_altaz = newtarget.transform_to(AltAz(obstime = time, location = astro_centre))
+    newtarget_altaz = newtarget.transform_to(centre_altaz(time))
     call_data['stored_values']['target_alt'] = "{:3.2f}".format(newtarget_altaz.alt.degree)
     call_data['stored_values']['target_az'] = "{:3.2f}".format(newtarget_altaz.az.degree)
 
@@ -1345,10 +1302,7 @@ def right_arrow(skicall):
     if rot == 360:
         rot = 0
 
-    solar_system_ephemeris.set('jpl')
-    # longitude, latitude, elevation of the astronomy centre
-    longitude, latitude, elevation = observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+    use_jpl()
 
     if storedtarget.flip:
         newtarget, backangle = _new_ra_dac(storedtarget.ra, storedtarget.dec, rot+90, separation)
@@ -1374,7 +1328,7 @@ def right_arrow(skicall):
 
     thisdate_time = storedtarget.target_datetime
     time = Time(thisdate_time.isoformat(sep=' '))
-    newtarget_altaz = newtarget.transform_to(AltAz(obstime = time, location = astro_centre))
+    newtarget_altaz = newtarget.transform_to(centre_altaz(time))
     call_data['stored_values']['target_alt'] = "{:3.2f}".format(newtarget_altaz.alt.degree)
     call_data['stored_values']['target_az'] = "{:3.2f}".format(newtarget_altaz.az.degree)
 
@@ -1419,10 +1373,7 @@ def down_arrow(skicall):
     if rot == 360:
         rot = 0
 
-    solar_system_ephemeris.set('jpl')
-    # longitude, latitude, elevation of the astronomy centre
-    longitude, latitude, elevation = observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+    use_jpl()
 
     newtarget, newrot = _new_ra_dac(storedtarget.ra, storedtarget.dec, rot+180, separation)
     newra, newdec = Angle(newtarget.ra).deg, Angle(newtarget.dec).deg
@@ -1437,7 +1388,7 @@ def down_arrow(skicall):
 
     thisdate_time = storedtarget.target_datetime
     time = Time(thisdate_time.isoformat(sep=' '))
-    newtarget_altaz = newtarget.transform_to(AltAz(obstime = time, location = astro_centre))
+    newtarget_altaz = newtarget.transform_to(centre_altaz(time))
     call_data['stored_values']['target_alt'] = "{:3.2f}".format(newtarget_altaz.alt.degree)
     call_data['stored_values']['target_az'] = "{:3.2f}".format(newtarget_altaz.az.degree)
 
@@ -1978,7 +1929,7 @@ def _slot_from_received_data(received_data):
     except:
         raise FailPage("Invalid date")
 
-    return Slot(startday, sequence)
+    return night_calendar(startday).slot(sequence)
 
 
 def planetarium(skicall):
@@ -2034,10 +1985,7 @@ def callfinder(skicall):
     except:
         raise FailPage("Unable to parse coordinates")
 
-    solar_system_ephemeris.set('jpl')
-    # longitude, latitude, elevation of the astronomy centre
-    longitude, latitude, elevation = observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+    use_jpl()
 
     # reset rotation
     call_data['stored_values']['rot'] = 0
@@ -2057,7 +2005,7 @@ def callfinder(skicall):
 
     thisdate_time = storedtarget.target_datetime
     time = Time(thisdate_time.isoformat(sep=' '))
-    newtarget_altaz = newtarget.transform_to(AltAz(obstime = time, location = astro_centre))
+    newtarget_altaz = newtarget.transform_to(centre_altaz(time))
     call_data['stored_values']['target_alt'] = "{:3.2f}".format(newtarget_altaz.alt.degree)
     call_data['stored_values']['target_az'] = "{:3.2f}".format(newtarget_altaz.az.degree)
 
@@ -7,46 +7,44 @@
 
 
 
-import subprocess, tempfile, os, random, time, glob, json
+import subprocess, tempfile, random, time, glob
 
 from datetime import date, timedelta, datetime, timezone
 
 from skipole import FailPage, GoTo, ValidateError, ServerError, PageData, SectionData
 
-from indi_mr import tools
+from .. import sun, database_ops, redis_ops, indi_snapshot, events, weather, temperature_history
 
-from .. import sun, database_ops, redis_ops, cfg
 
-
-SIG_WEATHER = ["Clear night", "Sunny day", "Partly cloudy (night)", "Partly cloudy (day)",
-               "Not used", "Mist", "Fog", "Cloudy", "Overcast", "Light rain shower (night)",
-               "Light rain shower (day)", "Drizzle", "Light rain", "Heavy rain shower (night)",
-               "Heavy rain shower (day)", "Heavy rain", "Sleet shower (night)", "Sleet shower (day)",
-               "Sleet", "Hail shower (night)", "Hail shower (day)", "Hail", "Light snow shower (night)",
-               "Light snow shower (day)", "Light snow", "Heavy snow shower (night)", "Heavy snow shower (day)",
-               "Heavy snow", "Thunder shower (night)", "Thunder shower (day)", "Thunder"]
+# listener for the events stream, which updates the sensor values
+_LISTENERS = """
+    source.addEventListener("indi", function(e) {
+        let indi = JSON.parse(e.data);
+        SKIPOLE.setfields({"led_status:para_text":"LED : " + indi.led,
+                           "temperature_status:para_text":"Temperature : " + indi.temperature,
+                           "door_status:para_text":"Door : " + indi.door});
+        if (indi.network) {
+            SKIPOLE.setfields({"show_error":indi.network});
+            }
+        });
+"""
 
 
 def retrieve_sensors_data(skicall):
     "Display sensor values, initially just the led status"
 
-    rconn = skicall.proj_data.get("rconn")
-    redisserver = skicall.proj_data.get("redisserver")
-    skicall.page_data['led_status', 'para_text'] = "LED : " + redis_ops.get_led(rconn, redisserver)
-    skicall.page_data['temperature_status', 'para_text'] = "Temperature : " + redis_ops.last_temperature(rconn, redisserver)
-    skicall.page_data['door_status', 'para_text'] = "Door : " + redis_ops.get_door(rconn, redisserver)
-
-    # get timestamp of the network monitor, display alarm if greater than 15 secods
-    # tools.elements_dict returns a dictionary of element attributes for the given element, property and device
-    monitor = tools.elements_dict(rconn, redisserver, 'KeepAlive', 'TenSecondHeartbeat', 'Network Monitor')
-    if not monitor:
-        skicall.page_data['show_error'] = "Network Error : Unable to read monitor timestamp"
-        return
+    # all values are read from redis in one call
+    snapshot = indi_snapshot.get_snapshot(skicall)
+    skicall.page_data['led_status', 'para_text'] = "LED : " + snapshot.led()
+    skicall.page_data['temperature_status', 'para_text'] = "Temperature : " + snapshot.last_temperature()
+    skicall.page_data['door_status', 'para_text'] = "Door : " + snapshot.door()
+    # used by the page, ignored by the json refresh
+    skicall.page_data['add_jscript'] = events.page_script(_LISTENERS)
 
-    # note fromisoformat method requires python 3.7 +
-    timed = datetime.utcnow() - datetime.fromisoformat(monitor['timestamp'])
-    if timed.total_seconds() > 15:
-        skicall.page_data['show_error'] = "Network Error : Communications to observatory lost"
+    # display alarm if the network monitor timestamp is greater than 15 secods old
+    network_error = snapshot.network_error()
+    if network_error:
+        skicall.page_data['show_error'] = network_error
 
 
 def temperature_page(skicall):
@@ -59,34 +57,21 @@ def temperature_page(skicall):
 
     # datetime needed in a format like 2021-06-13T12:00Z
     thistime = datetime.now(timezone.utc).strftime("%G-%m-%dT%H:00Z")
-    weatherfile = os.path.join(cfg.get_astrodata_directory(),"weather.json")
-    try:
-        with open(weatherfile, 'r') as fp:
-            weather_dict = json.load(fp)
-
-        if thistime not in weather_dict:
-            sd_weather.show = False
-        else:
-            weathernow = weather_dict[thistime]
-            columns = list(zip(*weathernow))
-            sd_weather["wtable","col1"] = columns[0]
-            sd_weather["wtable","col2"] = columns[1]
-            sd_weather["wtable","col3"] = columns[2]
-            sd_weather["weatherhead","large_text"] = f"Met office data for UTC time : {thistime[:-4]}"
-            try:
-                index = columns[0].index("Significant Weather Code")
-                code = int(columns[1][index])
-                sd_weather["weatherhead","small_text"] = "Weather summary : " + SIG_WEATHER[code]
-            except:
-                pass                
-            sd_weather["weatherhead","large_text"]
-    except:
-        # The file does not exist, or is not readable by json
+    hour = weather.forecast(thistime)
+    if hour is None:
+        # The file does not exist, is not readable, or has no forecast for this hour
         sd_weather.show = False
+    else:
+        sd_weather["wtable","col1"] = hour.descriptions
+        sd_weather["wtable","col2"] = hour.values
+        sd_weather["wtable","col3"] = hour.labels
+        sd_weather["weatherhead","large_text"] = f"Met office data for UTC time : {thistime[:-4]}"
+        if hour.summary:
+            sd_weather["weatherhead","small_text"] = "Weather summary : " + hour.summary
 
     pd.update(sd_weather)
 
-    date_temp = redis_ops.last_temperature(skicall.proj_data.get("rconn"), skicall.proj_data.get("redisserver"))
+    date_temp = indi_snapshot.get_snapshot(skicall).last_temperature()
     #if not date_temp:
     #    raise FailPage("No temperature values available")
 
@@ -99,7 +84,13 @@ def temperature_page(skicall):
         pd['datetemp', 'para_text'] = "No temperature values available"
         pd["meter", "measurement"] = "0.0"
 
-    # create a time, temperature dataset
+    # create a time, temperature dataset, of hourly means over the last 48 hours
+    history = temperature_history.history(skicall.proj_data.get("rconn"), skicall.proj_data.get("rconn_0"), "hour", 48)
+    if history:
+        pd['temperaturegraph', 'values'] = [("%.2f" % temperature, dtm) for dtm, temperature in history]
+        skicall.update(pd)
+        return
+    # no history has been recorded yet, so use the INDI logs
     dataset = []
     datalog = redis_ops.get_temperatures(skicall.proj_data.get("rconn"), skicall.proj_data.get("redisserver"))
     if not datalog:
@@ -121,7 +112,7 @@ def temperature_page(skicall):
 def last_temperature(skicall):
     "Gets the day, temperature for the last logged value"
 
-    date_temp = redis_ops.last_temperature(skicall.proj_data.get("rconn"), skicall.proj_data.get("redisserver"))
+    date_temp = indi_snapshot.get_snapshot(skicall).last_temperature()
     if not date_temp:
         raise FailPage("No temperature values available")
 
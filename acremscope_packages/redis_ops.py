@@ -1,8 +1,9 @@
 
 
-import random
+import random, time
 
 from datetime import datetime
+from collections import namedtuple
 
 from indi_mr import tools
 
@@ -16,7 +17,7 @@ else:
 
 from skipole import FailPage, GoTo, ValidateError, ServerError
 
-from . import cfg
+from . import cfg, indi_snapshot
 
 
 def open_redis(redis_db=0):
@@ -45,11 +46,125 @@ def open_redis(redis_db=0):
     return rconn
 
 
+##################################################
+#
+# The telescope control state is held as the fields of the
+# single redis hash prefix+'control_state', these being
+#
+# control_user_id, view, flip, rot, wanted_ra, wanted_dec,
+# target_name, target_frame and chart_actual
+#
+##################################################
+
+
+def _control_field(name):
+    "Returns a property giving access to the named control state field"
+
+    def getter(self):
+        return self._values[name]
+
+    def setter(self, value):
+        self._values[name] = value
+        self._changed.add(name)
+
+    return property(getter, setter)
+
+
+class ControlState:
+    """The telescope control state. Creating the object reads every field with
+       one HGETALL, the attributes are then read and set in memory, with typed values,
+       and save() writes any changed fields in one MULTI/EXEC transaction"""
+
+    # field name : (type, default value)
+    _FIELDS = {'control_user_id':(int, None),
+               'view':(float, 100.0),
+               'flip':(bool, False),
+               'rot':(float, 0.0),
+               'wanted_ra':(float, None),
+               'wanted_dec':(float, None),
+               'target_name':(str, ''),
+               'target_frame':(str, ''),
+               'chart_actual':(bool, False)}
+
+    control_user_id = _control_field('control_user_id')
+    view = _control_field('view')
+    flip = _control_field('flip')
+    rot = _control_field('rot')
+    wanted_ra = _control_field('wanted_ra')
+    wanted_dec = _control_field('wanted_dec')
+    target_name = _control_field('target_name')
+    target_frame = _control_field('target_frame')
+    chart_actual = _control_field('chart_actual')
+
+    def __init__(self, prefix='', rconn=None, fields=None):
+        """If fields is given, it is the result of an HGETALL already made, for example
+           within a pipeline, and redis is not read again"""
+        self._key = prefix+'control_state'
+        self._rconn = rconn
+        self._changed = set()
+        self._values = { name:default for name, (ftype, default) in self._FIELDS.items() }
+        if fields is None:
+            if rconn is None:
+                return
+            try:
+                fields = rconn.hgetall(self._key)
+            except:
+                return
+        for bname, bvalue in fields.items():
+            name = bname.decode('utf-8')
+            if name not in self._FIELDS:
+                continue
+            ftype, default = self._FIELDS[name]
+            value = bvalue.decode('utf-8')
+            try:
+                self._values[name] = ftype(value)
+            except:
+                pass
+
+    def update(self, **fields):
+        "Sets several fields, save() must still be called to write them"
+        for name, value in fields.items():
+            if name not in self._FIELDS:
+                raise AttributeError(name)
+            setattr(self, name, value)
+
+    def save(self):
+        "Writes changed fields to redis in one transaction, return True on success, False on failure"
+        if not self._changed:
+            return True
+        if self._rconn is None:
+            return False
+        mapping = {}
+        deleted = []
+        for name in self._changed:
+            value = self._values[name]
+            if value is None:
+                deleted.append(name)
+            elif self._FIELDS[name][0] is bool:
+                # booleans are stored as 'true' or the empty string
+                mapping[name] = 'true' if value else ''
+            elif name in ('target_name', 'target_frame'):
+                mapping[name] = value.lower()
+            else:
+                mapping[name] = str(value)
+        try:
+            pipe = self._rconn.pipeline(transaction=True)
+            if mapping:
+                pipe.hset(self._key, mapping=mapping)
+            if deleted:
+                pipe.hdel(self._key, *deleted)
+            pipe.execute()
+        except:
+            return False
+        self._changed.clear()
+        return True
+
+
 def get_control_user(prefix='', rconn=None):
     """Return user_id of the user who has current control of the telescope,
        or None if not found"""
     try:
-        control_user_id = int(rconn.get(prefix+'control_user_id').decode('utf-8'))
+        control_user_id = int(rconn.hget(prefix+'control_state', 'control_user_id').decode('utf-8'))
     except:
         return
     return control_user_id
@@ -63,15 +178,11 @@ def set_control_user(user_id, prefix='', rconn=None):
     if rconn is None:
         return False
     try:
-        rconn.set(prefix+'view', "100.0")
-        rconn.set(prefix+'flip', '')
-        rconn.set(prefix+'rot', "0.0")
-        result = rconn.set(prefix+'control_user_id', user_id)
+        # a single HSET sets all four fields atomically
+        rconn.hset(prefix+'control_state', mapping={'control_user_id':str(user_id), 'view':'100.0', 'flip':'', 'rot':'0.0'})
     except:
         return False
-    if result:
-        return True
-    return False
+    return True
 
 
 def test_mode(user_id, prefix='', rconn=None):
@@ -132,13 +243,10 @@ def set_wanted_position(ra, dec, prefix='', rconn=None):
     if rconn is None:
         return False
     try:
-        result_ra = rconn.set(prefix+'wanted_ra', str(ra))
-        result_dec = rconn.set(prefix+'wanted_dec', str(dec))
+        rconn.hset(prefix+'control_state', mapping={'wanted_ra':str(ra), 'wanted_dec':str(dec)})
     except Exception:
         return False
-    if result_ra and result_dec:
-        return True
-    return False
+    return True
 
 
 def get_wanted_position(prefix='', rconn=None):
@@ -147,8 +255,9 @@ def get_wanted_position(prefix='', rconn=None):
     if rconn is None:
         return
     try:
-        wanted_ra = float(rconn.get(prefix+'wanted_ra').decode('utf-8'))
-        wanted_dec = float(rconn.get(prefix+'wanted_dec').decode('utf-8'))
+        wanted_ra, wanted_dec = rconn.hmget(prefix+'control_state', 'wanted_ra', 'wanted_dec')
+        wanted_ra = float(wanted_ra.decode('utf-8'))
+        wanted_dec = float(wanted_dec.decode('utf-8'))
     except:
         return
     return wanted_ra, wanted_dec
@@ -160,12 +269,10 @@ def set_target_name(target_name, prefix='', rconn=None):
     if rconn is None:
         return False
     try:
-        result = rconn.set(prefix+'target_name', target_name.lower())
+        rconn.hset(prefix+'control_state', 'target_name', target_name.lower())
     except Exception:
         return False
-    if result:
-        return True
-    return False
+    return True
 
 
 def get_target_name(prefix='', rconn=None):
@@ -174,7 +281,7 @@ def get_target_name(prefix='', rconn=None):
     if rconn is None:
         return ''
     try:
-        target_name = rconn.get(prefix+'target_name').decode('utf-8')
+        target_name = rconn.hget(prefix+'control_state', 'target_name').decode('utf-8')
     except:
         return ''
     return target_name
@@ -186,12 +293,10 @@ def set_target_frame(target_frame, prefix='', rconn=None):
     if rconn is None:
         return False
     try:
-        result = rconn.set(prefix+'target_frame', target_frame.lower())
+        rconn.hset(prefix+'control_state', 'target_frame', target_frame.lower())
     except Exception:
         return False
-    if result:
-        return True
-    return False
+    return True
 
 
 def get_target_frame(prefix='', rconn=None):
@@ -200,7 +305,7 @@ def get_target_frame(prefix='', rconn=None):
     if rconn is None:
         return ''
     try:
-        target_frame = rconn.get(prefix+'target_frame').decode('utf-8')
+        target_frame = rconn.hget(prefix+'control_state', 'target_frame').decode('utf-8')
     except:
         return ''
     return target_frame
@@ -211,7 +316,7 @@ def del_target_name(prefix='', rconn=None):
     if rconn is None:
         return False
     try:
-        rconn.delete(prefix+'target_name')
+        rconn.hdel(prefix+'control_state', 'target_name')
     except:
         return False
     return True
@@ -222,9 +327,10 @@ def get_chart_parameters(prefix='', rconn=None):
     if rconn is None:
         return (100.0, False, 0.0)
     try:
-        view = rconn.get(prefix+'view').decode('utf-8')
-        flip = rconn.get(prefix+'flip').decode('utf-8')
-        rot = rconn.get(prefix+'rot').decode('utf-8')
+        view, flip, rot = rconn.hmget(prefix+'control_state', 'view', 'flip', 'rot')
+        view = view.decode('utf-8')
+        flip = flip.decode('utf-8')
+        rot = rot.decode('utf-8')
     except:
         return (100.0, False, 0.0)
     return float(view), bool(flip), float(rot)
@@ -236,17 +342,13 @@ def set_chart_parameters(view, flip, rot, prefix='', rconn=None):
     if rconn is None:
         return False
     try:
-        result_view = rconn.set(prefix+'view', str(view))
         if flip:
-            result_flip = rconn.set(prefix+'flip', 'true')
+            rconn.hset(prefix+'control_state', mapping={'view':str(view), 'flip':'true', 'rot':str(rot)})
         else:
-            result_flip = rconn.set(prefix+'flip', '')
-        result_rot = rconn.set(prefix+'rot', str(rot))
+            rconn.hset(prefix+'control_state', mapping={'view':str(view), 'flip':'', 'rot':str(rot)})
     except Exception:
         return False
-    if result_view and result_flip and result_rot:
-        return True
-    return False
+    return True
 
 
 def get_chart_actual(prefix='', rconn=None):
@@ -254,7 +356,7 @@ def get_chart_actual(prefix='', rconn=None):
     if rconn is None:
         return False
     try:
-        actual = rconn.get(prefix+'chart_actual').decode('utf-8')
+        actual = rconn.hget(prefix+'control_state', 'chart_actual').decode('utf-8')
     except:
         return False
     return bool(actual)
@@ -262,21 +364,19 @@ def get_chart_actual(prefix='', rconn=None):
 
 def set_chart_actual(actual, prefix='', rconn=None):
     """Set actual value
-       Return True on success, False on failure, if rconn is None, it is created."""
+       Return True on success, False on failure"""
 
     if rconn is None:
         return False
 
     try:
         if actual:
-            result_actual = rconn.set(prefix+'chart_actual', 'true')
+            rconn.hset(prefix+'control_state', 'chart_actual', 'true')
         else:
-            result_actual = rconn.set(prefix+'chart_actual', '')
+            rconn.hset(prefix+'control_state', 'chart_actual', '')
     except Exception:
         return False
-    if result_actual:
-        return True
-    return False
+    return True
 
 
 def get_led(rconn, redisserver):
@@ -284,16 +384,7 @@ def get_led(rconn, redisserver):
 
     if rconn is None:
         return 'UNKNOWN'
-    try:
-        #led_status = rconn.get('led').decode('utf-8')
-        led = tools.elements_dict(rconn, redisserver, "LED ON", "LED", "Rempico01")
-        # led should be a dictionary, key 'value' should be On or Off
-        if not led:
-            return "UNKNOWN"
-        led_status = led.get("value", "UNKNOWN")
-    except:
-        return 'UNKNOWN'
-    return led_status
+    return indi_snapshot.read_snapshot(rconn, redisserver).led()
 
 
 
@@ -302,23 +393,7 @@ def get_door(rconn, redisserver):
     # returns one of UNKNOWN, OPEN, CLOSED, OPENING, CLOSING
     if rconn is None:
         return 'UNKNOWN'
-    door_name = cfg.door()
-    try:
-        door_status = tools.elements_dict(rconn, redisserver, "CLOSED", "DOOR_STATE", door_name)
-        if door_status['value'] == "Ok":
-            return "CLOSED"
-        door_status = tools.elements_dict(rconn, redisserver, "OPEN", "DOOR_STATE", door_name)
-        if door_status['value'] == "Ok":
-            return "OPEN"
-        door_status = tools.elements_dict(rconn, redisserver, "OPENING", "DOOR_STATE", door_name)
-        if door_status['value'] == "Ok":
-            return "OPENING"
-        door_status = tools.elements_dict(rconn, redisserver, "CLOSING", "DOOR_STATE", door_name)
-        if door_status['value'] == "Ok":
-            return "CLOSING"
-    except:
-        return 'UNKNOWN'
-    return 'UNKNOWN'
+    return indi_snapshot.read_snapshot(rconn, redisserver).door()
 
 
 def get_temperatures(rconn, redisserver):
@@ -352,25 +427,7 @@ def last_temperature(rconn, redisserver):
 
     if rconn is None:
         return ''
-    # get data from redis
-    try:
-        element_att = tools.elements_dict(rconn, redisserver, "TEMPERATURE", "ATMOSPHERE", "Rempico01")
-        # element_att should be a dictionary
-        if not element_att:
-            return ''
-        temperature_value = element_att.get("formatted_number")
-        if temperature_value is None:
-            return ''
-        # Convert from Kelvin to Centigrade
-        temperature = float(temperature_value) - 273.15
-        temperature_string = "%.2f" % temperature
-        timestamp_value = element_att.get("timestamp")
-        if timestamp_value is None:
-            return ''
-        temperature_date, temperature_time =  timestamp_value.split("T")
-    except:
-        return ''
-    return f"{temperature_date} {temperature_time} {temperature_string}"
+    return indi_snapshot.read_snapshot(rconn, redisserver).last_temperature()
 
 
 ############################################################
@@ -381,6 +438,30 @@ def last_temperature(rconn, redisserver):
 ############################################################
 
 
+# The login of each cookie is a redis hash with fields
+# user_id - the user id
+# rnd - a random number, added to input pin form and checked on submission
+# pair - a random number between 1 and 6, sets which pair of PIN numbers to request
+
+
+# cookiekey : (user_id, time.monotonic() when read), so a burst of calls from the same
+# browser within _LOGIN_CACHE_TIME seconds share one redis lookup
+_LOGIN_CACHE = {}
+
+_LOGIN_CACHE_TIME = 1.0
+
+
+def _cache_login(cookiekey, user_id):
+    "Records the user_id of the cookiekey in the login cache"
+    now = time.monotonic()
+    if len(_LOGIN_CACHE) > 1000:
+        # remove old entries
+        for key, (cached_id, cached_time) in list(_LOGIN_CACHE.items()):
+            if now - cached_time > _LOGIN_CACHE_TIME:
+                _LOGIN_CACHE.pop(key, None)
+    _LOGIN_CACHE[cookiekey] = (user_id, now)
+
+
 def logged_in(cookie_string, prefix='', rconn=None):
     """Check for a valid cookie, if logged in, return user_id
        If not, return None."""
@@ -392,19 +473,23 @@ def logged_in(cookie_string, prefix='', rconn=None):
         return
 
     cookiekey = prefix+cookie_string
+
+    cached = _LOGIN_CACHE.get(cookiekey)
+    if cached and (time.monotonic() - cached[1] < _LOGIN_CACHE_TIME):
+        return cached[0]
+
     try:
-        if not rconn.exists(cookiekey):
+        # get the user id and update expire after two hours, in one round trip
+        pipe = rconn.pipeline(transaction=False)
+        pipe.hget(cookiekey, 'user_id')
+        pipe.expire(cookiekey, 7200)
+        user_id, refreshed = pipe.execute()
+        if user_id is None:
             return
-        user_info = rconn.lrange(cookiekey, 0, -1)
-        # user_info is a list of binary values
-        # user_info[0] is user id
-        # user_info[1] is a random number, added to input pin form and checked on submission
-        # user_info[2] is a random number between 1 and 6, sets which pair of PIN numbers to request
-        user_id = int(user_info[0].decode('utf-8'))
-        # and update expire after two hours
-        rconn.expire(cookiekey, 7200)
+        user_id = int(user_id.decode('utf-8'))
     except:
         return
+    _cache_login(cookiekey, user_id)
     return user_id
 
 
@@ -418,7 +503,7 @@ def set_cookie(cookie_string, user_id, prefix='', rconn=None):
         return False
 
     cookiekey = prefix+cookie_string
-    # set value as a list of [user_id, random_number, pair number]
+    # set value as a hash of user_id, random_number, pair number
     try:
         if rconn.exists(cookiekey):
             # cookie already delete it
@@ -426,8 +511,12 @@ def set_cookie(cookie_string, user_id, prefix='', rconn=None):
             # and return False, as this should not happen
             return False
         # set the cookie into redis
-        rconn.rpush(cookiekey, str(user_id), str(random.randint(10000000, 99999999)), str(random.randint(1,6)))
-        rconn.expire(cookiekey, 7200)
+        pipe = rconn.pipeline(transaction=True)
+        pipe.hset(cookiekey, mapping={'user_id':str(user_id),
+                                      'rnd':str(random.randint(10000000, 99999999)),
+                                      'pair':str(random.randint(1,6))})
+        pipe.expire(cookiekey, 7200)
+        pipe.execute()
     except:
         return False
     return True
@@ -443,6 +532,7 @@ def del_cookie(cookie_string, prefix='', rconn=None):
     if not cookie_string:
         return False
     cookiekey = prefix+cookie_string
+    _LOGIN_CACHE.pop(cookiekey, None)
     try:
         rconn.delete(cookiekey)
     except:
@@ -450,6 +540,30 @@ def del_cookie(cookie_string, prefix='', rconn=None):
     return True
 
 
+# lua source:Script object, each script is registered once, and then called with
+# the connection given, which loads it into that redis server if not already there
+_SCRIPTS = {}
+
+
+def _script(source, rconn):
+    "Returns the Script object of the lua source, registering it on first use"
+    script = _SCRIPTS.get(source)
+    if script is None:
+        script = rconn.register_script(source)
+        _SCRIPTS[source] = script
+    return script
+
+
+# replaces the rnd field of an existing cookie, returning the previous value
+_SWAP_RND = """
+local rnd = redis.call('HGET', KEYS[1], 'rnd')
+if rnd then
+    redis.call('HSET', KEYS[1], 'rnd', ARGV[1])
+end
+return rnd
+"""
+
+
 def set_rnd(cookie_string, prefix='', rconn=None):
     """Sets a random number against the cookie, return the random number on success,
        None on failure"""
@@ -465,10 +579,8 @@ def set_rnd(cookie_string, prefix='', rconn=None):
 
     # set a random_number
     try:
-        if not rconn.exists(cookiekey):
+        if _script(_SWAP_RND, rconn)(keys=[cookiekey], args=[rnd], client=rconn) is None:
             return
-        # set the random number into the database
-        rconn.lset(cookiekey, 1, str(rnd))
     except:
         return
     return rnd
@@ -487,19 +599,10 @@ def get_rnd(cookie_string, prefix='', rconn=None):
         return
     cookiekey = prefix+cookie_string
 
-    # get and set a random_number
+    # get and set a random_number, in one atomic call
+    newrnd = random.randint(10000000, 99999999)
     try:
-        if not rconn.exists(cookiekey):
-            return
-        user_info = rconn.lrange(cookiekey, 0, -1)
-        # user_info is a list of binary values
-        # user_info[0] is user id
-        # user_info[1] is a random number
-        # user_info[2] is a random number between 1 and 6, sets which pair of PIN numbers to request
-        rnd = int(user_info[1].decode('utf-8'))
-        # after obtaining rnd, insert a new one
-        newrnd = random.randint(10000000, 99999999)
-        rconn.lset(cookiekey, 1, str(newrnd))
+        rnd = int(_script(_SWAP_RND, rconn)(keys=[cookiekey], args=[newrnd], client=rconn).decode('utf-8'))
     except:
         return
     return rnd
@@ -518,14 +621,7 @@ def get_pair(cookie_string, prefix='', rconn=None):
 
     # get the pair number
     try:
-        if not rconn.exists(cookiekey):
-            return
-        user_info = rconn.lrange(cookiekey, 0, -1)
-        # user_info is a list of binary values
-        # user_info[0] is user id
-        # user_info[1] is a random number
-        # user_info[2] is a random number between 1 and 6, sets which pair of PIN numbers to request
-        pair = int(user_info[2].decode('utf-8'))
+        pair = int(rconn.hget(cookiekey, 'pair').decode('utf-8'))
     except:
         return
     return pair
@@ -661,6 +757,33 @@ def two_min_numbers(rndset, prefix='', rconn=None):
 
 
 
+# The key holds a list of [start time, rnd1, rnd2], this script reads, and if necessary
+# rotates, the numbers atomically. Lua random numbers are not suitable, so two
+# new random numbers are passed in as ARGV[2] and ARGV[3], and used if needed
+_TIMED_RANDOM = """
+local now = tonumber(redis.call('TIME')[1])
+local timeslot = tonumber(ARGV[1])
+local current = redis.call('LRANGE', KEYS[1], 0, -1)
+if #current == 3 then
+    local start = tonumber(current[1])
+    if now < start + timeslot then
+        -- current random numbers are valid
+        return {current[2], current[3]}
+    end
+    if now < start + timeslot + timeslot then
+        -- rnd1 has expired, but is still valid as rnd2
+        redis.call('DEL', KEYS[1])
+        redis.call('RPUSH', KEYS[1], now, ARGV[2], current[2])
+        return {ARGV[2], current[2]}
+    end
+end
+-- no numbers, or both have expired, create new ones
+redis.call('DEL', KEYS[1])
+redis.call('RPUSH', KEYS[1], now, ARGV[2], ARGV[3])
+return {ARGV[2], ARGV[3]}
+"""
+
+
 def timed_random_numbers(rndset, timeslot, prefix, rconn=None):
     """returns two random numbers
        one valid for the current time slot, one valid for the previous
@@ -671,41 +794,14 @@ def timed_random_numbers(rndset, timeslot, prefix, rconn=None):
         return None, None
 
     key = prefix + "rndset_" + str(rndset)
-    now = rconn.time()[0]     # time in seconds
 
     try:
-
-        if not rconn.exists(key):
-            rnd1 = random.randint(10000000, 99999999)
-            rnd2 = random.randint(10000000, 99999999)
-            rconn.rpush(key, str(now), str(rnd1), str(rnd2))
-            return rnd1, rnd2
-
-        start, rnd1, rnd2 = rconn.lrange(key, 0, -1)
-        start = int(start.decode('utf-8'))
-        rnd1 = int(rnd1.decode('utf-8'))
-        rnd2 = int(rnd2.decode('utf-8'))
-
-        if now < start + timeslot:
-            # now is within timeslot of start time, so current random numbers are valid
-            return rnd1, rnd2
-
-        elif now < start + timeslot + timeslot:
-            # now is within twice the timeslot of start time, so rnd1 has expired. but rnd2 is valid
-            # set rnd2 equal to rnd1 and create new rnd1
-            rnd2 = rnd1
-            rnd1 = random.randint(10000000, 99999999)
-            rconn.delete(key)
-            rconn.rpush(key, str(now), str(rnd1), str(rnd2))
-            return rnd1, rnd2
-
-        else:
-            # now is greater than twice timeslot after start time, ro rnd1 and rnd2 are invalid, create new ones
-            rnd1 = random.randint(10000000, 99999999)
-            rnd2 = random.randint(10000000, 99999999)
-            rconn.delete(key)
-            rconn.rpush(key, str(now), str(rnd1), str(rnd2))
-            return rnd1, rnd2
+        # a single atomic script call, so concurrent callers cannot rotate the numbers twice
+        rnd1, rnd2 = _script(_TIMED_RANDOM, rconn)(keys=[key], args=[timeslot,
+                                                                     random.randint(10000000, 99999999),
+                                                                     random.randint(10000000, 99999999)],
+                                                   client=rconn)
+        return int(rnd1.decode('utf-8')), int(rnd2.decode('utf-8'))
     except:
         pass
 
@@ -723,13 +819,48 @@ def timed_random_numbers(rndset, timeslot, prefix, rconn=None):
 
 
 
+# The stored values are packed into one string, separated by this character
+_SEPARATOR = '\x1f'
+
+# [expiry time in seconds, time.monotonic() when it was last set]
+_SESSION_EXPIRY = [7200, None]
+
+
+def _session_expiry(rconn):
+    """Returns the expiry time of session values, or 0 if redis is too full to store them.
+       The time is taken from the redis memory use, which is checked at most once a minute"""
+    now = time.monotonic()
+    if (_SESSION_EXPIRY[1] is not None) and (now - _SESSION_EXPIRY[1] < 60):
+        return _SESSION_EXPIRY[0]
+    try:
+        memory = rconn.info('memory')
+        used = memory['used_memory']
+        maximum = memory.get('maxmemory') or cfg.get_redis_memory()
+        fraction = used/maximum
+    except:
+        return _SESSION_EXPIRY[0]
+    # If the database is getting fuller, reduce the expire time of
+    # these session keys to help reduce it
+    if fraction > 0.9:
+        exptime = 0
+    elif fraction > 0.75:
+        exptime = 900  # 15 minutes
+    elif fraction > 0.5:
+        exptime = 1800  # 30 minutes
+    elif fraction > 0.25:
+        exptime = 3600  # one hour
+    else:
+        exptime = 7200  # two hours
+    _SESSION_EXPIRY[:] = [exptime, now]
+    return exptime
+
+
 def set_session_value(key_string, value_list, prefix='', rconn=None):
     """Return True on success, False on failure
 
-       Given a key_string, saves a value_list
-       with an expirey time of 7200 seconds (2 hours)
-       The items are saved as strings.
-       empty values are stored as '_'"""
+       Given a key_string, saves a value_list as a single string
+       with an expirey time of up to 7200 seconds (2 hours)
+       The items are saved as strings."""
 
     if not key_string:
         return False
@@ -738,38 +869,15 @@ def set_session_value(key_string, value_list, prefix='', rconn=None):
     if rconn is None:
         return False
 
-    keystring = prefix+key_string
-
-    # dbsize() returns the number of keys in the database
-    numberofkeys = rconn.dbsize()
-    # If the database is getting bigger, reduce the expire time of
-    # these session keys to help reduce it
-    if numberofkeys > 2000:
+    exptime = _session_expiry(rconn)
+    if not exptime:
         return False
-    elif numberofkeys > 1500:
-        exptime = 900  # 15 minutes
-    elif numberofkeys > 1000:
-        exptime = 1800  # 30 minutes
-    elif numberofkeys > 500:
-        exptime = 3600  # one hour
-    else:
-        exptime = 7200  # two hours
 
-    # Create a 'values' list, with '' replaced by '_'
-    values = []
-    for val in value_list:
-        str_val = str(val)
-        if not str_val:
-            str_val = '_'
-        values.append(str_val)
+    packed = _SEPARATOR.join(str(val) for val in value_list)
 
     try:
-        if rconn.exists(key_string):
-            # key_string already exists, delete it
-            rconn.delete(key_string)
-        # set the key and list of values into the database
-        rconn.rpush(key_string, *values)
-        rconn.expire(key_string, exptime)
+        # set the key and values into the database, replacing any previous value
+        rconn.set(prefix+key_string, packed, ex=exptime)
     except:
         return False
     return True
@@ -784,24 +892,127 @@ def get_session_value(key_string, prefix='', rconn=None):
     if rconn is None:
         return
 
-    keystring = prefix+key_string
+    try:
+        packed = rconn.get(prefix+key_string)
+    except:
+        return
+    return _session_values(packed)
+
 
-    if not rconn.exists(key_string):
+def _session_values(packed):
+    "Given the binary string read from redis, return the list of strings, or None if not found"
+    if packed is None:
         # no value exists
         return
+    return packed.decode('utf-8').split(_SEPARATOR)
+
+
+######################################################################
+#
+# The values needed at the start of every call, read together
+#
+######################################################################
+
+
+CallValues = namedtuple('CallValues', ['user_id', 'authenticated', 'control_state', 'test_mode_user_id', 'stored_values'])
+
+
+def get_call_values(cookie_string, key_string, various_prefix='', login_prefix='', auth_prefix='', session_prefix='', rconn=None):
+    """Reads in one pipelined round trip the values start_call needs, returns a CallValues tuple of
 
-    binvalues = rconn.lrange(key_string, 0, -1)
-    # binvalues is a list of binary values
-    values = []
-    for bval in binvalues:
-        val = bval.decode('utf-8')
-        if val == '_':
-            str_val = ''
+       user_id - as logged_in(cookie_string), None if not logged in
+       authenticated - as is_authenticated(cookie_string)
+       control_state - a ControlState object
+       test_mode_user_id - as get_test_mode_user()
+       stored_values - as get_session_value(key_string), None if not found
+
+       The login and authentication expiry times are refreshed, as logged_in
+       and is_authenticated do. On failure the values of a call with no login are returned"""
+
+    cookie_valid = bool(cookie_string) and (cookie_string != "noaccess")
+    failed = CallValues(None, False, ControlState(various_prefix, rconn, {}), None, None)
+
+    if rconn is None:
+        return failed
+
+    try:
+        pipe = rconn.pipeline(transaction=False)
+        pipe.hgetall(various_prefix+'control_state')
+        pipe.get(various_prefix+'test_mode')
+        if key_string:
+            pipe.get(session_prefix+key_string)
+        if cookie_valid:
+            # hget of a missing key returns None, and expire
+            # of a missing key returns False, so no exists checks are needed
+            pipe.hget(login_prefix+cookie_string, 'user_id')
+            pipe.expire(login_prefix+cookie_string, 7200)
+            pipe.expire(auth_prefix+cookie_string, 600)
+        # a key of the wrong type gives an exception in its place, treated as not found
+        results = [ None if isinstance(result, Exception) else result for result in pipe.execute(raise_on_error=False) ]
+    except:
+        return failed
+
+    control_state = ControlState(various_prefix, rconn, results[0] or {})
+
+    try:
+        test_mode_user_id = int(results[1].decode('utf-8'))
+    except:
+        test_mode_user_id = None
+
+    results = results[2:]
+
+    stored_values = None
+    if key_string:
+        stored_values = _session_values(results[0])
+        results = results[1:]
+
+    user_id = None
+    authenticated = False
+    if cookie_valid:
+        user_id, login_refreshed, authenticated = results
+        try:
+            user_id = int(user_id.decode('utf-8'))
+        except:
+            user_id = None
         else:
-            str_val = val
-        values.append(str_val)
+            _cache_login(login_prefix+cookie_string, user_id)
+        authenticated = bool(authenticated) and (user_id is not None)
+
+    return CallValues(user_id, authenticated, control_state, test_mode_user_id, stored_values)
+
+
+######################################################################
+#
+# version number of the settings and text held in the database,
+# incremented whenever they are changed, so each worker process can
+# tell when its in-memory copy is out of date
+#
+######################################################################
+
 
-    return values
+def get_settings_version(prefix='', rconn=None):
+    """Return the settings version as an integer, 0 if it has not been set,
+       None on failure"""
+    if rconn is None:
+        return
+    try:
+        version = rconn.get(prefix+'settings_version')
+    except:
+        return
+    if version is None:
+        return 0
+    return int(version.decode('utf-8'))
+
+
+def incr_settings_version(prefix='', rconn=None):
+    """Increment the settings version, return True on success, False on failure"""
+    if rconn is None:
+        return False
+    try:
+        rconn.incr(prefix+'settings_version')
+    except:
+        return False
+    return True
 
 
 ######################### log information to redis,
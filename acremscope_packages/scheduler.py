@@ -0,0 +1,133 @@
+####################################################
+#
+# A scheduler running the periodic jobs of the observatory in one
+# long running process, rather than as separate cron scripts, so the
+# astropy, indi_mr and redis imports and connections are made once.
+#
+# Jobs are registered with register(), each with its utc run times,
+# and run() then runs them for ever. Each job is a function taking
+# no arguments and returning a message, which is logged with
+# redis_ops.log_info together with the time taken, as is any failure.
+#
+# A job is not started while its previous run is still running, a
+# random jitter may delay its start, and a failed job is retried after
+# a backoff doubling on each attempt.
+#
+####################################################
+
+
+import random, threading, time, traceback
+
+from datetime import datetime, timedelta
+
+from . import redis_ops
+
+
+# the registry of jobs, name:Job
+_JOBS = {}
+
+# the longest sleep of the scheduling loop, so a changed clock is followed
+_MAX_SLEEP = 60
+
+
+class Job(object):
+
+    def __init__(self, name, function, times, weekdays=None, jitter=0, retries=2, backoff=60):
+        """times is a list of (hour, minute) utc run times, weekdays a list of days, Monday being 0,
+           or None for every day, jitter the maximum random delay in seconds, retries the number
+           of retries after a failure, the first after backoff seconds, doubling on each retry"""
+        self.name = name
+        self.function = function
+        self.times = sorted(times)
+        self.weekdays = weekdays
+        self.jitter = jitter
+        self.retries = retries
+        self.backoff = backoff
+        # held while the job runs
+        self.running = threading.Lock()
+        # the next scheduled run, and a retry of a failed run
+        self.due = None
+        self.retry_at = None
+        self.attempt = 0
+
+    def next_time(self, after):
+        "Returns the next scheduled datetime after the datetime after"
+        day = after.date()
+        for days in range(8):
+            for hour, minute in self.times:
+                scheduled = datetime(day.year, day.month, day.day, hour, minute)
+                if scheduled <= after:
+                    continue
+                if (self.weekdays is None) or (scheduled.weekday() in self.weekdays):
+                    return scheduled
+            day += timedelta(days=1)
+
+    def schedule(self, after):
+        "Sets due to the next scheduled time after the datetime after, with jitter"
+        self.due = self.next_time(after) + timedelta(seconds=random.uniform(0, self.jitter))
+
+
+def register(name, function, times, weekdays=None, jitter=0, retries=2, backoff=60):
+    "Adds a job to the registry, see Job for the arguments"
+    _JOBS[name] = Job(name, function, times, weekdays, jitter, retries, backoff)
+
+
+def get_job(name):
+    "Returns the registered job, or None if not found"
+    return _JOBS.get(name)
+
+
+def _execute(job, prefix, rconn):
+    "Runs the job, logs the time taken and the result, and on failure sets a retry"
+    start = time.monotonic()
+    try:
+        message = job.function()
+    except Exception as e:
+        elapsed = time.monotonic() - start
+        traceback.print_exc()
+        retry = None
+        if job.attempt < job.retries:
+            wait = job.backoff * 2**job.attempt
+            retry = datetime.utcnow() + timedelta(seconds=wait)
+        if (retry is not None) and (retry < job.due):
+            # retry, unless the next scheduled run comes first
+            job.attempt += 1
+            job.retry_at = retry
+            redis_ops.log_info(topic=job.name, message=f"failed after {elapsed:.1f}s, retry in {wait}s : {e}", prefix=prefix, rconn=rconn)
+        else:
+            redis_ops.log_info(topic=job.name, message=f"failed after {elapsed:.1f}s : {e}", prefix=prefix, rconn=rconn)
+    else:
+        elapsed = time.monotonic() - start
+        redis_ops.log_info(topic=job.name, message=f"completed in {elapsed:.1f}s : {message or 'done'}", prefix=prefix, rconn=rconn)
+    finally:
+        job.running.release()
+
+
+def start(job, prefix, rconn):
+    "Starts the job in a thread, returns False if its previous run is still running"
+    if not job.running.acquire(blocking=False):
+        return False
+    threading.Thread(target=_execute, args=(job, prefix, rconn), name=job.name, daemon=True).start()
+    return True
+
+
+def run(prefix='', rconn=None):
+    "Runs the registered jobs at their scheduled times, never returns"
+    now = datetime.utcnow()
+    for job in _JOBS.values():
+        job.schedule(now)
+    while True:
+        now = datetime.utcnow()
+        for job in _JOBS.values():
+            if (job.retry_at is not None) and (job.retry_at <= now):
+                job.retry_at = None
+                start(job, prefix, rconn)
+            elif job.due <= now:
+                job.schedule(now)
+                job.attempt = 0
+                job.retry_at = None
+                if not start(job, prefix, rconn):
+                    redis_ops.log_info(topic=job.name, message="skipped, the previous run is still running", prefix=prefix, rconn=rconn)
+        waiting = [(job.due - now).total_seconds() for job in _JOBS.values()]
+        waiting.extend((job.retry_at - now).total_seconds() for job in _JOBS.values() if job.retry_at is not None)
+        time.sleep(min([_MAX_SLEEP] + [max(wait, 0.1) for wait in waiting]))
@@ -19,14 +19,12 @@ from . import database_ops
 def sendmail(email, subject, message):
     "Sends an email, return True on success, False failure"
 
-    # get smtpserver, no_reply and starttls from database for the smtp server
-    smtpserversettings = database_ops.get_emailserver()
-    if not smtpserversettings:
+    # get smtpserver, no_reply and starttls, and the username and password
+    # for the smtp server from the database settings
+    emailsettings = database_ops.get_emailsettings()
+    if not emailsettings:
         return False
-    smtpserver, no_reply, starttls = smtpserversettings
-
-    # get username and password from database for the smtp server
-    emailuserpass = database_ops.get_emailuserpass()
+    (smtpserver, no_reply, starttls), emailuserpass = emailsettings
 
     try:
         msg = MIMEText(message)
@@ -4,16 +4,17 @@ import os, sys, sqlite3, math
 from datetime import datetime, timedelta, timezone
 
 from astropy import units as u
-from astropy.coordinates import SkyCoord, EarthLocation, AltAz, name_resolve, solar_system_ephemeris, get_body, Angle, PrecessedGeocentric, ICRS
+from astropy.coordinates import SkyCoord, AltAz, name_resolve, get_body, Angle, PrecessedGeocentric, ICRS
 from astropy.time import Time
-from astroquery.mpc import MPC
-from astroquery.exceptions import InvalidQueryError
 from astropy_healpix import HEALPix
 import numpy as np
 
-from .cfg import observatory, get_planetdb, get_constellation_lines, get_star_catalogs_directory, planetmags
+from .cfg import get_planetdb, get_constellation_lines, get_star_catalogs_directory, planetmags
 
 from .sun import night_slots, Slot
+from .name_resolver import resolve
+from . import ephemeris_cache
+from .astro_centre import centre_location, use_jpl
 
 # get directory containing the star catalog databases
 starcatalogs = get_star_catalogs_directory()
@@ -404,12 +405,10 @@ def get_named_object(target_name, tstamp, astro_centre=None):
     if not target_name:
         return
 
-    solar_system_ephemeris.set('jpl')
+    use_jpl()
 
     if astro_centre is None:
-        # longitude, latitude, elevation of the astronomy centre
-        longitude, latitude, elevation = observatory()
-        astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+        astro_centre = centre_location()
 
     if not isinstance(tstamp, Time):
         tstamp = Time(tstamp, format='datetime', scale='utc')
@@ -423,8 +422,9 @@ def get_named_object(target_name, tstamp, astro_centre=None):
         return  target, target_altaz
 
     # not a planet, see if it is something like M45 or star name, this obtains an icrs framed object
+    # from the local catalogue or cache of names, or failing those, from the remote name service
     try:
-        target = SkyCoord.from_name(target_name)
+        target = resolve(target_name)
     except name_resolve.NameResolveError:
         # failed to find name, maybe a minor planet
         pass
@@ -432,15 +432,14 @@ def get_named_object(target_name, tstamp, astro_centre=None):
         target_altaz = target.transform_to(AltAz(obstime = tstamp, location = astro_centre))
         return  target, target_altaz
 
-    # minor planet location
-    try:
-        eph = MPC.get_ephemeris(target_name, location=astro_centre, start=tstamp, number=1)
-        # eph is a table of a single line, set this into a SkyCoord object
-        target = SkyCoord(eph['RA'][0]*u.deg, eph['Dec'][0]*u.deg, obstime = tstamp, location = astro_centre, frame='gcrs')
-        # target in GCRS geocentric frame
-        target_altaz = target.transform_to(AltAz(obstime = tstamp, location = astro_centre))
-    except InvalidQueryError:
+    # minor planet location, from the cached ephemeris
+    positions = ephemeris_cache.positions(target_name, [tstamp.to_datetime()], location=astro_centre)
+    if positions is None:
         return
+    ra, dec = positions[0]
+    target = SkyCoord(ra*u.deg, dec*u.deg, obstime = tstamp, location = astro_centre, frame='gcrs')
+    # target in GCRS geocentric frame
+    target_altaz = target.transform_to(AltAz(obstime = tstamp, location = astro_centre))
 
     return  target, target_altaz
 
@@ -451,12 +450,10 @@ def get_named_object_slots(target_name, thedate, astro_centre=None):
     """Return a list of lists of [ datetime, ra, dec, alt, az] in degrees for the given thedate (a datetime or date object)
        return None if not found, where each list is the position at the mid time of each night slot of thedate"""
 
-    solar_system_ephemeris.set('jpl')
+    use_jpl()
 
     if astro_centre is None:
-        # longitude, latitude, elevation of the astronomy centre
-        longitude, latitude, elevation = observatory()
-        astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+        astro_centre = centre_location()
 
     slots = night_slots(thedate)
     midtimes = [ slot.midtime for slot in slots ]
@@ -478,7 +475,7 @@ def get_named_object_slots(target_name, thedate, astro_centre=None):
 
     # Test if a fixed object, such as M45 - RA, DEC's will be constant, though alt, az will change
     try:
-        target = SkyCoord.from_name(target_name)
+        target = resolve(target_name)
     except name_resolve.NameResolveError:
         # failed to find name, maybe a minor planet
         pass
@@ -489,16 +486,14 @@ def get_named_object_slots(target_name, thedate, astro_centre=None):
             result_list.append([mt, target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree])
         return result_list
 
-    # Test if minor planet/comet
-    time = Time(midtimes[0], format='datetime', scale='utc')
-    try:
-        eph = MPC.get_ephemeris(target_name, step="1hour", start=time, number=len(midtimes))
-        for idx, mt in enumerate(midtimes):
-            target = SkyCoord(eph['RA'][idx]*u.degree, eph['Dec'][idx]*u.degree, frame='icrs')
-            target_altaz = target.transform_to(AltAz(obstime = mt, location = astro_centre))
-            result_list.append([mt, target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree])
-    except InvalidQueryError:
+    # Test if minor planet/comet, from the cached ephemeris
+    positions = ephemeris_cache.positions(target_name, midtimes)
+    if positions is None:
         return
+    for mt, (ra, dec) in zip(midtimes, positions):
+        target = SkyCoord(ra*u.degree, dec*u.degree, frame='icrs')
+        target_altaz = target.transform_to(AltAz(obstime = mt, location = astro_centre))
+        result_list.append([mt, target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree])
 
     return result_list
 
@@ -508,12 +503,10 @@ def get_unnamed_object_slots(target_ra, target_dec, thedate, astro_centre=None):
     """Return a list of lists of [ datetime, ra, dec, alt, az] in degrees for the given thedate (a datetime or date object)
        return None if not found, where each list is the position at the mid time of each night slot of thedate"""
 
-    solar_system_ephemeris.set('jpl')
+    use_jpl()
 
     if astro_centre is None:
-        # longitude, latitude, elevation of the astronomy centre
-        longitude, latitude, elevation = observatory()
-        astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+        astro_centre = centre_location()
 
     slots = night_slots(thedate)
     midtimes = [ slot.midtime for slot in slots ]
@@ -541,15 +534,12 @@ def get_unnamed_object_slots(target_ra, target_dec, thedate, astro_centre=None):
 def get_named_object_intervals(target_name, start, step, number, astro_centre=None):
     """Return a list of lists of [ datetime, ra(icrs), dec(icrs), alt, az, ra(pg), dec(pg)] starting at the given start (a datetime object)
        each interval is step (a timedelta object), and number is the number of rows to return
-       return None if not found.
-       Note, step resolution is either whole seconds, minutes or hours, so 1 minute 30 second will be applied as one minute"""
+       return None if not found."""
 
-    solar_system_ephemeris.set('jpl')
+    use_jpl()
 
     if astro_centre is None:
-        # longitude, latitude, elevation of the astronomy centre
-        longitude, latitude, elevation = observatory()
-        astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+        astro_centre = centre_location()
 
     times = []
     for dt in range(number):
@@ -574,7 +564,7 @@ def get_named_object_intervals(target_name, start, step, number, astro_centre=No
 
     # Test if a fixed object, such as M45 - RA, DEC's will be constant, though alt, az will change
     try:
-        target = SkyCoord.from_name(target_name)
+        target = resolve(target_name)
     except name_resolve.NameResolveError:
         # failed to find name, maybe a minor planet
         pass
@@ -586,26 +576,15 @@ def get_named_object_intervals(target_name, start, step, number, astro_centre=No
             result_list.append([dt, target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree, target_pg.ra.degree, target_pg.dec.degree])
         return result_list
 
-    # Test if minor planet/comet
-    time = Time(times[0], format='datetime', scale='utc')
-    
-    seconds = step.total_seconds()
-    if seconds < 60:
-        stepstring = str(seconds) + "second"
-    elif seconds <3600:
-        stepstring = str(seconds//60) + "minute"
-    else:
-        stepstring = str(seconds//3600) + "hour"
-
-    try:
-        eph = MPC.get_ephemeris(target_name, step=stepstring, start=time, number=number)
-        for idx, dt in enumerate(times):
-            target = SkyCoord(eph['RA'][idx]*u.degree, eph['Dec'][idx]*u.degree, frame='icrs')
-            target_altaz = target.transform_to(AltAz(obstime = dt, location = astro_centre))
-            target_pg = target.transform_to(PrecessedGeocentric(obstime = dt, equinox = dt))
-            result_list.append([dt, target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree, target_pg.ra.degree, target_pg.dec.degree])
-    except InvalidQueryError:
+    # Test if minor planet/comet, from the cached ephemeris
+    positions = ephemeris_cache.positions(target_name, times)
+    if positions is None:
         return
+    for dt, (ra, dec) in zip(times, positions):
+        target = SkyCoord(ra*u.degree, dec*u.degree, frame='icrs')
+        target_altaz = target.transform_to(AltAz(obstime = dt, location = astro_centre))
+        target_pg = target.transform_to(PrecessedGeocentric(obstime = dt, equinox = dt))
+        result_list.append([dt, target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree, target_pg.ra.degree, target_pg.dec.degree])
 
     return result_list
 
@@ -615,12 +594,10 @@ def get_unnamed_object_intervals(target_ra, target_dec, start, step, number, ast
        each interval is step (a timedelta object), and number is the number of rows to return
        return None if not found."""
 
-    solar_system_ephemeris.set('jpl')
+    use_jpl()
 
     if astro_centre is None:
-        # longitude, latitude, elevation of the astronomy centre
-        longitude, latitude, elevation = observatory()
-        astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+        astro_centre = centre_location()
 
     times = []
     for dt in range(number):
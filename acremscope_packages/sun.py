@@ -1,15 +1,19 @@
 
 
 
+import struct, sys
+
+from array import array
 from datetime import date, timedelta, datetime, timezone
 from functools import lru_cache
 
-from astropy.coordinates import EarthLocation
-from astropy.time import Time
+from .astro_centre import centre_observer
+from .cfg import get_suntimes
 
-from astroplan import Observer
 
-from .cfg import observatory
+# (ordinal of the first day, array of sunrise, sunset hours for each day), read
+# on first use from the file made by astrodata/make_suntimes.py
+_SUNTIMES = None
 
 
 def sunrise(date_object):
@@ -46,29 +50,67 @@ def sunsettomorrow():
     tomorrow = today + timedelta(days=1)
     return sunset(tomorrow)
 
-@lru_cache(maxsize=32)
+def _suntable():
+    "Returns the table of sunrise and sunset times, empty if the file cannot be read"
+    global _SUNTIMES
+    if _SUNTIMES is None:
+        table = array('d')
+        try:
+            with open(get_suntimes(), "rb") as f:
+                first, days = struct.unpack("<ii", f.read(8))
+                table.fromfile(f, 2*days)
+            if sys.byteorder != 'little':
+                table.byteswap()
+        except:
+            first, table = 0, array('d')
+        _SUNTIMES = (first, table)
+    return _SUNTIMES
+
+
 def suntime(day, month, year, rise=True):
     """Given day month year, if rise is True returns sunrise time, if False return sunset time
           For the todmorden astronomy centre"""
+    first, table = _suntable()
+    index = 2*(date(year, month, day).toordinal() - first) + (0 if rise else 1)
+    if 0 <= index < len(table):
+        hours = table[index]
+        if hours == hours:
+            # not nan, so found in the table
+            return hours
+    return _calculate_suntime(day, month, year, rise)
 
-    longitude, latitude, elevation = observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
-    centre_observer = Observer(location=astro_centre, name="centre_observer", timezone="utc")
+
+@lru_cache(maxsize=32)
+def _calculate_suntime(day, month, year, rise=True):
+    "Calculates the sunrise or sunset time, for dates not in the table"
+
+    # imported here so pages which do not call this need not load astropy
+    from astropy.time import Time
+
+    observer = centre_observer()
 
     if rise:
         # get sunrise to the nearest time of 5:00 am
         thedate = datetime(year, month, day, hour=5, tzinfo=timezone.utc)
-        astrotime = Time(thedate, format='datetime', scale='utc')
-        sun_rise = centre_observer.sun_rise_time(astrotime, which="nearest")
-        sun_rise.format = 'datetime'
-        return sun_rise.value.hour + sun_rise.value.minute/60.0 + sun_rise.value.second/360.0
+        event = observer.sun_rise_time
     else:
         # get sunset to the nearest time of 19:00 pm
         thedate = datetime(year, month, day, hour=19, tzinfo=timezone.utc)
-        astrotime = Time(thedate, format='datetime', scale='utc')
-        sun_set = centre_observer.sun_set_time(astrotime, which="nearest")
-        sun_set.format = 'datetime'
-        return sun_set.value.hour + sun_set.value.minute/60.0 + sun_set.value.second/360.0
+        event = observer.sun_set_time
+
+    # which="nearest" gives a masked time, or the event of the previous day, when the
+    # event is very close to the reference time, so then look for the next event from
+    # two hours earlier, or the previous event from two hours later
+    for reference, which in ((thedate, "nearest"),
+                             (thedate - timedelta(hours=2), "next"),
+                             (thedate + timedelta(hours=2), "previous")):
+        astrotime = Time(reference, format='datetime', scale='utc')
+        found = event(astrotime, which=which)
+        if (not found.mask) and abs((found - astrotime).jd) < 0.5:
+            found.format = 'datetime'
+            return found.value.hour + found.value.minute/60.0 + found.value.second/3600.0
+    # not expected, but rather than fail, return the reference hour
+    return float(thedate.hour)
 
 
 class Slot(object):
@@ -97,13 +139,15 @@ class Slot(object):
         return cls(prev_day.date(), this_hour+12)
 
 
-    def __init__(self, startday, sequence):
-        "startday is a date object"
+    def __init__(self, startday, sequence, calendar=None):
+        "startday is a date object, calendar is the NightCalendar of startday, found if not given"
+        if calendar is None:
+            calendar = night_calendar(startday)
         self.startday = startday
-        self.nextday = startday + timedelta(days=1)
+        self.nextday = calendar.nextday
         # The night viewing time
-        self.set = int( suntime(startday.day, startday.month, startday.year, rise=False) ) + 1  # +1 to round up
-        self.rise = int( suntime(self.nextday.day, self.nextday.month, self.nextday.year, rise=True) ) # auto rounds down
+        self.set = calendar.set
+        self.rise = calendar.rise
         # sequence 0 is 12 mid day of startday
         # sequence 12 is midnight, or hour zero of nextday
         # sequence 23 is 11 am of nextday
@@ -172,36 +216,19 @@ def twoday_slots(fromdate = None):
     else:
         today = fromdate
     tomorrow = today + timedelta(days=1)
-    dayafter = today + timedelta(days=2)
 
-    # night one
-    one_set = int( suntime(today.day, today.month, today.year, rise=False) )
-    one_rise = int( suntime(tomorrow.day, tomorrow.month, tomorrow.year, rise=True) )
-
-    # night two
-    two_set = int( suntime(tomorrow.day, tomorrow.month, tomorrow.year, rise=False) )
-    two_rise = int( suntime(dayafter.day, dayafter.month, dayafter.year, rise=True) )
+    night_one = night_calendar(today)
+    night_two = night_calendar(tomorrow)
 
     # table start and end hours
-    table_start = min(one_set, two_set) + 1  # +1 for observing to start in the hour after sunset
-    table_end = max(one_rise, two_rise) - 1  # -1 for observing to end in the hour before sunrise
-
-    night0 = []
-    night1 = []
+    table_start = min(night_one.set, night_two.set)  # set is already the hour after sunset
+    table_end = max(night_one.rise, night_two.rise) - 1  # -1 for observing to end in the hour before sunrise
 
-    for seq in range(0, 12):
-        if (seq+12) < table_start:
-            continue
-        night0.append(Slot(today,seq))
-        night1.append(Slot(tomorrow,seq))
+    # sequences from the table start hour in the evening, to the table end hour in the morning
+    first = table_start - 12
+    last = table_end + 12
 
-    for seq in range(12, 24):
-        if (seq-12) > table_end:
-            continue
-        night0.append(Slot(today,seq))
-        night1.append(Slot(tomorrow,seq))
-
-    return night0, night1
+    return list(night_one.slots[first:last+1]), list(night_two.slots[first:last+1])
 
 
 
@@ -211,27 +238,48 @@ def night_slots(thisdate = None):
         today = datetime.now(timezone.utc).date()
     else:
         today = thisdate
-    tomorrow = today + timedelta(days=1)
+    return night_calendar(today).night_slots()
 
-    # night one
-    sun_set = int( suntime(today.day, today.month, today.year, rise=False) )
-    sun_rise = int( suntime(tomorrow.day, tomorrow.month, tomorrow.year, rise=True) )
 
-    # list start and end hours
-    list_start = sun_set + 1  # +1 for observing to start in the hour after sunset
-    list_end = sun_rise - 1  # -1 for observing to end in the hour before sunrise
+class NightCalendar(object):
+    """The immutable calendar of one observing night, starting at midday of startday,
+       holding the sunset and sunrise hours, the night's 24 Slots and their daylight flags.
+       Use night_calendar(startday), which keeps a calendar for each date"""
 
-    night = []
+    __slots__ = ('startday', 'nextday', 'set', 'rise', 'start_sequence', 'end_sequence', 'slots', 'daylight')
+
+    def __init__(self, startday):
+        "startday is a date object"
+        nextday = startday + timedelta(days=1)
+        object.__setattr__(self, 'startday', startday)
+        object.__setattr__(self, 'nextday', nextday)
+        # the hour after sunset, when observing can start
+        object.__setattr__(self, 'set', int( suntime(startday.day, startday.month, startday.year, rise=False) ) + 1)  # +1 to round up
+        # the hour of sunrise, when observing must end
+        object.__setattr__(self, 'rise', int( suntime(nextday.day, nextday.month, nextday.year, rise=True) ))  # auto rounds down
+        # the observing window, as sequence numbers, from start_sequence up to but not including end_sequence
+        object.__setattr__(self, 'start_sequence', self.set - 12)
+        object.__setattr__(self, 'end_sequence', self.rise + 12)
+        slots = tuple(Slot(startday, sequence, self) for sequence in range(24))
+        object.__setattr__(self, 'slots', slots)
+        object.__setattr__(self, 'daylight', tuple(slot.in_daylight() for slot in slots))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("NightCalendar is read only")
+
+    def __repr__(self):
+        return __class__.__name__ +"(" + self.startday.isoformat() + ")"
 
-    for seq in range(0, 12):
-        if (seq+12) < list_start:
-            continue
-        night.append(Slot(today,seq))
+    def slot(self, sequence):
+        "Returns the Slot of this night with the given sequence, 0 to 23"
+        return self.slots[sequence]
 
-    for seq in range(12, 24):
-        if (seq-12) > list_end:
-            continue
-        night.append(Slot(today,seq))
+    def night_slots(self):
+        "Returns a list of the Slots of the observing window"
+        return list(self.slots[self.start_sequence:self.end_sequence])
 
-    return night
 
+@lru_cache(maxsize=64)
+def night_calendar(startday):
+    "Returns the NightCalendar for the night starting on startday, a date object"
+    return NightCalendar(startday)
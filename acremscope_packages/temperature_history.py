@@ -0,0 +1,120 @@
+####################################################
+#
+# A history of the observatory temperature, kept in redis as ring
+# buffers at minute, hour and day resolution, fed by the indi_tracker
+# thread as each new temperature arrives from INDI.
+#
+# Each ring buffer is one redis string of fixed size records, packed
+# as (bucket start in unix seconds, number of samples, mean temperature
+# in Centigrade). A sample is written into the record of its bucket in
+# every ring with SETRANGE, so the buffers never grow, and a page reads
+# a whole history with a single GET and unpacks it with struct.
+#
+# Several processes may run a tracking thread, so a sample is recorded
+# in a WATCH transaction, and only if it is newer than the last recorded.
+#
+####################################################
+
+
+import struct
+
+from datetime import datetime, timezone
+
+try:
+    from redis import WatchError
+except:
+    WatchError = Exception
+
+
+_RECORD = struct.Struct("<IIf")
+
+# resolution name:(bucket seconds, number of buckets)
+RESOLUTIONS = {"minute":(60, 2880),      # two days
+               "hour":(3600, 2160),      # ninety days
+               "day":(86400, 1830)}      # five years
+
+# the element timestamp of the last sample recorded by this process
+_LAST = None
+
+
+def _key(prefix, resolution):
+    return prefix + "temperature_" + resolution
+
+
+def _merge(record, start, temperature):
+    "Returns the packed record of the bucket starting at start, with the temperature added"
+    if len(record) == _RECORD.size:
+        oldstart, count, mean = _RECORD.unpack(record)
+        if (oldstart == start) and count:
+            return _RECORD.pack(start, count+1, mean + (temperature - mean)/(count+1))
+    return _RECORD.pack(start, 1, temperature)
+
+
+def record(rconn, prefix, timestamp, temperature):
+    """Records temperature, in Centigrade, measured at timestamp, seconds since the epoch,
+       returns True if recorded, False if not newer than the last sample, or on failure"""
+    timestamp = int(timestamp)
+    lastkey = prefix + "temperature_last"
+    keys = [_key(prefix, resolution) for resolution in RESOLUTIONS]
+    try:
+        with rconn.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(lastkey, *keys)
+                    last = pipe.get(lastkey)
+                    if (last is not None) and (int(last) >= timestamp):
+                        return False
+                    updates = []
+                    for key, (seconds, buckets) in zip(keys, RESOLUTIONS.values()):
+                        start = timestamp - timestamp % seconds
+                        offset = (start // seconds % buckets) * _RECORD.size
+                        old = pipe.getrange(key, offset, offset + _RECORD.size - 1)
+                        updates.append((key, offset, _merge(old, start, temperature)))
+                    pipe.multi()
+                    pipe.set(lastkey, timestamp)
+                    for key, offset, packed in updates:
+                        pipe.setrange(key, offset, packed)
+                    pipe.execute()
+                    return True
+                except WatchError:
+                    # another process recorded a sample, try again
+                    continue
+    except:
+        return False
+
+
+def record_snapshot(rconn, prefix, snapshot):
+    "Records the temperature of an indi_snapshot.Snapshot, if it has a new timestamp"
+    global _LAST
+    element_att = snapshot.elements_dict("TEMPERATURE", "ATMOSPHERE", "Rempico01")
+    timestamp = element_att.get("timestamp")
+    if (not timestamp) or (timestamp == _LAST):
+        return
+    try:
+        # Convert from Kelvin to Centigrade
+        temperature = float(element_att["formatted_number"]) - 273.15
+        measured = datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp()
+    except:
+        return
+    if record(rconn, prefix, measured, temperature):
+        _LAST = timestamp
+
+
+def history(rconn, prefix, resolution="hour", number=None):
+    """Returns a list of (datetime, mean temperature) of the most recent number of buckets, oldest first,
+       of the given resolution, all the buckets held if number is None, an empty list on failure"""
+    seconds, buckets = RESOLUTIONS[resolution]
+    if number is None:
+        number = buckets
+    try:
+        data = rconn.get(_key(prefix, resolution))
+    except:
+        return []
+    if not data:
+        return []
+    now = int(datetime.now(timezone.utc).timestamp())
+    # buckets which started before this are older than the ring, or not wanted
+    oldest = now - now % seconds - (min(number, buckets) - 1) * seconds
+    samples = sorted((start, mean) for start, count, mean in _RECORD.iter_unpack(data[:len(data) - len(data) % _RECORD.size])
+                     if count and start >= oldest)
+    return [(datetime.fromtimestamp(start, timezone.utc).replace(tzinfo=None), mean) for start, mean in samples]
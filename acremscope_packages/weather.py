@@ -0,0 +1,87 @@
+####################################################
+#
+# Reads the met office forecast file weather.json, made by
+# astrodata/metoffice.py, parsing it only when the file changes,
+# and serves each hour's forecast from memory.
+#
+# The file is a dictionary of iso time strings, such as 2021-06-13T12:00Z,
+# to a list of [description, value, label] for each parameter.
+#
+####################################################
+
+
+import os, json, threading
+
+from collections import namedtuple
+
+from .cfg import get_astrodata_directory
+
+
+SIG_WEATHER = ["Clear night", "Sunny day", "Partly cloudy (night)", "Partly cloudy (day)",
+               "Not used", "Mist", "Fog", "Cloudy", "Overcast", "Light rain shower (night)",
+               "Light rain shower (day)", "Drizzle", "Light rain", "Heavy rain shower (night)",
+               "Heavy rain shower (day)", "Heavy rain", "Sleet shower (night)", "Sleet shower (day)",
+               "Sleet", "Hail shower (night)", "Hail shower (day)", "Hail", "Light snow shower (night)",
+               "Light snow shower (day)", "Light snow", "Heavy snow shower (night)", "Heavy snow shower (day)",
+               "Heavy snow", "Thunder shower (night)", "Thunder shower (day)", "Thunder"]
+
+
+# The forecast of one hour, descriptions, values and labels are the table columns,
+# summary is the significant weather text, or an empty string if not known
+HourForecast = namedtuple('HourForecast', ['descriptions', 'values', 'labels', 'summary'])
+
+
+_LOCK = threading.Lock()
+
+# (file identity, {time string:HourForecast}) of the last file read
+_FORECASTS = (None, {})
+
+
+def _summary(descriptions, values):
+    "Returns the significant weather text, or an empty string if not known"
+    try:
+        code = int(values[descriptions.index("Significant Weather Code")])
+        return SIG_WEATHER[code]
+    except:
+        return ''
+
+
+def _parse(weatherfile):
+    "Returns a dictionary of time string:HourForecast read from the file"
+    with open(weatherfile, 'r') as fp:
+        weather_dict = json.load(fp)
+    forecasts = {}
+    for thistime, rows in weather_dict.items():
+        columns = tuple(zip(*rows))
+        if len(columns) != 3:
+            continue
+        forecasts[thistime] = HourForecast(columns[0], columns[1], columns[2], _summary(columns[0], columns[1]))
+    return forecasts
+
+
+def _forecasts():
+    "Returns the dictionary of forecasts, reading the file again only if it has changed"
+    global _FORECASTS
+    weatherfile = os.path.join(get_astrodata_directory(), "weather.json")
+    try:
+        stat = os.stat(weatherfile)
+    except:
+        return {}
+    # metoffice.py replaces the file, so a new file has a new inode
+    identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if _FORECASTS[0] == identity:
+        return _FORECASTS[1]
+    with _LOCK:
+        if _FORECASTS[0] != identity:
+            try:
+                _FORECASTS = (identity, _parse(weatherfile))
+            except:
+                # The file is not readable by json
+                _FORECASTS = (identity, {})
+        return _FORECASTS[1]
+
+
+def forecast(thistime):
+    """Returns the HourForecast for thistime, a string in a format like 2021-06-13T12:00Z,
+       or None if there is no forecast for that hour"""
+    return _forecasts().get(thistime)
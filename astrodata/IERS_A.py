@@ -1,18 +1,35 @@
 
-import sys
 
-from datetime import datetime
+###############################################
+#
+# Downloads the IERS Bulletin A, and the JPL kernel if there
+# is no local copy, into the astrodata/astropy_data directory,
+# where the web service, which never downloads these itself,
+# picks up the new files
+#
+################################################
+
+
+import sys, os
 
 import redis
 
-from astroplan import download_IERS_A
+THIS_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+
+# the projectfiles directory, holding acremscope_packages
+PROJECTFILES = os.path.dirname(THIS_DIRECTORY)
+
+sys.path.insert(0, PROJECTFILES)
+
+from acremscope_packages import cfg, astro_data, redis_ops
+
+cfg.set_projectfiles(PROJECTFILES)
+
 
 try:
-    download_IERS_A()
+    message = astro_data.refresh()
 except:
-    message = "download_IERS_A() has failed"
-else:
-    message = "IERS Bulletin A has been downloaded"
+    message = "IERS Bulletin A and JPL kernel refresh has failed"
 
 
 try:
@@ -20,14 +37,7 @@ try:
 except Exception:
     print("Warning:redis connection failed")
 else:
-    try:
-        # create a log entry to set in the redis server
-        fullmessage = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S") + " " + message
-        rconn.rpush("remscope_various_log_info", fullmessage)
-        # and limit number of messages to 50
-        rconn.ltrim("remscope_various_log_info", -50, -1)
-    except Exception:
+    if not redis_ops.log_info(message=message, prefix="remscope_various_", rconn=rconn):
         print("Saving log to redis has failed")
 
 sys.exit(0)
-
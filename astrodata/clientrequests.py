@@ -12,9 +12,7 @@
 
 
 
-import sys, time
-
-from datetime import datetime
+import os, sys, time
 
 
 from indi_mr import redis_server, tools
@@ -62,43 +60,42 @@ def telescope_connection(rconn, redisserver, connect):
         tools.newswitchvector(rconn, redisserver, "CONNECTION" , TELESCOPE_NAME, {"CONNECT":"Off", "DISCONNECT":"On"})
 
 
+def close_door(rconn, redisserver):
+    "Sends getProperties, disconnects the telescope and closes the door, returns a message of the result"
+    result = tools.getProperties(rconn, redisserver)
+    if result is None:
+        return "Failed to send getProperties command"
+    # give getProperties time to respond
+    time.sleep(10)
+    # disconnect the telescope
+    telescope_connection(rconn, redisserver, False)
+    # send door close command
+    result = tools.newswitchvector(rconn, redisserver,
+                          "DOME_SHUTTER", DOOR_NAME, {"SHUTTER_OPEN":"Off", "SHUTTER_CLOSE":"On"})
+    if result is None:
+        return "Failed to send close door command"
+    time.sleep(60)
+    # wait a minute, then check door is closed
+    # future possibility - send alert emails if it has not
+    door_status = get_door(rconn, redisserver)
+    return f"Auto request to close door sent. Door status: {door_status}"
+
+
 if __name__  == "__main__":
 
     redisserver = redis_server(host='localhost', port=6379)
 
+    # the projectfiles directory, holding acremscope_packages
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+    from acremscope_packages import redis_ops
+
     try:
         rconn = tools.open_redis(redisserver)
-        result = tools.getProperties(rconn, redisserver)
-        if result is None:
-            message = "Failed to send getProperties command"
-        else:
-            # give getProperties time to respond
-            time.sleep(10)
-            # disconnect the telescope
-            telescope_connection(rconn, redisserver, False)
-            # send door close command
-            result = tools.newswitchvector(rconn, redisserver,
-                                  "DOME_SHUTTER", DOOR_NAME, {"SHUTTER_OPEN":"Off", "SHUTTER_CLOSE":"On"})
-            if result is None:
-                message = "Failed to send close door command"
-            else:
-                time.sleep(60)
-                # wait a minute, then check door is closed
-                # future possibility - send alert emails if it has not
-                door_status = get_door(rconn, redisserver)
-                message = f"Auto request to close door sent. Door status: {door_status}"
-
+        message = close_door(rconn, redisserver)
     except Exception:
         print("Warning:clientrequests.py failed")
     else:
-        try:
-            # create a log entry to set in the redis server
-            fullmessage = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S") + " " + message
-            rconn.rpush("remscope_various_log_info", fullmessage)
-            # and limit number of messages to 50
-            rconn.ltrim("remscope_various_log_info", -50, -1)
-        except Exception:
+        if not redis_ops.log_info(message=message, prefix="remscope_various_", rconn=rconn):
             print("Saving log to redis has failed")
 
     sys.exit(0)
-
@@ -0,0 +1,165 @@
+###############################################
+#
+# This script creates the sqlite database names.db, a
+# catalogue of object names and their ICRS positions, which
+# the web service reads to resolve target names such as
+# M31, C14, NGC 7000, IC 342 or Vega without a network call.
+#
+# python3 make_names.py [NGC.csv] [addendum.csv]
+#
+# NGC, IC and Messier objects, with their common names, are read
+# from the OpenNGC csv files, given as arguments or otherwise
+# downloaded. Caldwell objects are found from their NGC or IC
+# numbers, and the bright star names are resolved with the
+# remote Sesame service, so this is run where the internet
+# is available, and need only be run once.
+#
+################################################
+
+
+import os, sys, re, csv, io, sqlite3, urllib.request
+
+try:
+    import astropy.units as u
+    from astropy.coordinates import SkyCoord, Angle, name_resolve
+except:
+    sys.exit(1)
+
+
+THIS_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+
+# The path to the file of the database to be created
+NAMESDB = os.path.join(THIS_DIRECTORY, "names.db")
+
+OPENNGC = ("https://raw.githubusercontent.com/mattiaverga/OpenNGC/master/database_files/NGC.csv",
+           "https://raw.githubusercontent.com/mattiaverga/OpenNGC/master/database_files/addendum.csv")
+
+
+# The Caldwell catalogue, by number, as the identifier of each object
+CALDWELL = ( "NGC 188", "NGC 40", "NGC 4236", "NGC 7023", "IC 342", "NGC 6543", "NGC 2403", "NGC 559", "Sh2-155", "NGC 663",
+             "NGC 7635", "NGC 6946", "NGC 457", "NGC 869", "NGC 6826", "NGC 7243", "NGC 147", "NGC 185", "IC 5146", "NGC 7000",
+             "NGC 4449", "NGC 7662", "NGC 891", "NGC 1275", "NGC 2419", "NGC 4244", "NGC 6888", "NGC 752", "NGC 5005", "NGC 7331",
+             "IC 405", "NGC 4631", "NGC 6992", "NGC 6960", "NGC 4889", "NGC 4559", "NGC 6885", "NGC 4565", "NGC 2392", "NGC 3626",
+             "Hyades", "NGC 7006", "NGC 7814", "NGC 7479", "NGC 5248", "NGC 2261", "NGC 6934", "NGC 2775", "NGC 2237", "NGC 2244",
+             "IC 1613", "NGC 4697", "NGC 3115", "NGC 2506", "NGC 7009", "NGC 246", "NGC 6822", "NGC 2360", "NGC 3242", "NGC 4038",
+             "NGC 4039", "NGC 247", "NGC 7293", "NGC 2362", "NGC 253", "NGC 5694", "NGC 1097", "NGC 6729", "NGC 6302", "NGC 300",
+             "NGC 2477", "NGC 55", "NGC 1851", "NGC 3132", "NGC 6124", "NGC 6231", "NGC 5128", "NGC 6541", "NGC 3201", "NGC 5139",
+             "NGC 6352", "NGC 6193", "NGC 4945", "NGC 5286", "IC 2391", "NGC 6397", "NGC 1261", "NGC 5823", "NGC 6087", "NGC 2867",
+             "NGC 3532", "NGC 3372", "NGC 6752", "NGC 4755", "NGC 6025", "NGC 2516", "NGC 3766", "NGC 4609", "Coalsack Nebula", "IC 2944",
+             "NGC 6744", "IC 2602", "NGC 2070", "NGC 362", "NGC 4833", "NGC 104", "NGC 6101", "NGC 4372", "NGC 3195" )
+
+
+# Named bright stars, resolved with Sesame
+STARS = ( "Sirius", "Canopus", "Rigil Kentaurus", "Arcturus", "Vega", "Capella", "Rigel", "Procyon", "Achernar", "Betelgeuse",
+          "Hadar", "Altair", "Acrux", "Aldebaran", "Antares", "Spica", "Pollux", "Fomalhaut", "Deneb", "Mimosa",
+          "Regulus", "Adhara", "Castor", "Shaula", "Gacrux", "Bellatrix", "Elnath", "Miaplacidus", "Alnilam", "Alnair",
+          "Alnitak", "Alioth", "Dubhe", "Mirfak", "Wezen", "Sargas", "Kaus Australis", "Avior", "Alkaid", "Menkalinan",
+          "Atria", "Alhena", "Peacock", "Mirzam", "Alphard", "Polaris", "Hamal", "Algieba", "Diphda", "Nunki",
+          "Menkent", "Mirach", "Alpheratz", "Rasalhague", "Kochab", "Saiph", "Denebola", "Algol", "Alphecca", "Mintaka",
+          "Sadr", "Eltanin", "Schedar", "Naos", "Almach", "Caph", "Izar", "Dschubba", "Merak", "Ankaa",
+          "Enif", "Scheat", "Sabik", "Phecda", "Aludra", "Markab", "Menkar", "Zosma", "Arneb", "Unukalhai",
+          "Ruchbah", "Albireo", "Mizar", "Alcor", "Thuban", "Vindemiatrix", "Algenib", "Sheratan", "Megrez", "Alderamin",
+          "Rasalgethi", "Sadalmelik", "Sadalsuud", "Alcyone", "Mira", "Tarazed", "Cor Caroli", "Barnard's Star" )
+
+
+# a catalogue prefix followed by a number, with leading zeros removed
+_NUMBERED = re.compile(r"([a-z]+)0*(\d+)([a-z]?)")
+
+
+def name_key(name):
+    "Returns the key of name, this must be the same as name_key in acremscope_packages/name_resolver.py"
+    key = "".join(c for c in name.lower() if c.isalnum())
+    for longname, shortname in (("messier", "m"), ("caldwell", "c")):
+        if key.startswith(longname) and key[len(longname):].isdigit():
+            key = shortname + key[len(longname):]
+            break
+    match = _NUMBERED.fullmatch(key)
+    if match:
+        key = "".join(match.groups())
+    return key
+
+
+def read_csv(source):
+    "Returns a list of rows, as dictionaries, of an OpenNGC csv file given as a path or url"
+    if os.path.isfile(source):
+        with open(source, newline='', encoding='utf-8') as f:
+            text = f.read()
+    else:
+        with urllib.request.urlopen(source, timeout=60) as f:
+            text = f.read().decode('utf-8')
+    return list(csv.DictReader(io.StringIO(text), delimiter=';'))
+
+
+def openngc_names(rows, names):
+    "Adds name key:(ra, dec) to the names dictionary for each object, and its Messier number and common names"
+    for row in rows:
+        if not row.get('RA') or not row.get('Dec'):
+            # duplicates and objects without positions
+            continue
+        ra = Angle(row['RA'], unit=u.hourangle).degree
+        dec = Angle(row['Dec'], unit=u.deg).degree
+        aliases = [row['Name']]
+        if row.get('M'):
+            aliases.append("M" + row['M'])
+        if row.get('Common names'):
+            aliases.extend(row['Common names'].split(','))
+        for alias in aliases:
+            key = name_key(alias)
+            if key and key not in names:
+                names[key] = (ra, dec)
+
+
+def sesame(name):
+    "Returns (ra, dec) of name from the Sesame service, or None if not found"
+    try:
+        target = SkyCoord.from_name(name)
+    except name_resolve.NameResolveError:
+        print("Not found: %s" % (name,))
+        return
+    return target.ra.degree, target.dec.degree
+
+
+def make_names(sources):
+    "Returns a dictionary of name key:(ra, dec) in degrees"
+    names = {}
+    for source in sources:
+        openngc_names(read_csv(source), names)
+    for number, identifier in enumerate(CALDWELL, start=1):
+        position = names.get(name_key(identifier)) or sesame(identifier)
+        if position is not None:
+            names.setdefault("c%s" % (number,), position)
+    for star in STARS:
+        key = name_key(star)
+        if key not in names:
+            position = sesame(star)
+            if position is not None:
+                names[key] = position
+    return names
+
+
+if __name__ == "__main__":
+
+    sources = sys.argv[1:] or OPENNGC
+
+    try:
+        names = make_names(sources)
+    except Exception as e:
+        print("Unable to read the catalogue: %s" % (e,))
+        sys.exit(1)
+
+    # write to a temporary file, then rename, so a running server never reads a part written file
+    tempfile = NAMESDB + ".tmp"
+    if os.path.exists(tempfile):
+        os.remove(tempfile)
+    con = sqlite3.connect(tempfile)
+    try:
+        con.execute("CREATE TABLE NAMES(NAME TEXT PRIMARY KEY, RA REAL, DEC REAL) WITHOUT ROWID")
+        con.executemany("INSERT INTO NAMES(NAME,RA,DEC) VALUES (?,?,?)",
+                        ((key, ra, dec) for key, (ra, dec) in names.items()))
+        con.commit()
+    finally:
+        con.close()
+    os.replace(tempfile, NAMESDB)
+
+    print("%s names written to %s" % (len(names), NAMESDB))
+    sys.exit(0)
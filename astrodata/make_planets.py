@@ -20,8 +20,6 @@ try:
 except:
     sys.exit(1)
 
-solar_system_ephemeris.set('jpl')
-
 THIS_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
 
 # The path to the file of the database to be created
@@ -222,13 +220,16 @@ def _ra_dec_conversion(ra, dec):
 
 
 
-if __name__ == "__main__":
+def make_planets():
+    "Creates or updates planet.db with ten days of planet positions, returns (status, message)"
+
+    solar_system_ephemeris.set('jpl')
 
     if not os.path.isfile(PLANETDB):
         status, message = create_database()
         print(message)
         if status:
-            sys.exit(status)
+            return status, message
     else:
         # it does exist, delete old entries
         status = delete_old()
@@ -240,31 +241,32 @@ if __name__ == "__main__":
             status, message = create_database()
             print(message)
             if status:
-                sys.exit(status)
+                return status, message
 
     astro_centre = EarthLocation.from_geodetic(LONGITUDE, LATITUDE, ELEVATION)
 
     # make ten days of planet positions and set into the sqlite database
     status = make_ten_days(astro_centre)
     if status:
-        message = f"Planet calculations failed with status {status}"
-    else:
-        message = "Ten days of planet data calculated"
+        return status, f"Planet calculations failed with status {status}"
+    return 0, "Ten days of planet data calculated"
+
+
+
+if __name__ == "__main__":
+
+    # the projectfiles directory, holding acremscope_packages
+    sys.path.insert(0, os.path.dirname(THIS_DIRECTORY))
+    from acremscope_packages import redis_ops
+
+    status, message = make_planets()
 
     try:
         rconn = redis.Redis(host='localhost', port=6379, db=0, socket_timeout=5)
     except Exception:
         print("Warning:redis connection failed")
     else:
-        try:
-            # create a log entry to set in the redis server
-            fullmessage = datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S") + " " + message
-            rconn.rpush("remscope_various_log_info", fullmessage)
-            # and limit number of messages to 50
-            rconn.ltrim("remscope_various_log_info", -50, -1)
-        except Exception:
+        if not redis_ops.log_info(message=message, prefix="remscope_various_", rconn=rconn):
             print("Saving log to redis has failed")
 
     sys.exit(status)
-
-
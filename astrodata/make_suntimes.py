@@ -0,0 +1,144 @@
+###############################################
+#
+# This script creates the file suntimes.dat, a table
+# of sunrise and sunset times at the astronomy centre,
+# one pair for each day over a number of years, which
+# sun.suntime reads instead of calculating each time.
+#
+# python3 make_suntimes.py [start year] [number of years]
+#
+# The default is ten years from the start of the current year.
+#
+# The file is a header of two little endian integers, the
+# proleptic Gregorian ordinal of the first day, and the
+# number of days, followed by pairs of little endian
+# 64 bit floats, sunrise hour then sunset hour, for each day.
+#
+################################################
+
+
+import os, sys, struct, datetime
+
+from array import array
+
+try:
+    import numpy as np
+    import astropy.units as u
+    from astropy.coordinates import EarthLocation
+    from astropy.time import Time
+    from astroplan import Observer
+except:
+    sys.exit(1)
+
+
+THIS_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+
+# The path to the file to be created
+SUNTIMES = os.path.join(THIS_DIRECTORY, "suntimes.dat")
+
+LONGITUDE = -2.1544
+LATITUDE = 53.7111
+ELEVATION = 316
+
+# number of days calculated in each vectorised call
+BLOCK = 32
+
+
+def hours(times):
+    "Returns an array of the hour of the day of each time, as calculated by sun.suntime"
+    ymdhms = times.ymdhms
+    hour = np.atleast_1d(np.asarray(ymdhms['hour'], dtype=float))
+    minute = np.atleast_1d(np.asarray(ymdhms['minute'], dtype=float))
+    # sun.suntime uses whole seconds, from a datetime
+    second = np.atleast_1d(np.floor(np.asarray(ymdhms['second'], dtype=float)))
+    result = hour + minute/60.0 + second/3600.0
+    # days where no time was found are set to nan
+    result[np.atleast_1d(np.asarray(times.mask, dtype=bool))] = np.nan
+    return result
+
+
+def found_hours(times, references):
+    "Returns an array of the hour of each time, nan where not found, or not within half a day of its reference"
+    result = hours(times)
+    offset = (times - references).jd
+    # the offsets of masked times are nan already in the result
+    offset = np.atleast_1d(np.asarray(getattr(offset, 'unmasked', offset), dtype=float))
+    result[np.abs(offset) >= 0.5] = np.nan
+    return result
+
+
+def event_hours(event, references):
+    "Returns an array of the hour of the event nearest each reference time, nan where not found"
+    result = found_hours(event(references, which="nearest"), references)
+    # which="nearest" gives a masked time, or the event of the previous day, when the
+    # event is very close to the reference time, so look again for the next event from
+    # two hours earlier, and then for the previous event from two hours later, as
+    # sun._calculate_suntime does
+    for shift, which in ((-2*u.hour, "next"), (2*u.hour, "previous")):
+        missing = np.flatnonzero(np.isnan(result))
+        if not len(missing):
+            break
+        shifted = references[missing] + shift
+        result[missing] = found_hours(event(shifted, which=which), shifted)
+    return result
+
+
+def fill(column):
+    "Sets any nan values of the column by interpolating from the neighbouring days"
+    missing = np.isnan(column)
+    if missing.any() and not missing.all():
+        days = np.arange(len(column))
+        column[missing] = np.interp(days[missing], days[~missing], column[~missing])
+
+
+def make_table(startday, days):
+    "Returns an array of sunrise, sunset hours for each day"
+    astro_centre = EarthLocation.from_geodetic(LONGITUDE, LATITUDE, ELEVATION)
+    observer = Observer(location=astro_centre, name="centre_observer", timezone="utc")
+
+    # as sun.suntime, sunrise nearest 5:00 and sunset nearest 19:00 of each day
+    start = datetime.datetime(startday.year, startday.month, startday.day)
+    offsets = np.arange(days)*u.day
+    rise_times = Time(start + datetime.timedelta(hours=5), scale='utc') + offsets
+    set_times = Time(start + datetime.timedelta(hours=19), scale='utc') + offsets
+
+    rise_hours = np.empty(days)
+    set_hours = np.empty(days)
+    # each vectorised call is given a block of days, as astroplan memory use
+    # grows with the square of the number of times in a call
+    for block in range(0, days, BLOCK):
+        rise_hours[block:block+BLOCK] = event_hours(observer.sun_rise_time, rise_times[block:block+BLOCK])
+        set_hours[block:block+BLOCK] = event_hours(observer.sun_set_time, set_times[block:block+BLOCK])
+    fill(rise_hours)
+    fill(set_hours)
+
+    # interleave rise and set hours
+    return array('d', np.column_stack((rise_hours, set_hours)).ravel().tolist())
+
+
+if __name__ == "__main__":
+
+    thisyear = datetime.date.today().year
+    startyear = int(sys.argv[1]) if len(sys.argv) > 1 else thisyear
+    years = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    startday = datetime.date(startyear, 1, 1)
+    days = (datetime.date(startyear+years, 1, 1) - startday).days
+
+    table = make_table(startday, days)
+    if any(value != value for value in table):
+        # nan is not equal to itself, sun.suntime needs a time for every day
+        print("Some sunrise or sunset times could not be found, the table has not been written")
+        sys.exit(1)
+    if sys.byteorder != 'little':
+        table.byteswap()
+
+    # write to a temporary file, then rename, so a running server never reads a part written file
+    tempfile = SUNTIMES + ".tmp"
+    with open(tempfile, "wb") as f:
+        f.write(struct.pack("<ii", startday.toordinal(), days))
+        table.tofile(f)
+    os.replace(tempfile, SUNTIMES)
+
+    print(f"Sunrise and sunset times from {startday.isoformat()} for {days} days written to {SUNTIMES}")
+    sys.exit(0)
@@ -1,8 +1,17 @@
-import json, datetime
+import os, json, datetime
 
 from urllib.request import Request, urlopen
 
 
+# NOTE: These need to be edited with the correct file, longitude, latitude and met office api values
+
+WEATHERFILE = "/home/bernard/www/astrodata/weather.json"
+LONGITUDE = -2.1544
+LATITUDE = 53.7111
+MET_CLIENT_ID = ""
+MET_CLIENT_SECRET = ""
+
+
 def get_weather(weatherfile, longitude, latitude, met_client_id, met_client_secret):
     "Creates json file of weather data" 
 
@@ -51,8 +60,11 @@ def get_weather(weatherfile, longitude, latitude, met_client_id, met_client_secr
     # weather_dict has keys equal to iso time strings
     # and values equal to a list of lists, each inner list being parameter [description, value, label]
 
-    with open(weatherfile, 'w') as fp:
+    # write to a temporary file, then rename, so the web service never reads a part written file
+    tempfile = weatherfile + ".tmp"
+    with open(tempfile, 'w') as fp:
         json.dump(weather_dict, fp)
+    os.replace(tempfile, weatherfile)
 
 
 
@@ -67,15 +79,21 @@ def weathertime(weatherfile, timestring):
 
 
 
-if __name__ == "__main__":
+def update_weather():
+    "Fetches the weather into WEATHERFILE, returns a message of the result"
+    if (not MET_CLIENT_ID) or (not MET_CLIENT_SECRET):
+        return "No met office api values set, weather not fetched"
+    get_weather(WEATHERFILE,
+                longitude=LONGITUDE,
+                latitude=LATITUDE,
+                met_client_id=MET_CLIENT_ID,
+                met_client_secret=MET_CLIENT_SECRET)
+    return "Weather data fetched"
+
 
-    # NOTE: This call needs to be edited with the correct longitude, latitude and met office api values
+if __name__ == "__main__":
 
-    get_weather("/home/bernard/www/astrodata/weather.json",
-                longitude=-2.1544,
-                latitude=53.7111,
-                met_client_id="",
-                met_client_secret="")
+    update_weather()
 
     # datetime needed in a format like 2021-06-13T12:00Z
     #thistime = datetime.datetime.now(datetime.timezone.utc).strftime("%G-%m-%dT%H:00Z")
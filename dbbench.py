@@ -0,0 +1,90 @@
+
+###############################################
+#
+# This script is not used by the running system, it
+# is a micro-benchmark comparing the registered
+# prepared statements of database_ops against the
+# same queries sent as plain sql text.
+#
+# Run it against a local postgresql database holding
+# the acremscope tables, with the connection set in cfg.py
+#
+# python3 dbbench.py [number of calls]
+#
+################################################
+
+
+import sys, time, re
+
+from datetime import datetime
+
+from acremscope_packages import database_ops
+
+
+# parameters for each registered statement
+PARAMETERS = { 'user_from_id' : (1,),
+               'slot_status' : (datetime(2021, 1, 1, 20),),
+               'serversettings' : (),
+               'variabletext' : () }
+
+
+def planning_time(cur, sql, parameters):
+    "Return the planning time in milliseconds reported by explain analyze"
+    cur.execute("explain (analyze) " + sql, parameters)
+    for row in cur.fetchall():
+        found = re.search(r"Planning Time: ([\d.]+) ms", row[0])
+        if found:
+            return float(found.group(1))
+    return 0.0
+
+
+def plain_sql(name, parameters):
+    "Return the registered statement of name as plain sql text, with psycopg2 placeholders"
+    return re.sub(r"\$\d+", "%s", database_ops._PREPARED[name])
+
+
+def execute_sql(name, parameters):
+    "Return the sql to execute the prepared statement of name"
+    if parameters:
+        return "execute " + name + " (" + ", ".join(["%s"]*len(parameters)) + ")"
+    return "execute " + name
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) > 1:
+        calls = int(sys.argv[1])
+    else:
+        calls = 10000
+
+    con = database_ops.open_database()
+    try:
+        cur = con.cursor()
+        print("%-16s %14s %14s %14s %14s" % ("statement", "plain us/call", "prepared us/call", "plain plan ms", "prepared plan ms"))
+        for name in database_ops.prepared_statements():
+            parameters = PARAMETERS[name]
+            sql = plain_sql(name, parameters)
+
+            start = time.perf_counter()
+            for n in range(calls):
+                cur.execute(sql, parameters)
+                cur.fetchall()
+            plain = (time.perf_counter() - start) * 1000000 / calls
+
+            # the first call prepares the statement on this connection
+            database_ops._execute(cur, name, parameters)
+            cur.fetchall()
+            start = time.perf_counter()
+            for n in range(calls):
+                database_ops._execute(cur, name, parameters)
+                cur.fetchall()
+            prepared = (time.perf_counter() - start) * 1000000 / calls
+
+            plain_plan = planning_time(cur, sql, parameters)
+            prepared_plan = planning_time(cur, execute_sql(name, parameters), parameters)
+
+            print("%-16s %14.1f %14.1f %14.3f %14.3f" % (name, plain, prepared, plain_plan, prepared_plan))
+    finally:
+        database_ops.close_database(con)
+
+    sys.exit(0)
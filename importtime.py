@@ -0,0 +1,102 @@
+
+###############################################
+#
+# This script is not used by the running system, it
+# reports the time taken to import each acremscope_packages
+# module, each imported in a new python process using
+# python -X importtime, so modules already imported by
+# an earlier measurement are not counted as free.
+#
+# python3 importtime.py [number of slowest dependencies shown]
+#
+# For each module the total import time is given, followed by
+# its slowest top level dependencies, such as astropy.
+#
+# acremscope.py itself is not measured, as importing it connects
+# to redis and postgresql.
+#
+################################################
+
+
+import sys, os, subprocess
+
+
+PROJECTFILES = os.path.dirname(os.path.realpath(__file__))
+
+MODULES = ("acremscope_packages.cfg",
+           "acremscope_packages.redis_ops",
+           "acremscope_packages.database_ops",
+           "acremscope_packages.ident_token",
+           "acremscope_packages.indi_snapshot",
+           "acremscope_packages.indi_tracker",
+           "acremscope_packages.events",
+           "acremscope_packages.astro_centre",
+           "acremscope_packages.weather",
+           "acremscope_packages.temperature_history",
+           "acremscope_packages.name_resolver",
+           "acremscope_packages.ephemeris_cache",
+           "acremscope_packages.sun",
+           "acremscope_packages.stars",
+           "acremscope_packages.public.login",
+           "acremscope_packages.public.home",
+           "acremscope_packages.public.sensors",
+           "acremscope_packages.public.control",
+           "acremscope_packages.public.planning",
+           "acremscope_packages.members.sessions",
+           "acremscope_packages.members.remscope",
+           "acremscope_packages.members.control",
+           "acremscope_packages.admin.users",
+           "acremscope_packages.admin.sessions")
+
+
+def importtime(module):
+    """Imports module in a new process, returns (total microseconds, {top level package:cumulative microseconds})
+       or the error message as a string if the import failed"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                            cwd=PROJECTFILES, capture_output=True, text=True)
+    if result.returncode:
+        errors = result.stderr.strip().splitlines()
+        return errors[-1] if errors else "import failed"
+    total = 0
+    packages = {}
+    # children are listed before the module which imports them, so gather the
+    # direct imports of each top level import until that import is reached
+    children = {}
+    for line in result.stderr.splitlines():
+        # lines are of the form: import time: self | cumulative | indented name
+        if not line.startswith("import time:"):
+            continue
+        fields = line[12:].split("|")
+        if len(fields) != 3:
+            continue
+        try:
+            cumulative = int(fields[1])
+        except ValueError:
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1)//2
+        name = name.strip()
+        if depth == 1:
+            package = name.split(".")[0]
+            children[package] = children.get(package, 0) + cumulative
+        elif depth == 0:
+            if name == module:
+                total = cumulative
+                packages = children
+            children = {}
+    return total, packages
+
+
+if __name__ == "__main__":
+
+    shown = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    for module in MODULES:
+        measured = importtime(module)
+        if isinstance(measured, str):
+            print("%-40s %s" % (module, measured))
+            continue
+        total, packages = measured
+        slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:shown]
+        print("%-40s %8.1f ms   %s" % (module, total/1000.0,
+                                       ", ".join("%s %.1f ms" % (package, micro/1000.0) for package, micro in slowest)))
@@ -0,0 +1,68 @@
+
+###############################################
+#
+# This script is not used by the running system, it
+# checks redis_ops.timed_random_numbers under concurrent
+# calls, by calling it from many threads against a local
+# redis server, with a short timeslot so the numbers
+# rotate many times during the run.
+#
+# python3 rndcheck.py [number of threads] [seconds]
+#
+# If the numbers were ever rotated twice for one timeslot, two
+# different rnd1 values would be seen paired with the same rnd2
+#
+################################################
+
+
+import sys, time, threading
+
+from acremscope_packages import redis_ops
+
+
+# a set number not used by the running system
+RNDSET = "check"
+
+# timeslot in seconds
+TIMESLOT = 1
+
+PREFIX = "rndcheck_"
+
+
+def hammer(rconn, endtime, results):
+    "Call timed_random_numbers repeatedly until endtime, appending the results"
+    while time.time() < endtime:
+        results.append(redis_ops.timed_random_numbers(RNDSET, TIMESLOT, PREFIX, rconn))
+
+
+if __name__ == "__main__":
+
+    threadcount = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    rconn = redis_ops.open_redis()
+    rconn.delete(PREFIX + "rndset_" + RNDSET)
+
+    endtime = time.time() + seconds
+    results = []
+    threads = [threading.Thread(target=hammer, args=(rconn, endtime, results)) for n in range(threadcount)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    rconn.delete(PREFIX + "rndset_" + RNDSET)
+
+    failed = [result for result in results if result == (None, None)]
+    # for each rnd2, the set of rnd1 values seen with it
+    pairs = {}
+    for rnd1, rnd2 in results:
+        pairs.setdefault(rnd2, set()).add(rnd1)
+    doubles = {rnd2:rnd1s for rnd2, rnd1s in pairs.items() if len(rnd1s) > 1}
+
+    print("%s calls from %s threads, %s distinct pairs" % (len(results), threadcount, len(set(results))))
+    print("%s failed calls, %s double rotations" % (len(failed), len(doubles)))
+
+    if failed or doubles:
+        sys.exit(1)
+    sys.exit(0)